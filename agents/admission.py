@@ -0,0 +1,142 @@
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Iterable, List, Optional
+from .executors import LANE_LIMITS
+from .metrics import ADMITTED, ADMISSION_REJECTED
+
+# Quantas requisições podem esperar, além das vagas de execução da faixa, antes de a API responder 429.
+# Filas curtas nas modalidades caras: sob pico, quem chega depois recebe Retry-After em vez de
+# acumular decodificações e transcrições em memória
+QUEUE_LIMITS = {
+    "video": int(os.getenv("MAX_QUEUED_VIDEO", "2")),
+    "audio": int(os.getenv("MAX_QUEUED_AUDIO", "4")),
+    "image": int(os.getenv("MAX_QUEUED_IMAGE", "16")),
+    "document": int(os.getenv("MAX_QUEUED_DOCUMENT", "8")),
+    "text": int(os.getenv("MAX_QUEUED_TEXT", "32")),
+    "text_priority": int(os.getenv("MAX_QUEUED_PRIORITY_TEXT", "32")),
+}
+# Tempo de serviço presumido (s) até a faixa ter medições próprias
+DEFAULT_SERVICE_SECONDS = {"video": 60.0, "audio": 30.0, "image": 5.0, "document": 10.0, "text": 10.0, "text_priority": 3.0}
+SERVICE_TIME_SMOOTHING = 0.2
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, lane: str, retry_after: int):
+        super().__init__(f"Capacidade de análise de '{lane}' esgotada; tente novamente em {retry_after}s")
+        self.lane = lane
+        self.retry_after = retry_after
+
+
+class AdmissionTicket:
+    def __init__(self, lanes: List[str]):
+        self.lanes = lanes
+        self.started = time.perf_counter()
+
+
+class AdmissionController:
+    # Controle de admissão na entrada da API: cada faixa aceita até limite de execução + limite de fila
+    # requisições simultâneas; o que passar disso é recusado na hora, sem ocupar memória nem CPU
+    def __init__(self, limits: Dict[str, int] = LANE_LIMITS, queue_limits: Dict[str, int] = QUEUE_LIMITS):
+        self.limits = limits
+        self.queue_limits = queue_limits
+        self.admitted = {lane: 0 for lane in limits}
+        self.rejected = {lane: 0 for lane in limits}
+        self.service_seconds = dict(DEFAULT_SERVICE_SECONDS)
+
+    def capacity(self, lane: str) -> int:
+        return self.limits[lane] + self.queue_limits.get(lane, 0)
+
+    def retry_after(self, lane: str) -> int:
+        # Tempo até abrir uma vaga na fila: quem já espera, dividido pelas vagas de execução,
+        # vezes o tempo médio de serviço recente da faixa
+        waiting = max(0, self.admitted[lane] - self.limits[lane])
+        return max(1, math.ceil(self.service_seconds[lane] * (waiting // self.limits[lane] + 1)))
+
+    def try_admit(self, lane: str):
+        if self.admitted[lane] >= self.capacity(lane):
+            self.rejected[lane] += 1
+            ADMISSION_REJECTED.inc(lane=lane)
+            raise AdmissionRejected(lane, self.retry_after(lane))
+        self.admitted[lane] += 1
+        ADMITTED.inc(lane=lane)
+
+    def release(self, lane: str, elapsed: Optional[float] = None):
+        self.admitted[lane] -= 1
+        ADMITTED.dec(lane=lane)
+        if elapsed is not None:
+            self.service_seconds[lane] += SERVICE_TIME_SMOOTHING * (elapsed - self.service_seconds[lane])
+
+    def enter(self, lanes: Iterable[str]) -> "AdmissionTicket":
+        # Tudo ou nada: uma análise múltipla só entra se houver espaço para todos os seus itens
+        admitted: List[str] = []
+        try:
+            for lane in lanes:
+                if lane not in self.limits:
+                    # Tipos não suportados não ocupam vaga: o orquestrador os recusa sem custo
+                    continue
+                self.try_admit(lane)
+                admitted.append(lane)
+        except AdmissionRejected:
+            for lane in admitted:
+                self.release(lane)
+            raise
+        return AdmissionTicket(admitted)
+
+    def extend(self, ticket: "AdmissionTicket", lane: str):
+        # Mais um item num ticket já aberto: cada arquivo de um upload múltiplo ocupa a vaga da faixa
+        # presumida (pela extensão) ao começar a chegar, e o 429 sai antes de o conteúdo ser lido
+        if lane in self.limits:
+            self.try_admit(lane)
+            ticket.lanes.append(lane)
+
+    def settle(self, ticket: "AdmissionTicket", lanes: Iterable[str]):
+        # Troca as faixas presumidas pelas confirmadas na ingestão (assinatura do arquivo) sem soltar as vagas
+        # que continuam valendo; o tempo de serviço passa a contar a partir daqui, sem o envio
+        lanes = [lane for lane in lanes if lane in self.limits]
+        surplus = list(ticket.lanes)
+        missing = []
+        for lane in lanes:
+            if lane in surplus:
+                surplus.remove(lane)
+            else:
+                missing.append(lane)
+        added: List[str] = []
+        try:
+            for lane in missing:
+                self.try_admit(lane)
+                added.append(lane)
+        except AdmissionRejected:
+            for lane in added:
+                self.release(lane)
+            raise
+        for lane in surplus:
+            self.release(lane)
+        ticket.lanes = lanes
+        ticket.started = time.perf_counter()
+
+    def leave(self, ticket: "AdmissionTicket"):
+        # Só requisições de um item alimentam o tempo de serviço; o de um lote inclui a síntese
+        elapsed = time.perf_counter() - ticket.started if len(ticket.lanes) == 1 else None
+        for lane in ticket.lanes:
+            self.release(lane, elapsed)
+
+    @asynccontextmanager
+    async def admit(self, lanes: Iterable[str]):
+        ticket = self.enter(lanes)
+        try:
+            yield
+        finally:
+            self.leave(ticket)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            lane: {
+                "admitidas": self.admitted[lane],
+                "capacidade": self.capacity(lane),
+                "recusadas": self.rejected[lane],
+                "tempo_servico_s": round(self.service_seconds[lane], 3),
+            }
+            for lane in self.limits
+        }
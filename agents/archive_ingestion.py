@@ -0,0 +1,344 @@
+import asyncio
+import hashlib
+import os
+import re
+import struct
+import tarfile
+import threading
+import zlib
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, Tuple
+from .executors import run_io
+from .ingestion import IngestionError, INGEST_CHUNK_SIZE, MAX_UPLOAD_BYTES, MB
+from .metrics import timed_stage
+
+# Arquivos ZIP/tar com as entradas de um concurso: os membros são extraídos enquanto o corpo da
+# requisição chega e cada um vira item de job assim que termina de ser gravado
+MAX_ARCHIVE_BYTES = int(os.getenv("MAX_ARCHIVE_MB", "4096")) * MB
+MAX_ARCHIVE_MEMBERS = int(os.getenv("MAX_ARCHIVE_MEMBERS", "2000"))
+# Quanto do corpo pode ficar em memória à frente da extração; acima disso a leitura da rede espera
+ARCHIVE_BUFFER_BYTES = int(os.getenv("ARCHIVE_BUFFER_MB", "8")) * MB
+
+_ZIP_LOCAL_HEADER = struct.Struct("<HHHHHIIIHH")
+_ZIP_MEMBER = b"PK\x03\x04"
+_ZIP_END = (b"PK\x01\x02", b"PK\x05\x06", b"PK\x06\x06")
+_ZIP_DESCRIPTOR = b"PK\x07\x08"
+_SAFE_EXTENSION = re.compile(r"\.[A-Za-z0-9]{1,8}")
+
+
+class ArchivePipe:
+    # Liga o laço de eventos, que recebe o corpo da requisição, à thread de extração, que lê como de um arquivo.
+    # O buffer é limitado: se a extração atrasa, quem escreve espera, e a rede desacelera o cliente
+    def __init__(self, max_buffered: int = ARCHIVE_BUFFER_BYTES):
+        self.max_buffered = max_buffered
+        self._chunks = []
+        self._buffered = 0
+        self._eof = False
+        self._reader_closed = False
+        self._condition = threading.Condition()
+
+    def write(self, data: bytes):
+        with self._condition:
+            while self._buffered >= self.max_buffered and not self._reader_closed:
+                self._condition.wait()
+            if self._reader_closed:
+                # A extração terminou (ou falhou): o resto do corpo é descartado
+                return
+            self._chunks.append(bytes(data))
+            self._buffered += len(data)
+            self._condition.notify_all()
+
+    def close(self):
+        with self._condition:
+            self._eof = True
+            self._condition.notify_all()
+
+    def close_reader(self):
+        with self._condition:
+            self._reader_closed = True
+            self._chunks, self._buffered = [], 0
+            self._condition.notify_all()
+
+    def read(self, size: int = -1) -> bytes:
+        with self._condition:
+            while not self._chunks and not self._eof:
+                self._condition.wait()
+            if not self._chunks:
+                return b""
+            chunk = self._chunks.pop(0)
+            if 0 <= size < len(chunk):
+                self._chunks.insert(0, chunk[size:])
+                chunk = chunk[:size]
+            self._buffered -= len(chunk)
+            self._condition.notify_all()
+            return chunk
+
+
+class _Stream:
+    # Leitura sequencial com devolução de bytes: o fim de um membro deflate só é conhecido depois de lido
+    def __init__(self, pipe: ArchivePipe):
+        self.pipe = pipe
+        self._pending = b""
+
+    def read(self, size: int = -1) -> bytes:
+        if self._pending:
+            data = self._pending if size < 0 else self._pending[:size]
+            self._pending = self._pending[len(data):]
+            return data
+        return self.pipe.read(size)
+
+    def unread(self, data: bytes):
+        self._pending = data + self._pending
+
+    def read_exact(self, size: int) -> bytes:
+        parts, missing = [], size
+        while missing:
+            data = self.read(missing)
+            if not data:
+                raise IngestionError("Arquivo compactado truncado.", 400)
+            parts.append(data)
+            missing -= len(data)
+        return b"".join(parts)
+
+
+class _CorruptMember(Exception):
+    pass
+
+
+def _zip_member_data(stream: _Stream, flags: int, method: int, crc: int, compressed: int, zip64: bool) -> Iterator[bytes]:
+    # Gerador dos bytes descompactados de um membro; fechado antes do fim, consome o restante do membro
+    # para deixar o fluxo posicionado no próximo cabeçalho
+    decompressor = zlib.decompressobj(-15) if method == 8 else None
+    streaming = bool(flags & 0x08)
+    remaining = compressed
+    checksum = 0
+    finished = False
+    try:
+        while True:
+            if streaming:
+                # Tamanho só no descritor, depois dos dados: o fim vem do próprio fluxo deflate
+                data = stream.read(INGEST_CHUNK_SIZE)
+                if not data:
+                    raise IngestionError("Arquivo compactado truncado.", 400)
+                output = decompressor.decompress(data)
+                if decompressor.eof:
+                    stream.unread(decompressor.unused_data)
+            else:
+                if remaining == 0:
+                    break
+                data = stream.read_exact(min(remaining, INGEST_CHUNK_SIZE))
+                remaining -= len(data)
+                try:
+                    output = decompressor.decompress(data) if decompressor else data
+                except zlib.error:
+                    # Com o tamanho conhecido, só este membro é perdido: o restante dele é pulado sem descompactar
+                    raise _CorruptMember("dados compactados corrompidos")
+            if output:
+                checksum = zlib.crc32(output, checksum)
+                yield output
+            if streaming and decompressor.eof:
+                break
+        if decompressor is not None and not decompressor.eof:
+            raise _CorruptMember("fluxo deflate incompleto")
+        finished = True
+    finally:
+        if not finished:
+            _skip_zip_member(stream, decompressor, streaming, remaining, zip64)
+    if streaming:
+        descriptor = stream.read_exact(4)
+        if descriptor == _ZIP_DESCRIPTOR:
+            descriptor = stream.read_exact(4)
+        crc = struct.unpack("<I", descriptor)[0]
+        stream.read_exact(16 if zip64 else 8)
+    if checksum != crc:
+        raise _CorruptMember("CRC não confere")
+
+
+def _skip_zip_member(stream: _Stream, decompressor, streaming: bool, remaining: int, zip64: bool = False):
+    if not streaming:
+        while remaining:
+            remaining -= len(stream.read_exact(min(remaining, INGEST_CHUNK_SIZE)))
+        return
+    while not decompressor.eof:
+        data = stream.read(INGEST_CHUNK_SIZE)
+        if not data:
+            raise IngestionError("Arquivo compactado truncado.", 400)
+        decompressor.decompress(data)
+        if decompressor.eof:
+            stream.unread(decompressor.unused_data)
+    if stream.read_exact(4) == _ZIP_DESCRIPTOR:
+        stream.read_exact(4)
+    stream.read_exact(16 if zip64 else 8)
+
+
+def _unsupported(reason: str) -> Iterator[bytes]:
+    raise _CorruptMember(reason)
+    yield b""
+
+
+def _iter_zip(stream: _Stream) -> Iterator[Tuple[str, Iterator[bytes]]]:
+    # Lê os cabeçalhos locais em sequência, sem o diretório central do fim do arquivo: é o que permite
+    # extrair enquanto o upload ainda chega
+    while True:
+        signature = stream.read(4)
+        if not signature:
+            return
+        if len(signature) < 4:
+            signature += stream.read_exact(4 - len(signature))
+        if signature in _ZIP_END:
+            return
+        if signature != _ZIP_MEMBER:
+            raise IngestionError("Arquivo ZIP inválido.", 400)
+        _, flags, method, _, _, crc, compressed, size, name_length, extra_length = _ZIP_LOCAL_HEADER.unpack(stream.read_exact(26))
+        raw_name = stream.read_exact(name_length)
+        extra = stream.read_exact(extra_length)
+        name = raw_name.decode("utf-8" if flags & 0x800 else "cp437", errors="replace")
+
+        zip64 = False
+        position = 0
+        while position + 4 <= len(extra):
+            field, length = struct.unpack("<HH", extra[position:position + 4])
+            if field == 0x0001:
+                zip64 = True
+                values = extra[position + 4:position + 4 + length]
+                if size == 0xFFFFFFFF and len(values) >= 8:
+                    size, values = struct.unpack("<Q", values[:8])[0], values[8:]
+                if compressed == 0xFFFFFFFF and len(values) >= 8:
+                    compressed = struct.unpack("<Q", values[:8])[0]
+            position += 4 + length
+
+        if flags & 0x01:
+            raise IngestionError(f"Membro criptografado não suportado: '{name}'.", 415)
+        if method not in (0, 8):
+            if flags & 0x08:
+                raise IngestionError(f"Método de compressão {method} não suportado: '{name}'.", 415)
+            _skip_zip_member(stream, None, False, compressed)
+            yield name, _unsupported(f"método de compressão {method} não suportado")
+            continue
+        if method == 0 and flags & 0x08:
+            raise IngestionError(f"Membro sem tamanho no cabeçalho não suportado: '{name}'.", 415)
+        yield name, _zip_member_data(stream, flags, method, crc, compressed, zip64)
+
+
+def _iter_tar(stream: _Stream) -> Iterator[Tuple[str, Iterator[bytes]]]:
+    # Modo "r|*": leitura sequencial, com ou sem gzip/bz2/xz
+    try:
+        archive = tarfile.open(fileobj=stream, mode="r|*")
+    except tarfile.TarError:
+        raise IngestionError("Formato de arquivo compactado não suportado (use ZIP ou tar).", 415)
+    with archive:
+        for member in archive:
+            if not member.isfile():
+                continue
+            content = archive.extractfile(member)
+            yield member.name, iter(lambda: content.read(INGEST_CHUNK_SIZE), b"")
+
+
+def iter_archive_members(stream: _Stream) -> Iterator[Tuple[str, Iterator[bytes]]]:
+    head = stream.read(4)
+    if not head:
+        raise IngestionError("Arquivo compactado vazio.", 400)
+    stream.unread(head)
+    if head == _ZIP_MEMBER or head == b"PK\x05\x06":
+        return _iter_zip(stream)
+    return _iter_tar(stream)
+
+
+def _ignored(name: str) -> bool:
+    # Diretórios e os metadados que o macOS e o Windows acrescentam aos arquivos compactados
+    base = os.path.basename(name.rstrip("/"))
+    return name.endswith("/") or not base or base.startswith(".") or "__MACOSX/" in name or base in ("Thumbs.db", "desktop.ini")
+
+
+def _write_member(name: str, chunks: Iterator[bytes], directory: str, index: int,
+                  classify: Callable[[str, bytes], str]) -> Dict[str, Any]:
+    try:
+        first = next(chunks, b"")
+        if not first:
+            raise _CorruptMember("arquivo vazio")
+        content_type = classify(name, first)
+        if content_type == "unknown":
+            raise _CorruptMember("tipo de arquivo não suportado")
+        extension = os.path.splitext(name)[1]
+        path = os.path.join(directory, f"{index}{extension if _SAFE_EXTENSION.fullmatch(extension) else ''}")
+        limit = MAX_UPLOAD_BYTES.get(content_type, MAX_UPLOAD_BYTES["text"])
+        sha = hashlib.sha256()
+        size = 0
+        try:
+            with open(path, "wb") as f:
+                for chunk in _chain(first, chunks):
+                    size += len(chunk)
+                    if size > limit:
+                        raise _CorruptMember("excede o tamanho máximo permitido")
+                    sha.update(chunk)
+                    f.write(chunk)
+        except BaseException:
+            os.unlink(path)
+            raise
+        return {"name": name, "path": path, "content_type": content_type, "content_hash": sha.hexdigest(), "size": size}
+    finally:
+        if hasattr(chunks, "close"):
+            chunks.close()
+
+
+def _chain(first: bytes, rest: Iterator[bytes]) -> Iterator[bytes]:
+    yield first
+    yield from rest
+
+
+@timed_stage("archive_extraction")
+def extract_archive(pipe: ArchivePipe, directory: str, classify: Callable[[str, bytes], str],
+                    on_member: Callable[[int, Dict[str, Any]], bool]) -> Dict[str, Any]:
+    # Roda em uma thread de E/S: cada membro é gravado em `directory` e entregue a `on_member` assim que termina
+    stream = _Stream(pipe)
+    accepted, skipped = 0, []
+    try:
+        for name, chunks in iter_archive_members(stream):
+            if _ignored(name):
+                try:
+                    for _ in chunks:
+                        pass
+                except _CorruptMember:
+                    # Lixo com defeito (CRC, método não suportado) só é descartado: o fluxo já está no próximo cabeçalho
+                    pass
+                continue
+            if accepted >= MAX_ARCHIVE_MEMBERS:
+                raise IngestionError(f"O arquivo compactado excede {MAX_ARCHIVE_MEMBERS} itens.", 413)
+            try:
+                member = _write_member(name, chunks, directory, accepted, classify)
+            except _CorruptMember as e:
+                skipped.append({"nome": name, "motivo": str(e)})
+                continue
+            if not on_member(accepted, member):
+                raise IngestionError("Job cancelado durante o envio.", 409)
+            accepted += 1
+    except (tarfile.TarError, EOFError, zlib.error):
+        raise IngestionError("Arquivo compactado inválido ou truncado.", 400)
+    finally:
+        pipe.close_reader()
+    return {"itens": accepted, "ignorados": skipped}
+
+
+async def ingest_archive(body: AsyncIterator[bytes], directory: str, classify: Callable[[str, bytes], str],
+                         on_member: Callable[[int, Dict[str, Any]], bool]) -> Dict[str, Any]:
+    # Recepção, extração e (via on_member) análise se sobrepõem: o corpo é repassado à extração
+    # à medida que chega, sem gravar o arquivo compactado inteiro em disco
+    pipe = ArchivePipe()
+    extraction = asyncio.ensure_future(run_io(extract_archive, pipe, directory, classify, on_member))
+    received = 0
+    try:
+        async for chunk in body:
+            if extraction.done():
+                # Extração encerrada antes do fim do corpo: erro no arquivo ou diretório central do ZIP alcançado
+                break
+            received += len(chunk)
+            if received > MAX_ARCHIVE_BYTES:
+                raise IngestionError("Arquivo compactado excede o tamanho máximo permitido.", 413)
+            await run_io(pipe.write, chunk)
+    except BaseException:
+        # Encerra a extração antes de propagar, para que ela não grave nem registre itens depois da falha
+        pipe.close_reader()
+        pipe.close()
+        await asyncio.gather(extraction, return_exceptions=True)
+        raise
+    pipe.close()
+    return await extraction
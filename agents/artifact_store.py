@@ -0,0 +1,173 @@
+import copy
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+from .executors import run_io
+from .metrics import ARTIFACT_LOOKUPS
+
+# Artefatos extraídos (texto de PDF, transcrições, descrições de frames) não dependem dos critérios:
+# rejulgar o mesmo conteúdo com outros critérios reaproveita a extração e paga só a chamada final ao LLM
+ARTIFACT_STORE_MAX_ENTRIES = int(os.getenv("ARTIFACT_STORE_MAX_ENTRIES", "128"))
+ARTIFACT_STORE_TTL = int(os.getenv("ARTIFACT_STORE_TTL", str(30 * 24 * 3600)))
+# Caminho de um arquivo SQLite para o nível em disco; vazio (padrão) mantém os artefatos só em memória
+ARTIFACT_STORE_PATH = os.getenv("ARTIFACT_STORE_PATH", "")
+# A cada tantas gravações as linhas expiradas são apagadas do disco (também ao abrir o arquivo)
+ARTIFACT_STORE_PURGE_EVERY = int(os.getenv("ARTIFACT_STORE_PURGE_EVERY", "256"))
+
+
+def fingerprint(*parts) -> str:
+    # Versão de um extrator a partir de tudo que muda a sua saída: versão do código, modelo e parâmetros
+    raw = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:16]
+
+
+class ArtifactStore:
+    def __init__(self, max_entries: int = ARTIFACT_STORE_MAX_ENTRIES, ttl: int = ARTIFACT_STORE_TTL, disk_path: str = ARTIFACT_STORE_PATH):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._lookups: Dict[str, Dict[str, int]] = {}
+        self.failures = 0
+        self._writes = 0
+        self.disk_path = disk_path
+        self._db = None
+        if disk_path:
+            if os.path.dirname(disk_path):
+                os.makedirs(os.path.dirname(disk_path), exist_ok=True)
+            self._db = self._connect()
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.disk_path, check_same_thread=False, timeout=30)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("CREATE TABLE IF NOT EXISTS artifacts (key TEXT PRIMARY KEY, kind TEXT NOT NULL, value TEXT NOT NULL, expires_at REAL NOT NULL)")
+        db.execute("CREATE INDEX IF NOT EXISTS idx_artifacts_expires ON artifacts (expires_at)")
+        db.commit()
+        self._purge(db)
+        return db
+
+    def _purge(self, db: sqlite3.Connection):
+        # Leituras já ignoram linhas vencidas; sem apagá-las o arquivo cresceria sem limite
+        try:
+            with db:
+                db.execute("DELETE FROM artifacts WHERE expires_at <= ?", (time.time(),))
+        except sqlite3.Error:
+            self.failures += 1
+
+    def reopen(self):
+        # Conexões SQLite não sobrevivem a um fork: cada worker do gunicorn abre a sua
+        if self._db is not None:
+            self._db = self._connect()
+
+    def make_key(self, content_hash: str, kind: str, version: str) -> str:
+        raw = "\x1f".join([content_hash, kind, version])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key: str, kind: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            value = self._lookup(key, now)
+            counts = self._lookups.setdefault(kind, {"hits": 0, "misses": 0})
+            counts["hits" if value is not None else "misses"] += 1
+        ARTIFACT_LOOKUPS.inc(kind=kind, result="hit" if value is not None else "miss")
+        # Os agentes acrescentam campos ao que recebem (ex.: info do vídeo ganha a trilha de áudio)
+        return copy.deepcopy(value)
+
+    def _lookup(self, key: str, now: float) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > now:
+                self._entries.move_to_end(key)
+                return value
+            del self._entries[key]
+
+        if self._db is not None:
+            try:
+                row = self._db.execute("SELECT value, expires_at FROM artifacts WHERE key = ?", (key,)).fetchone()
+            except sqlite3.Error:
+                self.failures += 1
+                return None
+            if row is not None and row[1] > now:
+                value = json.loads(row[0])
+                self._store_memory(key, value, row[1])
+                return value
+        return None
+
+    def set(self, key: str, kind: str, value: Any):
+        expires_at = time.time() + self.ttl
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._store_memory(key, value, expires_at)
+            if self._db is not None:
+                try:
+                    with self._db:
+                        self._db.execute(
+                            "INSERT OR REPLACE INTO artifacts (key, kind, value, expires_at) VALUES (?, ?, ?, ?)",
+                            (key, kind, json.dumps(value, ensure_ascii=False), expires_at)
+                        )
+                except sqlite3.Error:
+                    # Sem o nível em disco a extração só deixa de ser reaproveitada entre processos
+                    self.failures += 1
+                self._writes += 1
+                if self._writes % ARTIFACT_STORE_PURGE_EVERY == 0:
+                    self._purge(self._db)
+
+    def _store_memory(self, key: str, value: Any, expires_at: float):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def scope(self, content_hash: str, refresh: bool = False) -> "ArtifactScope":
+        return ArtifactScope(self, content_hash, refresh)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            by_kind = {kind: dict(counts) for kind, counts in self._lookups.items()}
+        hits = sum(counts["hits"] for counts in by_kind.values())
+        misses = sum(counts["misses"] for counts in by_kind.values())
+        return {
+            "entradas_memoria": len(self._entries),
+            "hits": hits,
+            "misses": misses,
+            "taxa_acerto": hits / (hits + misses) if hits + misses else 0.0,
+            "por_tipo": by_kind,
+            "persistente": self._db is not None,
+            "falhas_disco": self.failures,
+        }
+
+
+class ArtifactScope:
+    # Os artefatos de um conteúdo, entregues aos agentes; com refresh (use_cache=False) a extração
+    # roda de novo e o resultado substitui o que estava guardado
+    def __init__(self, store: ArtifactStore, content_hash: str, refresh: bool = False):
+        self.store = store
+        self.content_hash = content_hash
+        self.refresh = refresh
+
+    async def fetch(self, kind: str, version: str, produce: Callable[[], Awaitable[Any]],
+                    cacheable: Optional[Callable[[Any], bool]] = None) -> Any:
+        key = self.store.make_key(self.content_hash, kind, version)
+        if not self.refresh:
+            value = await run_io(self.store.get, key, kind)
+            if value is not None:
+                return value
+        value = await produce()
+        # Extrações com falha (exceções ou marcadores de erro no valor) não são guardadas: a próxima tenta de novo
+        if cacheable is None or cacheable(value):
+            await run_io(self.store.set, key, kind, value)
+        return value
+
+
+async def fetch_artifact(artifacts: Optional[ArtifactScope], kind: str, version: str,
+                         produce: Callable[[], Awaitable[Any]], cacheable: Optional[Callable[[Any], bool]] = None) -> Any:
+    # Sem escopo (chamadas diretas aos agentes, texto puro) a extração roda sempre
+    if artifacts is None:
+        return await produce()
+    return await artifacts.fetch(kind, version, produce, cacheable)
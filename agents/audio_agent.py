@@ -1,19 +1,25 @@
 import os
-from pydub import AudioSegment
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.prompts import PromptTemplate
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 import json
-import whisper
+from .executors import run_blocking
+from .metrics import observe_stage, timed_stage
+from .llm_client import get_llm_client
+from .audio_processing import probe_audio
+from .transcription import atranscribe, transcription_failed, transcription_fingerprint
+from .prompt_budget import compact_text, compact_json_with_report, merge_reports, record_compaction
+from .artifact_store import ArtifactScope, fetch_artifact, fingerprint
+
+AUDIO_TRANSCRIPT_TOKEN_BUDGET = int(os.getenv("AUDIO_TRANSCRIPT_TOKEN_BUDGET", "12000"))
 
 class AudioAnalysisAgent:
+    # Incrementar sempre que o prompt mudar, para invalidar resultados em cache
+    PROMPT_VERSION = "2"
+    # Incrementar sempre que a extração (metadados e transcrição) mudar, para invalidar os artefatos guardados
+    EXTRACTOR_VERSION = "1"
+
     def __init__(self):
-        self.llm = ChatGoogleGenerativeAI(
-            model="gemini-1.5-flash",
-            google_api_key=os.getenv("GOOGLE_API_KEY"),
-            temperature=0.7,
-            convert_system_message_to_human=True
-        )
+        self.llm = get_llm_client().chat_model(temperature=0.7)
         
         self.prompt_template = PromptTemplate(
             input_variables=["transcription", "criteria", "audio_info"],
@@ -37,59 +43,65 @@ class AudioAnalysisAgent:
         
         self.chain = self.prompt_template | self.llm
     
-    def _extract_audio_info(self, audio_path: str) -> Dict[str, Any]:
+    def _extract_audio_info(self, audio_path) -> Dict[str, Any]:
         try:
-            audio = AudioSegment.from_file(audio_path)
-            return {
-                "duracao": len(audio) / 1000,
-                "frame_rate": audio.frame_rate,
-                "canais": audio.channels,
-                "formato": os.path.splitext(audio_path)[1],
-                "tamanho_mb": os.path.getsize(audio_path) / (1024 * 1024)
-            }
+            return probe_audio(audio_path)
         except Exception as e:
             return {"erro": f"Erro ao extrair informações: {str(e)}"}
     
-    def _transcribe_audio(self, audio_path: str) -> str:
-        try:
-            model = whisper.load_model("base")
-            result = model.transcribe(audio_path, language="pt")
-            transcription = result["text"]
-            if not transcription.strip():
-                 return "[Áudio não contém fala detectável]"
-            return transcription
-        except Exception as e:
-            return f"[Erro na transcrição com Whisper: {str(e)}]"
-    
-    def analyze(self, audio_path: str, criteria: str = "Avaliação geral de qualidade de áudio") -> Dict[str, Any]:
+    async def _aextract(self, audio_path) -> Dict[str, Any]:
+        audio_info = await run_blocking(self._extract_audio_info, audio_path)
+        transcription, segments = await atranscribe(audio_path, audio_info)
+        return {"info": audio_info, "transcricao": transcription, "segmentos": segments}
+
+    def _extraction_ok(self, artifact: Dict[str, Any]) -> bool:
+        return "erro" not in artifact["info"] and not transcription_failed(artifact["transcricao"])
+
+    @timed_stage("prompt_compaction")
+    def _build_inputs(self, transcription: str, audio_info: Dict[str, Any], criteria: str):
+        # Transcrições longas são reduzidas aos trechos mais relevantes para os critérios
+        transcription, transcription_report = compact_text(transcription, AUDIO_TRANSCRIPT_TOKEN_BUDGET, criteria)
+        info, info_report = compact_json_with_report(audio_info)
+        inputs = {"transcription": transcription, "criteria": criteria, "audio_info": info}
+        return inputs, merge_reports(transcription_report, info_report)
+
+    @timed_stage("json_extraction")
+    def _parse_result(self, result, audio_info: Dict[str, Any], transcription: str, segments: List[Dict[str, Any]],
+                      compaction: Dict[str, Any]) -> Dict[str, Any]:
+        content = result.content if hasattr(result, 'content') else str(result)
+        
         try:
-            audio_info = self._extract_audio_info(audio_path)
-            transcription = self._transcribe_audio(audio_path)
-            
-            result = self.chain.invoke({
-                "transcription": transcription,
-                "criteria": criteria,
-                "audio_info": json.dumps(audio_info, indent=2, ensure_ascii=False)
-            })
-            content = result.content if hasattr(result, 'content') else str(result)
-            
-            try:
-                start_idx = content.find('{')
-                end_idx = content.rfind('}') + 1
-                if start_idx != -1 and end_idx != 0:
-                    json_content = content[start_idx:end_idx]
-                    analysis = json.loads(json_content)
-                else:
-                    analysis = {"pontuacao": 0, "feedback": content}
-            except json.JSONDecodeError:
+            start_idx = content.find('{')
+            end_idx = content.rfind('}') + 1
+            if start_idx != -1 and end_idx != 0:
+                json_content = content[start_idx:end_idx]
+                analysis = json.loads(json_content)
+            else:
                 analysis = {"pontuacao": 0, "feedback": content}
+        except json.JSONDecodeError:
+            analysis = {"pontuacao": 0, "feedback": content}
 
-            analysis["tipo"] = "audio"
-            analysis["agente"] = "AudioAnalysisAgent"
-            analysis["info_tecnica"] = audio_info
-            analysis["transcricao"] = transcription
+        analysis["tipo"] = "audio"
+        analysis["agente"] = "AudioAnalysisAgent"
+        analysis["info_tecnica"] = audio_info
+        analysis["transcricao"] = transcription
+        analysis["segmentos_transcricao"] = segments
+        analysis["compactacao_prompt"] = record_compaction("audio", compaction)
+        
+        return analysis
+
+    async def aanalyze(self, audio_path, criteria: str = "Avaliação geral de qualidade de áudio",
+                       artifacts: Optional[ArtifactScope] = None) -> Dict[str, Any]:
+        try:
+            # Metadados e transcrição independem dos critérios: um novo julgamento do mesmo áudio não passa pelo Whisper
+            artifact = await fetch_artifact(artifacts, "audio", fingerprint(self.EXTRACTOR_VERSION, transcription_fingerprint()),
+                                            lambda: self._aextract(audio_path), self._extraction_ok)
+            audio_info, transcription, segments = artifact["info"], artifact["transcricao"], artifact["segmentos"]
+            inputs, compaction = await run_blocking(self._build_inputs, transcription, audio_info, criteria)
             
-            return analysis
+            with observe_stage("llm_audio"):
+                result = await self.chain.ainvoke(inputs)
+            return self._parse_result(result, audio_info, transcription, segments, compaction)
             
         except Exception as e:
-            return {"erro": str(e), "pontuacao": 0, "tipo": "audio", "agente": "AudioAnalysisAgent"}
\ No newline at end of file
+            return {"erro": str(e), "pontuacao": 0, "tipo": "audio", "agente": "AudioAnalysisAgent"}
@@ -0,0 +1,73 @@
+import json
+import os
+import subprocess
+from typing import Dict, Any, List, Optional
+import numpy as np
+from .metrics import timed_stage
+
+SAMPLE_RATE = 16000
+# Janela analisada ao redor de cada corte nominal para encontrar o trecho mais silencioso
+SPLIT_SEARCH_SECONDS = float(os.getenv("AUDIO_SPLIT_SEARCH_SECONDS", "5"))
+SPLIT_FRAME_SECONDS = 0.05
+
+
+def _input(source):
+    # Caminhos são lidos direto pelo ffmpeg; buffers em memória vão pelo stdin
+    if isinstance(source, str):
+        return source, None
+    return "pipe:0", bytes(source)
+
+
+@timed_stage("audio_probe")
+def probe_audio(source) -> Dict[str, Any]:
+    # Lê duração, taxa e canais dos cabeçalhos do contêiner, sem decodificar o áudio
+    target, stdin = _input(source)
+    cmd = ["ffprobe", "-v", "error", "-show_format", "-show_streams", "-select_streams", "a:0", "-of", "json", target]
+    out = subprocess.run(cmd, input=stdin, capture_output=True, check=True).stdout
+    probe = json.loads(out)
+    stream = (probe.get("streams") or [{}])[0]
+    fmt = probe.get("format", {})
+    duration = fmt.get("duration") or stream.get("duration") or 0
+    return {
+        "duracao": float(duration),
+        "frame_rate": int(stream.get("sample_rate", 0)),
+        "canais": int(stream.get("channels", 0)),
+        "formato": os.path.splitext(source)[1] if isinstance(source, str) else fmt.get("format_name"),
+        "tamanho_mb": (os.path.getsize(source) if isinstance(source, str) else len(source)) / (1024 * 1024)
+    }
+
+
+@timed_stage("audio_decode")
+def decode_audio(source, start: float = 0.0, duration: Optional[float] = None) -> np.ndarray:
+    # Decodifica (um trecho de) o áudio para PCM mono 16 kHz, o formato que o Whisper espera
+    target, stdin = _input(source)
+    seek = ["-ss", f"{start:.3f}"] if start > 0 else []
+    length = ["-t", f"{duration:.3f}"] if duration is not None else []
+    # -vn: em vídeos, só o fluxo de áudio é decodificado; os pacotes de vídeo são descartados no demux
+    cmd = ["ffmpeg", "-nostats", "-loglevel", "error"] + seek + ["-i", target] + length + \
+          ["-vn", "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(SAMPLE_RATE), "-"]
+    out = subprocess.run(cmd, input=stdin, capture_output=True, check=True).stdout
+    return np.frombuffer(out, np.int16).astype(np.float32) / 32768.0
+
+
+def _quietest_point(source, around: float) -> float:
+    start = max(0.0, around - SPLIT_SEARCH_SECONDS)
+    window = decode_audio(source, start, 2 * SPLIT_SEARCH_SECONDS)
+    frame = int(SPLIT_FRAME_SECONDS * SAMPLE_RATE)
+    if len(window) < frame:
+        return around
+    frames = window[:len(window) // frame * frame].reshape(-1, frame)
+    energy = np.sqrt((frames ** 2).mean(axis=1))
+    return start + (int(np.argmin(energy)) + 0.5) * SPLIT_FRAME_SECONDS
+
+
+def plan_chunks(source, total_duration: float, chunk_seconds: float) -> List[tuple]:
+    # Cortes a cada chunk_seconds, deslocados para o ponto de menor energia próximo,
+    # para não partir palavras ao meio
+    boundaries = [0.0]
+    nominal = chunk_seconds
+    while nominal < total_duration - SPLIT_SEARCH_SECONDS:
+        boundaries.append(_quietest_point(source, nominal))
+        nominal = boundaries[-1] + chunk_seconds
+    boundaries.append(total_duration)
+    return [(boundaries[i], boundaries[i + 1] - boundaries[i]) for i in range(len(boundaries) - 1)]
@@ -0,0 +1,204 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+from .scoring import normalize_score
+
+# Arquivo SQLite com todas as avaliações concluídas; vazio desativa o armazenamento
+EVALUATIONS_DB_PATH = os.getenv("EVALUATIONS_DB_PATH", os.path.join("data", "evaluations.db"))
+MAX_PAGE_SIZE = 500
+
+
+def criteria_hash(criteria: str) -> str:
+    return hashlib.sha256(criteria.encode('utf-8')).hexdigest()
+
+
+class EvaluationStore:
+    # Histórico de todas as análises e um placar por critérios, atualizado a cada avaliação:
+    # classificar milhares de itens vira uma leitura no índice (critério, nota), sem novas chamadas ao LLM
+    def __init__(self, db_path: str = EVALUATIONS_DB_PATH):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self.recorded = 0
+        self.failures = 0
+        self._db = None
+        if db_path:
+            if os.path.dirname(db_path):
+                os.makedirs(os.path.dirname(db_path), exist_ok=True)
+            self._db = self._connect()
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        db.row_factory = sqlite3.Row
+        db.execute("PRAGMA journal_mode=WAL")
+        db.executescript("""
+            CREATE TABLE IF NOT EXISTS criteria (
+                criteria_hash TEXT PRIMARY KEY,
+                criteria TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS evaluations (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                content_hash TEXT NOT NULL,
+                criteria_hash TEXT NOT NULL,
+                content_type TEXT NOT NULL,
+                name TEXT,
+                prompt_version TEXT,
+                score REAL,
+                raw_score TEXT,
+                max_score TEXT,
+                result TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+            -- Entradas de índice terminam no rowid (id): o histórico sai em ordem sem ordenar
+            CREATE INDEX IF NOT EXISTS idx_evaluations_content ON evaluations (content_hash);
+            CREATE INDEX IF NOT EXISTS idx_evaluations_criteria ON evaluations (criteria_hash);
+            CREATE TABLE IF NOT EXISTS leaderboard (
+                criteria_hash TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                content_type TEXT NOT NULL,
+                name TEXT,
+                score REAL NOT NULL,
+                raw_score TEXT,
+                max_score TEXT,
+                evaluation_id INTEGER NOT NULL,
+                evaluations INTEGER NOT NULL,
+                first_judged_at REAL NOT NULL,
+                judged_at REAL NOT NULL,
+                PRIMARY KEY (criteria_hash, content_hash, content_type)
+            );
+            CREATE INDEX IF NOT EXISTS idx_leaderboard_rank ON leaderboard (criteria_hash, score DESC, content_hash);
+            CREATE INDEX IF NOT EXISTS idx_leaderboard_type_rank ON leaderboard (criteria_hash, content_type, score DESC, content_hash);
+        """)
+        db.commit()
+        return db
+
+    @property
+    def enabled(self) -> bool:
+        return self._db is not None
+
+    def reopen(self):
+        # Conexões SQLite não sobrevivem a um fork: cada worker do gunicorn abre a sua
+        if self._db is not None:
+            self._db = self._connect()
+
+    def record(self, content_hash: str, content_type: str, criteria: str, prompt_version: str,
+               result: Dict[str, Any], name: Optional[str] = None):
+        if self._db is None or "erro" in result:
+            return
+        key = criteria_hash(criteria)
+        score = normalize_score(result)
+        raw_score = json.dumps(result.get("pontuacao"), ensure_ascii=False)
+        max_score = json.dumps(result.get("pontuacao_maxima"), ensure_ascii=False)
+        now = time.time()
+        try:
+            with self._lock, self._db:
+                self._db.execute("INSERT OR IGNORE INTO criteria (criteria_hash, criteria, created_at) VALUES (?, ?, ?)", (key, criteria, now))
+                evaluation_id = self._db.execute(
+                    "INSERT INTO evaluations (content_hash, criteria_hash, content_type, name, prompt_version, score, raw_score, max_score, result, created_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (content_hash, key, content_type, name, prompt_version, score, raw_score, max_score, json.dumps(result, ensure_ascii=False), now)
+                ).lastrowid
+                # Itens sem nota ficam só no histórico, como no ranking da síntese
+                if score is not None:
+                    self._db.execute("""
+                        INSERT INTO leaderboard (criteria_hash, content_hash, content_type, name, score, raw_score, max_score,
+                                                 evaluation_id, evaluations, first_judged_at, judged_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, 1, ?, ?)
+                        ON CONFLICT (criteria_hash, content_hash, content_type) DO UPDATE SET
+                            name = COALESCE(excluded.name, leaderboard.name), score = excluded.score,
+                            raw_score = excluded.raw_score, max_score = excluded.max_score,
+                            evaluation_id = excluded.evaluation_id, evaluations = leaderboard.evaluations + 1,
+                            judged_at = excluded.judged_at
+                    """, (key, content_hash, content_type, name, score, raw_score, max_score, evaluation_id, now, now))
+            self.recorded += 1
+        except sqlite3.Error:
+            # Uma falha ao gravar não pode derrubar a análise que já foi feita
+            self.failures += 1
+
+    def leaderboard(self, key: str, content_type: Optional[str] = None, limit: int = 50, offset: int = 0) -> Dict[str, Any]:
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        offset = max(0, offset)
+        where, params = "criteria_hash = ?", [key]
+        if content_type:
+            where += " AND content_type = ?"
+            params.append(content_type)
+        with self._lock:
+            criteria = self._db.execute("SELECT criteria FROM criteria WHERE criteria_hash = ?", (key,)).fetchone()
+            total = self._db.execute(f"SELECT COUNT(*) FROM leaderboard WHERE {where}", params).fetchone()[0]
+            rows = self._db.execute(
+                f"SELECT * FROM leaderboard WHERE {where} ORDER BY score DESC, content_hash LIMIT ? OFFSET ?",
+                params + [limit, offset]
+            ).fetchall()
+            # Ranking de competição (1, 2, 2, 4): a posição do primeiro item da página é 1 + quantos têm nota maior
+            ahead = self._db.execute(f"SELECT COUNT(*) FROM leaderboard WHERE {where} AND score > ?", params + [rows[0]["score"]]).fetchone()[0] if rows else 0
+
+        entries, previous = [], None
+        for index, row in enumerate(rows):
+            if previous is None:
+                position = ahead + 1
+            elif row["score"] == previous["nota_normalizada"]:
+                position = previous["posicao"]
+            else:
+                position = offset + index + 1
+            previous = {
+                "posicao": position,
+                "content_name": row["name"],
+                "hash_conteudo": row["content_hash"],
+                "tipo": row["content_type"],
+                "nota_normalizada": row["score"],
+                "pontuacao": json.loads(row["raw_score"]),
+                "pontuacao_maxima": json.loads(row["max_score"]),
+                "avaliacoes": row["evaluations"],
+                "avaliacao_id": row["evaluation_id"],
+                "primeira_avaliacao_em": row["first_judged_at"],
+                "avaliado_em": row["judged_at"],
+            }
+            entries.append(previous)
+        return {"criterios": criteria["criteria"] if criteria else None, "criterios_hash": key, "total": total, "limit": limit, "offset": offset, "ranking": entries}
+
+    def history(self, content_hash: Optional[str] = None, key: Optional[str] = None,
+                limit: int = 50, offset: int = 0) -> Dict[str, Any]:
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        offset = max(0, offset)
+        filters, params = [], []
+        if content_hash:
+            filters.append("e.content_hash = ?")
+            params.append(content_hash)
+        if key:
+            filters.append("e.criteria_hash = ?")
+            params.append(key)
+        where = f"WHERE {' AND '.join(filters)}" if filters else ""
+        with self._lock:
+            total = self._db.execute(f"SELECT COUNT(*) FROM evaluations e {where}", params).fetchone()[0]
+            rows = self._db.execute(
+                f"SELECT e.*, c.criteria FROM evaluations e JOIN criteria c ON c.criteria_hash = e.criteria_hash {where}"
+                " ORDER BY e.id DESC LIMIT ? OFFSET ?",
+                params + [limit, offset]
+            ).fetchall()
+        return {
+            "total": total,
+            "limit": limit,
+            "offset": offset,
+            "avaliacoes": [
+                {
+                    "id": row["id"],
+                    "content_name": row["name"],
+                    "hash_conteudo": row["content_hash"],
+                    "tipo": row["content_type"],
+                    "criterios": row["criteria"],
+                    "criterios_hash": row["criteria_hash"],
+                    "versao_prompt": row["prompt_version"],
+                    "nota_normalizada": row["score"],
+                    "avaliado_em": row["created_at"],
+                    "resultado": json.loads(row["result"]),
+                }
+                for row in rows
+            ],
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {"persistente": self._db is not None, "gravadas": self.recorded, "falhas_gravacao": self.failures}
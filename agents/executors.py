@@ -0,0 +1,68 @@
+import asyncio
+import functools
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Dict, Optional
+
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", str(os.cpu_count() or 1)))
+PROCESS_WORKERS = int(os.getenv("PROCESS_WORKERS", str(os.cpu_count() or 1)))
+
+
+def _concurrency_limit(name: str, default: int) -> int:
+    # Pelo menos uma vaga: com zero o semáforo nunca libera e o cálculo do Retry-After dividiria por zero
+    return max(1, int(os.getenv(name, str(default))))
+
+
+# Limites de análises simultâneas por modalidade, do mais caro (vídeo) ao mais barato (texto)
+MODALITY_LIMITS = {
+    "video": _concurrency_limit("MAX_CONCURRENT_VIDEO", 2),
+    "audio": _concurrency_limit("MAX_CONCURRENT_AUDIO", 4),
+    "image": _concurrency_limit("MAX_CONCURRENT_IMAGE", 8),
+    "document": _concurrency_limit("MAX_CONCURRENT_DOCUMENT", 4),
+    "text": _concurrency_limit("MAX_CONCURRENT_TEXT", 16),
+}
+# Faixa prioritária: textos curtos têm vagas próprias e não esperam atrás de textos longos
+PRIORITY_TEXT_CHARS = int(os.getenv("PRIORITY_TEXT_CHARS", "4000"))
+LANE_LIMITS = {**MODALITY_LIMITS, "text_priority": _concurrency_limit("MAX_CONCURRENT_PRIORITY_TEXT", 8)}
+
+_cpu_executor = ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix="cpu")
+# Tarefas que passam a maior parte do tempo esperando (ex.: extração de um arquivo que ainda está
+# chegando pela rede) ficam fora do pool de CPU, para não ocupar suas vagas
+IO_WORKERS = int(os.getenv("IO_WORKERS", "16"))
+_io_executor = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="io")
+_process_executor: Optional[ProcessPoolExecutor] = None
+_process_executor_lock = threading.Lock()
+_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+
+async def run_blocking(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_cpu_executor, functools.partial(func, *args, **kwargs))
+
+
+async def run_io(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_io_executor, functools.partial(func, *args, **kwargs))
+
+
+def get_process_executor() -> ProcessPoolExecutor:
+    # "spawn" evita herdar threads e o estado do Whisper/torch do processo principal
+    global _process_executor
+    with _process_executor_lock:
+        if _process_executor is None:
+            _process_executor = ProcessPoolExecutor(max_workers=PROCESS_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _process_executor
+
+
+def lane_for(content_type: str, content_input=None) -> str:
+    if content_type == "text" and isinstance(content_input, str) and len(content_input) <= PRIORITY_TEXT_CHARS:
+        return "text_priority"
+    return content_type
+
+
+def modality_semaphore(lane: str) -> asyncio.Semaphore:
+    if lane not in _semaphores:
+        _semaphores[lane] = asyncio.Semaphore(LANE_LIMITS.get(lane, 4))
+    return _semaphores[lane]
@@ -1,30 +1,26 @@
-import os
-from PIL import Image
-from io import BytesIO
-import google.generativeai as genai
 from typing import Dict, Any
 import json
+from .executors import run_blocking
+from .metrics import observe_stage, timed_stage
+from .llm_client import get_llm_client
+from .image_preprocessing import PreparedImage, prepare_image
 
 class ImageAnalysisAgent:
+    # Incrementar sempre que o prompt mudar, para invalidar resultados em cache
+    PROMPT_VERSION = "2"
+
     def __init__(self):
-        genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-        self.model = genai.GenerativeModel('gemini-1.5-flash')
+        self.model = get_llm_client().vision_model()
     
-    def _prepare_image(self, image_input) -> Image.Image:
-        if isinstance(image_input, str):
-            return Image.open(image_input)
-        elif isinstance(image_input, bytes):
-            return Image.open(BytesIO(image_input))
-        elif isinstance(image_input, Image.Image):
+    @timed_stage("image_preprocess")
+    def prepare(self, image_input) -> PreparedImage:
+        # Corrige a orientação EXIF, reduz para IMAGE_MAX_EDGE e recodifica em JPEG antes do upload
+        if isinstance(image_input, PreparedImage):
             return image_input
-        else:
-            raise ValueError("Formato de imagem não suportado")
+        return prepare_image(image_input)
     
-    def analyze(self, image_input, criteria: str = "Avaliação geral de qualidade visual") -> Dict[str, Any]:
-        try:
-            image = self._prepare_image(image_input)
-            
-            prompt = f"""
+    def _build_prompt(self, criteria: str) -> str:
+        return f"""
             Você é um jurado especialista em análise visual. Analise esta imagem com base nos seguintes critérios:
             CRITÉRIOS DE AVALIAÇÃO: {criteria}
             
@@ -41,25 +37,31 @@ class ImageAnalysisAgent:
             - pontos_melhoria: lista de sugestões de melhoria
             - veredicto: resumo da avaliação
             """
-            
-            response = self.model.generate_content([prompt, image])
-            result = response.text
-            
-            try:
-                start_idx = result.find('{')
-                end_idx = result.rfind('}') + 1
-                if start_idx != -1 and end_idx != 0:
-                    json_content = result[start_idx:end_idx]
-                    analysis = json.loads(json_content)
-                else:
-                    analysis = {"pontuacao": 0, "feedback": result}
-            except json.JSONDecodeError:
+
+    @timed_stage("json_extraction")
+    def _parse_response(self, result: str, image: PreparedImage) -> Dict[str, Any]:
+        try:
+            start_idx = result.find('{')
+            end_idx = result.rfind('}') + 1
+            if start_idx != -1 and end_idx != 0:
+                json_content = result[start_idx:end_idx]
+                analysis = json.loads(json_content)
+            else:
                 analysis = {"pontuacao": 0, "feedback": result}
-            
-            analysis["tipo"] = "imagem"
-            analysis["agente"] = "ImageAnalysisAgent"
-            
-            return analysis
-            
+        except json.JSONDecodeError:
+            analysis = {"pontuacao": 0, "feedback": result}
+        
+        analysis["tipo"] = "imagem"
+        analysis["agente"] = "ImageAnalysisAgent"
+        analysis["info_tecnica"] = image.info()
+        
+        return analysis
+
+    async def aanalyze(self, image_input, criteria: str = "Avaliação geral de qualidade visual") -> Dict[str, Any]:
+        try:
+            image = await run_blocking(self.prepare, image_input)
+            with observe_stage("llm_image"):
+                response = await self.model.generate_content_async([self._build_prompt(criteria), image.blob])
+            return self._parse_response(response.text, image)
         except Exception as e:
-            return {"erro": str(e), "pontuacao": 0, "tipo": "imagem", "agente": "ImageAnalysisAgent"}
\ No newline at end of file
+            return {"erro": str(e), "pontuacao": 0, "tipo": "imagem", "agente": "ImageAnalysisAgent"}
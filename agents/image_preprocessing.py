@@ -0,0 +1,221 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from io import BytesIO
+from typing import Any, Dict, Optional, Tuple
+import numpy as np
+from PIL import Image, ImageOps
+
+IMAGE_MAX_EDGE = int(os.getenv("IMAGE_MAX_EDGE", "1536"))
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "85"))
+# Distância de Hamming máxima (em 63 bits) para considerar duas imagens quase idênticas
+IMAGE_DUPLICATE_MAX_DISTANCE = int(os.getenv("IMAGE_DUPLICATE_MAX_DISTANCE", "6"))
+IMAGE_INDEX_MAX_ENTRIES = int(os.getenv("IMAGE_INDEX_MAX_ENTRIES", "10000"))
+# Caminho de um arquivo SQLite para manter o índice entre reinícios; vazio deixa só em memória
+IMAGE_INDEX_PATH = os.getenv("IMAGE_INDEX_PATH", "")
+# A cada tantas inserções o arquivo é podado para as IMAGE_INDEX_MAX_ENTRIES mais recentes (também ao abrir)
+IMAGE_INDEX_PRUNE_EVERY = int(os.getenv("IMAGE_INDEX_PRUNE_EVERY", "256"))
+
+PHASH_SIZE = 32
+PHASH_LOW_FREQ = 8
+
+logger = logging.getLogger(__name__)
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2 / n)
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+
+_DCT = _dct_matrix(PHASH_SIZE)
+
+
+def perceptual_hash(image: Image.Image) -> int:
+    # pHash: DCT 2D de uma miniatura 32x32 em tons de cinza; cada bit diz se um coeficiente de
+    # baixa frequência (sem o DC) está acima da mediana. Resiste a redimensionamento e recompressão.
+    pixels = np.asarray(image.convert("L").resize((PHASH_SIZE, PHASH_SIZE), Image.LANCZOS), dtype=np.float64)
+    low = (_DCT @ pixels @ _DCT.T)[:PHASH_LOW_FREQ, :PHASH_LOW_FREQ].flatten()[1:]
+    value = 0
+    for bit in low > np.median(low):
+        value = (value << 1) | int(bit)
+    return value
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def _open(source) -> Image.Image:
+    if isinstance(source, str):
+        return Image.open(source)
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return Image.open(BytesIO(source))
+    if isinstance(source, Image.Image):
+        return source
+    raise ValueError("Formato de imagem não suportado")
+
+
+def _to_rgb(image: Image.Image) -> Image.Image:
+    # Transparência vira fundo branco; converter direto para RGB deixaria o fundo preto
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB") if image.mode != "RGB" else image
+
+
+class PreparedImage:
+    def __init__(self, blob: Dict[str, Any], phash: int, original_size: Tuple[int, int], size: Tuple[int, int], original_bytes: Optional[int]):
+        self.blob = blob
+        self.phash = phash
+        self.original_size = original_size
+        self.size = size
+        self.original_bytes = original_bytes
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "resolucao_original": f"{self.original_size[0]}x{self.original_size[1]}",
+            "resolucao_enviada": f"{self.size[0]}x{self.size[1]}",
+            "bytes_originais": self.original_bytes,
+            "bytes_enviados": len(self.blob["data"]),
+            "phash": f"{self.phash:016x}",
+        }
+
+
+def prepare_image(source, max_edge: int = IMAGE_MAX_EDGE, quality: int = IMAGE_JPEG_QUALITY) -> PreparedImage:
+    if isinstance(source, str):
+        original_bytes = os.path.getsize(source)
+    elif isinstance(source, (bytes, bytearray, memoryview)):
+        original_bytes = len(source)
+    else:
+        original_bytes = None
+
+    image = _open(source)
+    original_size = image.size
+    if image.format == "JPEG":
+        # O decoder JPEG reduz a escala já na decodificação (1/2, 1/4, 1/8), bem mais barato que decodificar tudo
+        image.draft("RGB", (max_edge, max_edge))
+    image = _to_rgb(ImageOps.exif_transpose(image))
+    phash = perceptual_hash(image)
+    if max(image.size) > max_edge:
+        image = image.copy()
+        image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+    buffer = BytesIO()
+    image.save(buffer, format="JPEG", quality=quality, optimize=True)
+    return PreparedImage({"mime_type": "image/jpeg", "data": buffer.getvalue()}, phash, original_size, image.size, original_bytes)
+
+
+class PerceptualHashIndex:
+    # Mapeia o pHash de cada imagem já vista para o hash de conteúdo da primeira ocorrência, para
+    # que quase-duplicatas (recortes mínimos, recompressão, outra resolução) reaproveitem a mesma análise
+    def __init__(self, max_distance: int = IMAGE_DUPLICATE_MAX_DISTANCE, max_entries: int = IMAGE_INDEX_MAX_ENTRIES,
+                 disk_path: str = IMAGE_INDEX_PATH):
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        # Reentrante: find_or_add chama find e add com a trava já adquirida
+        self._lock = threading.RLock()
+        self.matches = 0
+        self.failures = 0
+        self._writes = 0
+        self.disk_path = disk_path
+        self._db = None
+        if disk_path:
+            self._db = self._connect()
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        try:
+            db = sqlite3.connect(self.disk_path, check_same_thread=False, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("CREATE TABLE IF NOT EXISTS image_hashes (content_hash TEXT PRIMARY KEY, phash TEXT NOT NULL, created_at REAL NOT NULL)")
+            db.execute("CREATE INDEX IF NOT EXISTS idx_image_hashes_created ON image_hashes (created_at)")
+            db.commit()
+            self._prune(db)
+            rows = db.execute("SELECT content_hash, phash FROM image_hashes ORDER BY created_at DESC LIMIT ?", (self.max_entries,)).fetchall()
+        except sqlite3.Error:
+            # Sem o arquivo o índice segue só em memória: a deduplicação vale apenas dentro deste processo
+            logger.exception("Índice de imagens em %s indisponível", self.disk_path)
+            self.failures += 1
+            return None
+        # Inclui o que outros workers gravaram desde o fork
+        with self._lock:
+            for content_hash, phash in reversed(rows):
+                self._entries[content_hash] = int(phash, 16)
+                self._entries.move_to_end(content_hash)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return db
+
+    def _prune(self, db: sqlite3.Connection):
+        # Só as max_entries mais recentes são carregadas; sem apagar as demais o arquivo cresceria sem limite
+        try:
+            with db:
+                db.execute(
+                    "DELETE FROM image_hashes WHERE content_hash NOT IN (SELECT content_hash FROM image_hashes ORDER BY created_at DESC LIMIT ?)",
+                    (self.max_entries,)
+                )
+        except sqlite3.Error:
+            self.failures += 1
+
+    def reopen(self):
+        # Conexões SQLite não sobrevivem a um fork: cada worker do gunicorn abre a sua
+        if self.disk_path:
+            self._db = self._connect()
+
+    def find(self, phash: int, content_hash: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        best = None
+        with self._lock:
+            for known_hash, known_phash in self._entries.items():
+                if known_hash == content_hash:
+                    continue
+                distance = hamming_distance(phash, known_phash)
+                if distance <= self.max_distance and (best is None or distance < best[1]):
+                    best = (known_hash, distance)
+            if best is not None:
+                self.matches += 1
+                self._entries.move_to_end(best[0])
+        if best is None:
+            return None
+        return {"content_hash": best[0], "distancia": best[1]}
+
+    def add(self, phash: int, content_hash: str):
+        with self._lock:
+            self._entries[content_hash] = phash
+            self._entries.move_to_end(content_hash)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            if self._db is not None:
+                try:
+                    with self._db:
+                        self._db.execute(
+                            "INSERT OR REPLACE INTO image_hashes (content_hash, phash, created_at) VALUES (?, ?, ?)",
+                            (content_hash, f"{phash:016x}", time.time())
+                        )
+                    self._writes += 1
+                    if self._writes % IMAGE_INDEX_PRUNE_EVERY == 0:
+                        self._prune(self._db)
+                except sqlite3.Error:
+                    # Arquivo travado ou somente leitura: a entrada fica só em memória e a análise segue
+                    logger.warning("Falha ao gravar no índice de imagens em %s", self.disk_path, exc_info=True)
+                    self.failures += 1
+
+    def find_or_add(self, phash: int, content_hash: str) -> Optional[Dict[str, Any]]:
+        # Busca e inserção atômicas: duas quase-duplicatas processadas ao mesmo tempo não são ambas
+        # registradas como primeira ocorrência
+        with self._lock:
+            duplicate = self.find(phash, content_hash)
+            if duplicate is None:
+                self.add(phash, content_hash)
+            return duplicate
+
+    def stats(self) -> Dict[str, Any]:
+        return {"imagens_indexadas": len(self._entries), "quase_duplicatas": self.matches, "persistente": self._db is not None,
+                "falhas_disco": self.failures}
@@ -0,0 +1,299 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+from python_multipart import MultipartParser
+from python_multipart.exceptions import MultipartParseError
+from python_multipart.multipart import MultipartState, parse_options_header
+from .executors import run_blocking
+from .metrics import timed_stage
+
+INGEST_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", str(1024 * 1024)))
+# Bytes iniciais necessários para identificar o formato pela assinatura
+SNIFF_BYTES = 16
+MAX_UPLOAD_FILES = int(os.getenv("MAX_UPLOAD_FILES", "1000"))
+# Campos de texto do formulário (ex.: criteria) ficam em memória
+MAX_FORM_FIELD_BYTES = int(os.getenv("MAX_FORM_FIELD_KB", "1024")) * 1024
+
+MB = 1024 * 1024
+MAX_UPLOAD_BYTES: Dict[str, int] = {
+    "text": int(os.getenv("MAX_UPLOAD_MB_TEXT", "5")) * MB,
+    "document": int(os.getenv("MAX_UPLOAD_MB_DOCUMENT", "100")) * MB,
+    "image": int(os.getenv("MAX_UPLOAD_MB_IMAGE", "50")) * MB,
+    "audio": int(os.getenv("MAX_UPLOAD_MB_AUDIO", "300")) * MB,
+    "video": int(os.getenv("MAX_UPLOAD_MB_VIDEO", "1024")) * MB,
+}
+
+# Acima deste tamanho o upload é gravado em disco em vez de ficar em memória.
+# Vídeos sempre vão para disco porque o OpenCV só abre caminhos de arquivo.
+SPILL_THRESHOLD_BYTES: Dict[str, int] = {
+    "text": MAX_UPLOAD_BYTES["text"],
+    "document": int(os.getenv("SPILL_THRESHOLD_MB_DOCUMENT", "16")) * MB,
+    "image": int(os.getenv("SPILL_THRESHOLD_MB_IMAGE", "16")) * MB,
+    "audio": int(os.getenv("SPILL_THRESHOLD_MB_AUDIO", "8")) * MB,
+    "video": 0,
+}
+
+
+# Matroska/WebM (EBML) e Ogg guardam tanto gravações só de áudio (MediaRecorder, .opus) quanto vídeos
+# (.webm, .ogv): a assinatura não decide a modalidade, que vem do tipo MIME declarado ou da extensão
+AMBIGUOUS_SIGNATURES = (b'\x1aE\xdf\xa3', b'OggS')
+
+
+class IngestionError(Exception):
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def sniff_content_type(head: bytes) -> Optional[str]:
+    if head.startswith(b'%PDF'):
+        return 'document'
+    if head.startswith((b'\x89PNG\r\n\x1a\n', b'\xff\xd8\xff', b'GIF87a', b'GIF89a')):
+        return 'image'
+    if head[:4] == b'RIFF':
+        kind = head[8:12]
+        if kind == b'WEBP': return 'image'
+        if kind == b'WAVE': return 'audio'
+        if kind == b'AVI ': return 'video'
+    if head.startswith((b'ID3', b'fLaC')) or head[:2] in (b'\xff\xfb', b'\xff\xf3', b'\xff\xf2'):
+        return 'audio'
+    if head[4:8] == b'ftyp':
+        # M4A/M4B usam o mesmo contêiner MP4, diferenciados pela marca
+        return 'audio' if head[8:11] in (b'M4A', b'M4B') else 'video'
+    return None
+
+
+def is_ambiguous_container(head: bytes) -> bool:
+    return head.startswith(AMBIGUOUS_SIGNATURES)
+
+
+def declared_media_type(mime: Optional[str]) -> Optional[str]:
+    major = (mime or "").split("/", 1)[0].strip().lower()
+    return major if major in ("audio", "video") else None
+
+
+def needs_seekable_source(head: bytes) -> bool:
+    # No MP4/M4A/MOV o índice (átomo moov) costuma ficar no fim do arquivo: o ffmpeg não o alcança
+    # lendo de um pipe, então esses contêineres vão para disco mesmo abaixo do limite de memória
+    return head[4:8] == b'ftyp'
+
+
+def looks_like_text(head: bytes) -> bool:
+    # Texto sem extensão reconhecida (ex.: "LEIAME"): UTF-8 válido e sem bytes nulos no início do arquivo.
+    # Os últimos bytes podem cortar um caractere multibyte ao meio
+    sample = head[:4096]
+    if b'\x00' in sample:
+        return False
+    for cut in range(4):
+        try:
+            sample[:len(sample) - cut].decode('utf-8')
+            return True
+        except UnicodeDecodeError:
+            continue
+    return False
+
+
+class IngestedUpload:
+    def __init__(self, name: str, content_type: str):
+        self.name = name
+        self.content_type = content_type
+        self.size = 0
+        self.sha256 = ""
+        self.data: Optional[bytearray] = bytearray()
+        self.path: Optional[str] = None
+
+    @property
+    def source(self):
+        # Conteúdo pequeno é entregue aos agentes como memoryview, sem cópia; o restante como caminho
+        return self.path if self.path is not None else memoryview(self.data)
+
+    def persist(self, destination: str):
+        # Move o conteúdo para um local durável (ex.: diretório de um job), sem nova cópia quando já está em disco
+        if self.path is not None:
+            shutil.move(self.path, destination)
+        else:
+            with open(destination, 'wb') as f:
+                f.write(self.data)
+            self.data = None
+        self.path = destination
+
+    def cleanup(self):
+        if self.path is not None and os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+class UploadSink:
+    # Um arquivo recebido aos pedaços: o tipo vem dos primeiros bytes, o limite de tamanho vale enquanto
+    # o corpo ainda chega e, acima do limiar de memória, o conteúdo vai direto para disco (em spill_dir,
+    # quando o destino final é conhecido, para que persist seja só uma renomeação)
+    def __init__(self, name: Optional[str], declared_mime: Optional[str] = None, fallback_type: str = 'unknown',
+                 expected_type: Optional[str] = None, spill_dir: Optional[str] = None):
+        self.name = name
+        self.declared_mime = declared_mime
+        self.fallback_type = fallback_type
+        self.expected_type = expected_type
+        self.spill_dir = spill_dir
+        self.upload: Optional[IngestedUpload] = None
+        self._head = bytearray()
+        self._seekable = False
+        self._sha = hashlib.sha256()
+        self._spill_file = None
+
+    async def write(self, chunk: bytes):
+        if self.upload is None:
+            # O multipart pode entregar pedaços menores que a assinatura
+            self._head += chunk
+            if len(self._head) < SNIFF_BYTES:
+                return
+            chunk, self._head = bytes(self._head), bytearray()
+            self._open(chunk[:SNIFF_BYTES])
+        await self._append(chunk)
+
+    def _open(self, head: bytes):
+        content_type = sniff_content_type(head)
+        if content_type is None and is_ambiguous_container(head):
+            content_type = declared_media_type(self.declared_mime)
+        content_type = content_type or self.fallback_type
+        if self.expected_type is not None and content_type != self.expected_type:
+            raise IngestionError(f"Conteúdo do arquivo '{self.name}' não corresponde ao tipo esperado ({self.expected_type}).", 415)
+        self._seekable = needs_seekable_source(head)
+        self.upload = IngestedUpload(self.name, content_type)
+
+    async def _append(self, chunk: bytes):
+        upload = self.upload
+        upload.size += len(chunk)
+        if upload.size > MAX_UPLOAD_BYTES.get(upload.content_type, MAX_UPLOAD_BYTES["text"]):
+            raise IngestionError(f"Arquivo '{self.name}' excede o tamanho máximo permitido.", 413)
+        self._sha.update(chunk)
+
+        if self._spill_file is None and (self._seekable or upload.size > SPILL_THRESHOLD_BYTES.get(upload.content_type, 0)):
+            suffix = os.path.splitext(self.name or "")[1]
+            self._spill_file = tempfile.NamedTemporaryFile(delete=False, suffix=suffix, dir=self.spill_dir)
+            upload.path = self._spill_file.name
+            await run_blocking(self._spill_file.write, upload.data)
+            upload.data = None
+
+        if self._spill_file is not None:
+            await run_blocking(self._spill_file.write, chunk)
+        else:
+            upload.data += chunk
+
+    async def finish(self) -> IngestedUpload:
+        if self.upload is None:
+            if not self._head:
+                raise IngestionError(f"Arquivo '{self.name}' está vazio.", 400)
+            head, self._head = bytes(self._head), bytearray()
+            self._open(head)
+            await self._append(head)
+        if self._spill_file is not None:
+            await run_blocking(self._spill_file.close)
+        self.upload.sha256 = self._sha.hexdigest()
+        return self.upload
+
+    def abort(self):
+        if self._spill_file is not None:
+            self._spill_file.close()
+        if self.upload is not None:
+            self.upload.cleanup()
+
+
+class _Part:
+    def __init__(self):
+        self.headers: Dict[bytes, bytes] = {}
+        self.field = ""
+        self.filename: Optional[str] = None
+        self.data = bytearray()
+
+
+@timed_stage("upload")
+async def ingest_multipart(content_type: str, body: AsyncIterator[bytes], file_field: str,
+                           open_file: Callable[[Optional[str], Optional[str]], UploadSink]) -> Tuple[Dict[str, str], List[IngestedUpload]]:
+    # Lê o multipart/form-data à medida que chega, como /jobs/archive faz com o corpo bruto. Deixar o
+    # Starlette montar o formulário gravaria o corpo inteiro num arquivo temporário antes da rota: os
+    # limites por tipo só valeriam depois do envio completo e os arquivos grandes iriam duas vezes ao disco.
+    # open_file recebe o nome e o tipo MIME declarados de cada arquivo e pode recusá-lo antes do conteúdo
+    mime, params = parse_options_header(content_type)
+    if mime != b"multipart/form-data" or not params.get(b"boundary"):
+        raise IngestionError("Envie os arquivos como multipart/form-data.", 400)
+
+    fields: Dict[str, str] = {}
+    files: List[IngestedUpload] = []
+    events: List[tuple] = []
+    state = {"part": _Part(), "header": b"", "value": b""}
+
+    def on_part_begin():
+        state["part"] = _Part()
+
+    def on_header_field(data, start, end):
+        state["header"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        state["value"] += data[start:end]
+
+    def on_header_end():
+        state["part"].headers[state["header"].lower()] = state["value"]
+        state["header"], state["value"] = b"", b""
+
+    def on_headers_finished():
+        part = state["part"]
+        _, options = parse_options_header(part.headers.get(b"content-disposition", b""))
+        part.field = options.get(b"name", b"").decode("utf-8", "replace")
+        if b"filename" in options:
+            part.filename = options[b"filename"].decode("utf-8", "replace")
+            events.append(("file", part))
+
+    def on_part_data(data, start, end):
+        part = state["part"]
+        if part.filename is not None:
+            events.append(("data", bytes(data[start:end])))
+            return
+        part.data += data[start:end]
+        if len(part.data) > MAX_FORM_FIELD_BYTES:
+            raise IngestionError(f"Campo '{part.field}' excede o tamanho máximo permitido.", 413)
+
+    def on_part_end():
+        part = state["part"]
+        if part.filename is None:
+            fields[part.field] = part.data.decode("utf-8", "replace")
+        else:
+            events.append(("end", part))
+
+    parser = MultipartParser(params[b"boundary"], {
+        "on_part_begin": on_part_begin, "on_part_data": on_part_data, "on_part_end": on_part_end,
+        "on_header_field": on_header_field, "on_header_value": on_header_value,
+        "on_header_end": on_header_end, "on_headers_finished": on_headers_finished,
+    })
+    sink: Optional[UploadSink] = None
+    try:
+        async for chunk in body:
+            try:
+                parser.write(chunk)
+            except MultipartParseError:
+                raise IngestionError("Corpo multipart inválido.", 400)
+            # Os callbacks do parser são síncronos: a gravação dos pedaços de arquivo acontece aqui, em ordem
+            for event in events:
+                kind, value = event
+                if kind == "file":
+                    if value.field != file_field:
+                        raise IngestionError(f"Arquivo enviado no campo '{value.field}'; use '{file_field}'.", 400)
+                    if len(files) >= MAX_UPLOAD_FILES:
+                        raise IngestionError(f"Envie no máximo {MAX_UPLOAD_FILES} arquivos por requisição.", 413)
+                    sink = open_file(value.filename, value.headers.get(b"content-type", b"").decode("latin-1") or None)
+                elif kind == "data":
+                    await sink.write(value)
+                else:
+                    files.append(await sink.finish())
+                    sink = None
+            events.clear()
+        if parser.state != MultipartState.END:
+            raise IngestionError("Corpo multipart truncado.", 400)
+        return fields, files
+    except BaseException:
+        if sink is not None:
+            sink.abort()
+        for upload in files:
+            upload.cleanup()
+        raise
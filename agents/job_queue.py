@@ -0,0 +1,332 @@
+import asyncio
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, Any, List, Optional, Set
+from .executors import run_blocking
+
+JOBS_DIR = os.getenv("JOBS_DIR", os.path.join("data", "jobs"))
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", os.path.join("data", "jobs.db"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1"))
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueue:
+    def __init__(self, db_path: str = JOBS_DB_PATH, jobs_dir: str = JOBS_DIR):
+        self.jobs_dir = jobs_dir
+        os.makedirs(jobs_dir, exist_ok=True)
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._db = self._connect()
+
+    def _connect(self) -> sqlite3.Connection:
+        # WAL deixa os workers do gunicorn lendo enquanto outro grava; o timeout cobre a espera pela escrita
+        db = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        db.row_factory = sqlite3.Row
+        db.execute("PRAGMA journal_mode=WAL")
+        db.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                criteria TEXT NOT NULL,
+                use_cache INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                synthesis TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS job_items (
+                job_id TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                name TEXT,
+                path TEXT NOT NULL,
+                content_type TEXT NOT NULL,
+                content_hash TEXT,
+                status TEXT NOT NULL,
+                result TEXT,
+                started_at REAL,
+                finished_at REAL,
+                PRIMARY KEY (job_id, idx)
+            );
+            CREATE INDEX IF NOT EXISTS idx_job_items_status ON job_items (status, job_id, idx);
+        """)
+        db.commit()
+        return db
+
+    def reopen(self):
+        # Conexões SQLite não sobrevivem a um fork: cada worker abre a sua
+        self._db = self._connect()
+
+    def job_dir(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, job_id)
+
+    def new_job_id(self) -> str:
+        job_id = uuid.uuid4().hex
+        os.makedirs(self.job_dir(job_id), exist_ok=True)
+        return job_id
+
+    def create_job(self, job_id: str, criteria: str, use_cache: bool, items: List[Dict[str, Any]], status: str = "pending"):
+        # Jobs de arquivos compactados nascem em 'receiving': os itens entram um a um durante o envio e
+        # já podem ser processados, mas a síntese espera o fim do envio (finish_receiving)
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT INTO jobs (id, criteria, use_cache, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, criteria, int(use_cache), status, now, now)
+            )
+            self._db.executemany(
+                "INSERT INTO job_items (job_id, idx, name, path, content_type, content_hash, status) VALUES (?, ?, ?, ?, ?, ?, 'pending')",
+                [(job_id, i, item["name"], item["path"], item["content_type"], item.get("content_hash")) for i, item in enumerate(items)]
+            )
+
+    def add_item(self, job_id: str, idx: int, item: Dict[str, Any]) -> bool:
+        # Só entra enquanto o job recebe o envio; um job cancelado no meio do caminho recusa os próximos itens
+        with self._lock, self._db:
+            cursor = self._db.execute(
+                "INSERT INTO job_items (job_id, idx, name, path, content_type, content_hash, status)"
+                " SELECT ?, ?, ?, ?, ?, ?, 'pending' WHERE EXISTS (SELECT 1 FROM jobs WHERE id = ? AND status = 'receiving')",
+                (job_id, idx, item["name"], item["path"], item["content_type"], item.get("content_hash"), job_id)
+            )
+            return cursor.rowcount == 1
+
+    def finish_receiving(self, job_id: str) -> bool:
+        with self._lock, self._db:
+            cursor = self._db.execute("""
+                UPDATE jobs SET updated_at = ?, status = CASE
+                    WHEN EXISTS (SELECT 1 FROM job_items WHERE job_id = ? AND status != 'pending') THEN 'running' ELSE 'pending' END
+                WHERE id = ? AND status = 'receiving'
+            """, (time.time(), job_id, job_id))
+            return cursor.rowcount == 1
+
+    def resume(self):
+        # Itens que estavam em execução quando o processo caiu voltam para a fila
+        with self._lock, self._db:
+            self._db.execute("UPDATE job_items SET status = 'pending', started_at = NULL WHERE status = 'running'")
+            self._db.execute("UPDATE jobs SET status = 'running' WHERE status = 'synthesizing'")
+            interrupted = [row["id"] for row in self._db.execute("SELECT id FROM jobs WHERE status = 'receiving'").fetchall()]
+        # O envio de um arquivo compactado interrompido não tem como ser retomado
+        for job_id in interrupted:
+            self.cancel(job_id)
+
+    def claim_next_item(self) -> Optional[Dict[str, Any]]:
+        with self._lock, self._db:
+            while True:
+                row = self._db.execute("""
+                    SELECT i.job_id, i.idx, i.name, i.path, i.content_type, i.content_hash, j.criteria, j.use_cache
+                    FROM job_items i JOIN jobs j ON j.id = i.job_id
+                    WHERE i.status = 'pending' AND j.status IN ('pending', 'running', 'receiving')
+                    ORDER BY j.created_at, i.idx LIMIT 1
+                """).fetchone()
+                if row is None:
+                    return None
+                now = time.time()
+                # O SELECT roda antes da transação de escrita: com vários workers do gunicorn, só fica com o
+                # item quem o tirou de 'pending'; quem perdeu a disputa procura o próximo
+                claimed = self._db.execute(
+                    "UPDATE job_items SET status = 'running', started_at = ? WHERE job_id = ? AND idx = ? AND status = 'pending'",
+                    (now, row["job_id"], row["idx"])
+                )
+                if claimed.rowcount == 1:
+                    break
+            self._db.execute("UPDATE jobs SET status = 'running', updated_at = ? WHERE id = ? AND status = 'pending'", (now, row["job_id"]))
+            return dict(row)
+
+    def finish_item(self, job_id: str, idx: int, result: Dict[str, Any]):
+        status = "failed" if "erro" in result else "done"
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE job_items SET status = ?, result = ?, finished_at = ? WHERE job_id = ? AND idx = ? AND status = 'running'",
+                (status, json.dumps(result, ensure_ascii=False), time.time(), job_id, idx)
+            )
+
+    def jobs_ready_for_synthesis(self) -> List[str]:
+        with self._lock:
+            rows = self._db.execute("""
+                SELECT j.id FROM jobs j
+                WHERE j.status IN ('pending', 'running')
+                AND NOT EXISTS (SELECT 1 FROM job_items i WHERE i.job_id = j.id AND i.status IN ('pending', 'running'))
+            """).fetchall()
+        return [row["id"] for row in rows]
+
+    def mark_synthesizing(self, job_id: str) -> bool:
+        with self._lock, self._db:
+            cursor = self._db.execute(
+                "UPDATE jobs SET status = 'synthesizing', updated_at = ? WHERE id = ? AND status IN ('pending', 'running')",
+                (time.time(), job_id)
+            )
+            return cursor.rowcount == 1
+
+    def complete_job(self, job_id: str, synthesis: Dict[str, Any]):
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE jobs SET status = 'completed', synthesis = ?, updated_at = ? WHERE id = ? AND status = 'synthesizing'",
+                (json.dumps(synthesis, ensure_ascii=False), time.time(), job_id)
+            )
+        shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+
+    def cancel(self, job_id: str) -> bool:
+        with self._lock, self._db:
+            cursor = self._db.execute(
+                "UPDATE jobs SET status = 'cancelled', updated_at = ? WHERE id = ? AND status IN ('pending', 'running', 'receiving')",
+                (time.time(), job_id)
+            )
+            if cursor.rowcount == 0:
+                return False
+            self._db.execute("UPDATE job_items SET status = 'cancelled' WHERE job_id = ? AND status IN ('pending', 'running')", (job_id,))
+        shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+        return True
+
+    def item_results(self, job_id: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._db.execute("SELECT idx, name, result FROM job_items WHERE job_id = ? ORDER BY idx", (job_id,)).fetchall()
+        results = []
+        for row in rows:
+            result = json.loads(row["result"]) if row["result"] else {"erro": "Item não processado"}
+            result["content_name"] = row["name"] or f"Item {row['idx'] + 1}"
+            results.append(result)
+        return results
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if job is None:
+                return None
+            items = self._db.execute(
+                "SELECT idx, name, content_type, status, started_at, finished_at FROM job_items WHERE job_id = ? ORDER BY idx", (job_id,)
+            ).fetchall()
+        counts = {status: sum(1 for item in items if item["status"] == status) for status in ("pending", "running", "done", "failed", "cancelled")}
+        return {
+            "job_id": job["id"],
+            "status": job["status"],
+            "criterios": job["criteria"],
+            "criado_em": job["created_at"],
+            "atualizado_em": job["updated_at"],
+            "progresso": {
+                "total": len(items),
+                "concluidos": counts["done"],
+                "falhas": counts["failed"],
+                "em_execucao": counts["running"],
+                "pendentes": counts["pending"],
+                "cancelados": counts["cancelled"],
+            },
+            "itens": [
+                {"indice": item["idx"], "nome": item["name"], "tipo": item["content_type"], "status": item["status"],
+                 "iniciado_em": item["started_at"], "finalizado_em": item["finished_at"]}
+                for item in items
+            ],
+            "sintese_final": json.loads(job["synthesis"]) if job["synthesis"] else None,
+        }
+
+    def queue_depth(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM job_items WHERE status = 'pending'").fetchone()[0]
+
+
+class JobWorkers:
+    def __init__(self, queue: JobQueue, judge, concurrency: int = JOB_WORKERS):
+        self.queue = queue
+        self.judge = judge
+        self.concurrency = concurrency
+        self._tasks: List[asyncio.Task] = []
+        self._running: Dict[str, Set[asyncio.Task]] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        # Sob o gunicorn o mestre recoloca os itens órfãos na fila uma única vez; um worker que subisse
+        # depois devolveria para 'pending' itens que outro worker está processando
+        self.resume_on_start = True
+
+    def start(self):
+        if self.resume_on_start:
+            self.queue.resume()
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker_loop()) for _ in range(self.concurrency)]
+        self.notify()
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def cancel_job(self, job_id: str) -> bool:
+        cancelled = self.queue.cancel(job_id)
+        for task in self._running.pop(job_id, set()):
+            task.cancel()
+        return cancelled
+
+    async def _worker_loop(self):
+        # Nenhuma falha de um item ou de uma síntese pode encerrar o worker: a tarefa não seria recriada
+        # até o próximo restart e os itens dela ficariam presos em 'running'
+        while True:
+            try:
+                await self._finalize_ready_jobs()
+            except Exception:
+                logger.exception("Falha ao finalizar jobs prontos para a síntese")
+            try:
+                item = await run_blocking(self.queue.claim_next_item)
+            except Exception:
+                # Banco travado por outro worker, por exemplo: tenta de novo na próxima rodada
+                logger.exception("Falha ao buscar o próximo item da fila")
+                item = None
+            if item is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=JOB_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            task = asyncio.create_task(self._process_item(item))
+            self._running.setdefault(item["job_id"], set()).add(task)
+            try:
+                await task
+            except asyncio.CancelledError:
+                # Só o cancelamento do job é absorvido; o cancelamento do próprio worker (stop) propaga
+                if asyncio.current_task().cancelling():
+                    raise
+            except Exception as e:
+                logger.exception("Falha ao processar o item %s do job %s", item["idx"], item["job_id"])
+                await self._fail_item(item, e)
+            finally:
+                self._running.get(item["job_id"], set()).discard(task)
+
+    async def _fail_item(self, item: Dict[str, Any], error: Exception):
+        try:
+            await run_blocking(self.queue.finish_item, item["job_id"], item["idx"], {"erro": f"Erro ao processar o item: {str(error)}"})
+        except Exception:
+            # Sem conseguir gravar, o item fica em 'running' e volta para a fila no próximo resume
+            logger.exception("Falha ao marcar o item %s do job %s como falho", item["idx"], item["job_id"])
+
+    async def _process_item(self, item: Dict[str, Any]):
+        result = await self.judge.analyze_content_item({
+            'source': item["path"],
+            'content_type': item["content_type"],
+            'content_hash': item["content_hash"],
+            'name': item["name"],
+        }, item["criteria"], bool(item["use_cache"]))
+        await run_blocking(self.queue.finish_item, item["job_id"], item["idx"], result)
+
+    async def _finalize_ready_jobs(self):
+        for job_id in await run_blocking(self.queue.jobs_ready_for_synthesis):
+            if not await run_blocking(self.queue.mark_synthesizing, job_id):
+                continue
+            try:
+                job = await run_blocking(self.queue.get_job, job_id)
+                results = await run_blocking(self.queue.item_results, job_id)
+                synthesis = await self.judge._synthesize_analyses(results, job["criterios"])
+            except Exception as e:
+                # O job já saiu de 'running': sem concluí-lo com o erro, ficaria preso em 'synthesizing'
+                logger.exception("Falha na síntese do job %s", job_id)
+                synthesis = {"erro": f"Erro na síntese: {str(e)}"}
+            await run_blocking(self.queue.complete_job, job_id, synthesis)
@@ -1,74 +1,395 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, AsyncIterator
 import asyncio
-from .text_agent import TextAnalysisAgent
-from .image_agent import ImageAnalysisAgent
-from .audio_agent import AudioAnalysisAgent
-from .video_agent import VideoAnalysisAgent
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.prompts import PromptTemplate
+import copy
+import importlib
+import threading
+import time
+from .executors import run_blocking, run_io, modality_semaphore, lane_for, MODALITY_LIMITS
+from .metrics import observe_stage, timed_stage, IN_FLIGHT, WAITING, COALESCED_ANALYSES
+from .whisper_pool import get_whisper_pool
+from .result_cache import ResultCache, hash_content
+from .evaluation_store import EvaluationStore
+from .artifact_store import ArtifactStore, ArtifactScope
+from .prompt_budget import compact_json, shrink_passages
+from .scoring import normalize_score, rank_analyses, score_statistics
+from .image_preprocessing import PerceptualHashIndex
+from .ingestion import sniff_content_type, looks_like_text
 import json
 import os
 
+# Falhas seguidas a partir das quais um agente é reportado como não saudável em /status
+UNHEALTHY_AFTER_FAILURES = int(os.getenv("UNHEALTHY_AFTER_FAILURES", "3"))
+# Lotes acima deste tamanho são sintetizados em níveis: grupos em paralelo e uma redução final
+SYNTHESIS_GROUP_SIZE = int(os.getenv("SYNTHESIS_GROUP_SIZE", "25"))
+SYNTHESIS_CONCURRENCY = int(os.getenv("SYNTHESIS_CONCURRENCY", "8"))
+SYNTHESIS_VERDICT_TOKENS = int(os.getenv("SYNTHESIS_VERDICT_TOKENS", "60"))
+SYNTHESIS_LIST_ITEMS = 5
+
+# Os agentes (e seus imports pesados: whisper/torch, cv2, genai) só são criados no primeiro uso
+# ou pelo preload em segundo plano, para que o processo suba rápido.
+AGENT_CLASSES = {
+    "text": (".text_agent", "TextAnalysisAgent"),
+    "image": (".image_agent", "ImageAnalysisAgent"),
+    "video": (".video_agent", "VideoAnalysisAgent"),
+    "audio": (".audio_agent", "AudioAnalysisAgent"),
+}
+AGENT_FOR_CONTENT = {"text": "text", "document": "text", "image": "image", "audio": "audio", "video": "video"}
+
+
+class _Flight:
+    # Uma análise em andamento e quantas requisições aguardam por ela
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
 class JudgeOrchestrator:
     def __init__(self):
-        self.text_agent = TextAnalysisAgent()
-        self.image_agent = ImageAnalysisAgent()
-        self.audio_agent = AudioAnalysisAgent()
-        self.video_agent = VideoAnalysisAgent()
-        
-        self.llm = ChatGoogleGenerativeAI(
-            model="gemini-1.5-flash",
-            google_api_key=os.getenv("GOOGLE_API_KEY"),
-            temperature=0.3,
-            convert_system_message_to_human=True
-        )
-        
-        self.synthesis_template = PromptTemplate(
-            input_variables=["analyses", "criteria"],
-            template="""
+        self._agents: Dict[str, Any] = {}
+        self._agent_locks = {name: threading.Lock() for name in AGENT_CLASSES}
+        self._synthesis_chain = None
+        self._group_synthesis_chain = None
+        self._synthesis_lock = threading.Lock()
+        self.load_times: Dict[str, float] = {}
+        self.load_errors: Dict[str, str] = {}
+        self.result_cache = ResultCache()
+        self.image_index = PerceptualHashIndex()
+        self.evaluations = EvaluationStore()
+        self.artifacts = ArtifactStore()
+        self._in_flight: Dict[str, _Flight] = {}
+        self.coalesced = 0
+        self.agent_health = {
+            content_type: {"analises": 0, "falhas": 0, "falhas_consecutivas": 0, "ultimo_erro": None}
+            for content_type in MODALITY_LIMITS
+        }
+
+    def _load_agent(self, name: str):
+        agent = self._agents.get(name)
+        if agent is None:
+            with self._agent_locks[name]:
+                agent = self._agents.get(name)
+                if agent is None:
+                    start = time.perf_counter()
+                    module_name, class_name = AGENT_CLASSES[name]
+                    agent_class = getattr(importlib.import_module(module_name, __package__), class_name)
+                    agent = self._agents[name] = agent_class()
+                    self.load_times[name] = time.perf_counter() - start
+        return agent
+
+    @property
+    def text_agent(self):
+        return self._load_agent("text")
+
+    @property
+    def image_agent(self):
+        return self._load_agent("image")
+
+    @property
+    def audio_agent(self):
+        return self._load_agent("audio")
+
+    @property
+    def video_agent(self):
+        return self._load_agent("video")
+
+    @property
+    def synthesis_chain(self):
+        if self._synthesis_chain is None:
+            with self._synthesis_lock:
+                if self._synthesis_chain is None:
+                    start = time.perf_counter()
+                    from langchain.prompts import PromptTemplate
+                    from .llm_client import get_llm_client
+
+                    self.llm = get_llm_client().chat_model(temperature=0.3)
+
+                    # As notas chegam calculadas (scoring.py); o modelo só faz a parte qualitativa
+                    self.synthesis_template = PromptTemplate(
+                        input_variables=["analyses", "scores", "criteria"],
+                        template="""
             Você é o jurado principal que deve sintetizar as análises de múltiplos especialistas.
-            ANÁLISES DOS ESPECIALISTAS (em formato JSON): {analyses}
+            ANÁLISES (itens individuais ou sínteses de grupos de itens, em formato JSON): {analyses}
+            ESTATÍSTICAS DAS NOTAS, NA ESCALA 0-100 (já calculadas, não recalcule): {scores}
             CRITÉRIOS GERAIS DE AVALIAÇÃO: {criteria}
-            Com base nas análises individuais, forneça um veredicto final retornando um JSON com:
-            - pontuacao_final: (Uma pontuação geral de 0 a 100, baseada na média ponderada das pontuações individuais)
+            Com base nas análises, forneça um veredicto final retornando um JSON com:
             - veredicto_geral: Uma síntese de 2 a 3 frases sobre as submissões.
             - consenso_pontos_fortes: Uma lista de pontos fortes que apareceram em múltiplas análises.
             - areas_melhoria: Uma lista de sugestões de melhoria consolidadas.
             - recomendacao: Uma recomendação final (ex: "A proposta X é a mais promissora").
             """
-        )
-        self.synthesis_chain = self.synthesis_template | self.llm
+                    )
+                    self._synthesis_chain = self.synthesis_template | self.llm
+
+                    self.group_synthesis_template = PromptTemplate(
+                        input_variables=["analyses", "criteria"],
+                        template="""
+            Você é um jurado que resume a avaliação de um grupo de itens de um lote maior.
+            ANÁLISES DO GRUPO (em formato JSON, notas na escala 0-100): {analyses}
+            CRITÉRIOS GERAIS DE AVALIAÇÃO: {criteria}
+            Retorne um JSON com:
+            - resumo: síntese do grupo em até 3 frases
+            - pontos_fortes: lista de até 5 pontos fortes recorrentes no grupo
+            - areas_melhoria: lista de até 5 sugestões de melhoria recorrentes no grupo
+            - destaques: nomes dos itens que mais se destacaram, positiva ou negativamente
+            """
+                    )
+                    self._group_synthesis_chain = self.group_synthesis_template | self.llm
+                    self.load_times["sintese"] = time.perf_counter() - start
+        return self._synthesis_chain
+
+    @property
+    def group_synthesis_chain(self):
+        self.synthesis_chain
+        return self._group_synthesis_chain
+
+    def preload(self):
+        # Chamado em uma thread após o servidor começar a aceitar requisições; texto primeiro,
+        # por ser o caminho mais usado, e o áudio (whisper/torch) por último
+        for name in AGENT_CLASSES:
+            try:
+                self._load_agent(name)
+            except Exception as e:
+                self.load_errors[name] = str(e)
+        try:
+            self.synthesis_chain
+        except Exception as e:
+            self.load_errors["sintese"] = str(e)
     
-    def detect_content_type(self, file_path: str) -> str:
-        extension = os.path.splitext(file_path)[1].lower()
+    def after_fork(self):
+        self.result_cache.reopen()
+        self.image_index.reopen()
+        self.evaluations.reopen()
+        self.artifacts.reopen()
+
+    def detect_content_type(self, file_path: str, head: Optional[bytes] = None) -> str:
+        # Com os primeiros bytes, a assinatura do formato decide antes da extensão (membros de arquivos
+        # compactados costumam ter nomes e extensões pouco confiáveis)
+        if head:
+            sniffed = sniff_content_type(head[:16])
+            if sniffed is not None:
+                return sniffed
+        extension = os.path.splitext(file_path or '')[1].lower()
         if extension in ['.txt', '.md']: return 'text'
         if extension in ['.pdf']: return 'document'
         if extension in ['.jpg', '.jpeg', '.png', '.webp', '.gif']: return 'image'
-        if extension in ['.mp3', '.wav', '.ogg', '.m4a', '.flac']: return 'audio'
-        if extension in ['.mp4', '.mov', '.avi', '.mkv']: return 'video'
+        if extension in ['.mp3', '.wav', '.ogg', '.oga', '.opus', '.m4a', '.flac', '.mka']: return 'audio'
+        if extension in ['.mp4', '.mov', '.avi', '.mkv', '.webm', '.ogv']: return 'video'
+        if head and looks_like_text(head):
+            return 'text'
         return 'unknown'
     
-    async def analyze_single_content(self, content_input, content_type: str, criteria: str) -> Dict[str, Any]:
+    async def _agent_for(self, content_type: str):
+        name = AGENT_FOR_CONTENT.get(content_type)
+        if name is None:
+            return None
+        if name in self._agents:
+            return self._agents[name]
+        # A primeira criação importa módulos pesados; fora do event loop para não travar as demais requisições
+        return await run_blocking(self._load_agent, name)
+
+    async def analyze_single_content(self, content_input, content_type: str, criteria: str,
+                                     content_hash: Optional[str] = None, use_cache: bool = True,
+                                     content_name: Optional[str] = None) -> Dict[str, Any]:
+        try:
+            agent = await self._agent_for(content_type)
+        except Exception as e:
+            return {"erro": f"Erro ao carregar o agente: {str(e)}"}
+        if agent is None:
+            return await self._run_agent(content_input, content_type, criteria)
+
+        try:
+            # Calculado mesmo sem cache: identifica o item no armazenamento de avaliações
+            if content_hash is None:
+                content_hash = await run_blocking(hash_content, content_input, content_type)
+        except Exception as e:
+            return {"erro": f"Erro na análise do agente: {str(e)}"}
+
+        # Cada julgamento entra no histórico e no placar com o hash do próprio item, mesmo quando a análise
+        # vem do cache ou de uma quase-duplicata (cujo hash passa a ser usado só para achar o resultado)
+        entry = {"content_hash": content_hash, "content_type": content_type, "prompt_version": agent.PROMPT_VERSION, "name": content_name}
+        duplicate = None
+        if content_type == 'image' and use_cache:
+            content_input, content_hash, duplicate = await self._resolve_near_duplicate(agent, content_input, content_hash)
+
+        cache_key = self.result_cache.make_key(content_hash, criteria, content_type, agent.PROMPT_VERSION)
+        if use_cache:
+            # Com RESULT_CACHE_PATH a consulta vai ao SQLite: fora do event loop, como os demais armazenamentos
+            cached = await run_io(self.result_cache.get, cache_key)
+            if cached is not None:
+                return await self._record(criteria, self._mark_duplicate(cached, duplicate), entry)
+
+        # Sem cache de resultados, os artefatos também são reextraídos (e substituem os guardados)
+        artifacts = self.artifacts.scope(content_hash, refresh=not use_cache)
+        result = await self._join_flight(cache_key, content_input, content_type, criteria, artifacts)
+        return await self._record(criteria, self._mark_duplicate(result, duplicate), entry)
+
+    async def _record(self, criteria: str, result: Dict[str, Any], entry: Dict[str, Any]) -> Dict[str, Any]:
+        # Uma linha por requisição julgada: acertos de cache e requisições coalescidas com outro nome
+        # ou outro item (quase-duplicata) também precisam aparecer no placar
+        await run_blocking(self.evaluations.record, criteria=criteria, result=result, **entry)
+        return result
+
+    async def _join_flight(self, key: str, content_input, content_type: str, criteria: str,
+                           artifacts: ArtifactScope) -> Dict[str, Any]:
+        # Single-flight: requisições idênticas (mesmo conteúdo, critérios, modalidade e versão do prompt)
+        # que chegam enquanto a primeira ainda roda aguardam a mesma tarefa em vez de repetir a análise
+        flight = self._in_flight.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(self._run_and_cache(key, content_input, content_type, criteria, artifacts)))
+            self._in_flight[key] = flight
+            flight.task.add_done_callback(lambda _, flight=flight: self._land(key, flight))
+        else:
+            self.coalesced += 1
+            COALESCED_ANALYSES.inc(modality=content_type)
+
+        flight.waiters += 1
+        try:
+            # shield: cancelar uma requisição (cliente desconectado, job cancelado) não cancela a análise
+            # das outras; só quando a última desiste a tarefa é cancelada
+            result = await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                self._land(key, flight)
+                flight.task.cancel()
+        # Cada requisição recebe sua cópia, já que os chamadores acrescentam campos ao resultado
+        return copy.deepcopy(result)
+
+    def _land(self, key: str, flight: _Flight):
+        if self._in_flight.get(key) is flight:
+            del self._in_flight[key]
+
+    async def _run_and_cache(self, key: str, content_input, content_type: str, criteria: str,
+                             artifacts: ArtifactScope) -> Dict[str, Any]:
+        result = await self._run_agent(content_input, content_type, criteria, artifacts)
+        if "erro" not in result:
+            await run_io(self.result_cache.set, key, result)
+        return result
+
+    async def _resolve_near_duplicate(self, agent, content_input, content_hash: str):
+        # O pHash sai do mesmo pré-processamento que o agente faria; uma quase-duplicata passa a usar
+        # o hash de conteúdo da primeira ocorrência e, com ele, a mesma entrada do cache de resultados
+        try:
+            prepared = await run_blocking(agent.prepare, content_input)
+        except Exception:
+            # Imagem ilegível: o próprio agente reporta o erro (e conta na saúde do agente)
+            return content_input, content_hash, None
+        try:
+            # Varredura linear e, com IMAGE_INDEX_PATH, um commit SQLite: fora do event loop
+            duplicate = await run_blocking(self.image_index.find_or_add, prepared.phash, content_hash)
+        except Exception:
+            # O índice é só uma otimização: sem ele a imagem é analisada como inédita
+            return prepared, content_hash, None
+        if duplicate is None:
+            return prepared, content_hash, None
+        return prepared, duplicate["content_hash"], duplicate
+
+    def _mark_duplicate(self, result: Dict[str, Any], duplicate: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        if duplicate is not None:
+            result["duplicata_aproximada"] = {"hash_conteudo_original": duplicate["content_hash"], "distancia_phash": duplicate["distancia"]}
+        return result
+
+    async def _run_agent(self, content_input, content_type: str, criteria: str,
+                         artifacts: Optional[ArtifactScope] = None) -> Dict[str, Any]:
         try:
-            if content_type == 'document':
-                return self.text_agent.analyze_document(content_input, criteria)
-            elif content_type == 'image':
-                return self.image_agent.analyze(content_input, criteria)
-            elif content_type == 'audio':
-                return self.audio_agent.analyze(content_input, criteria)
-            elif content_type == 'video':
-                return self.video_agent.analyze(content_input, criteria)
-            else:
-                return {"erro": "Tipo de conteúdo não suportado"}
+            semaphore = modality_semaphore(lane_for(content_type, content_input))
+            WAITING.inc(modality=content_type)
+            try:
+                await semaphore.acquire()
+            finally:
+                WAITING.dec(modality=content_type)
+
+            IN_FLIGHT.inc(modality=content_type)
+            try:
+                result = await self._dispatch(content_input, content_type, criteria, artifacts)
+            finally:
+                IN_FLIGHT.dec(modality=content_type)
+                semaphore.release()
+            self._record_health(content_type, result)
+            return result
         except Exception as e:
             return {"erro": f"Erro na análise do agente: {str(e)}"}
+
+    async def _dispatch(self, content_input, content_type: str, criteria: str,
+                        artifacts: Optional[ArtifactScope] = None) -> Dict[str, Any]:
+        # Texto e imagem vão direto ao LLM: não há extração cara para reaproveitar entre critérios
+        if content_type == 'text':
+            return await self.text_agent.aanalyze(content_input, criteria)
+        elif content_type == 'document':
+            return await self.text_agent.aanalyze_document(content_input, criteria, artifacts)
+        elif content_type == 'image':
+            return await self.image_agent.aanalyze(content_input, criteria)
+        elif content_type == 'audio':
+            return await self.audio_agent.aanalyze(content_input, criteria, artifacts)
+        elif content_type == 'video':
+            return await self.video_agent.aanalyze(content_input, criteria, artifacts)
+        else:
+            return {"erro": "Tipo de conteúdo não suportado"}
+
+    def _record_health(self, content_type: str, result: Dict[str, Any]):
+        health = self.agent_health.get(content_type)
+        if health is None:
+            return
+        health["analises"] += 1
+        if "erro" in result:
+            health["falhas"] += 1
+            health["falhas_consecutivas"] += 1
+            health["ultimo_erro"] = result["erro"]
+        else:
+            health["falhas_consecutivas"] = 0
+
+    def get_agent_status(self) -> Dict[str, Any]:
+        agents = {}
+        for content_type in MODALITY_LIMITS:
+            health = self.agent_health[content_type]
+            name = AGENT_FOR_CONTENT[content_type]
+            agents[content_type] = {
+                "agente": AGENT_CLASSES[name][1],
+                "carregado": name in self._agents,
+                "saudavel": health["falhas_consecutivas"] < UNHEALTHY_AFTER_FAILURES,
+                "em_execucao": IN_FLIGHT.get(modality=content_type),
+                "aguardando": WAITING.get(modality=content_type),
+                "limite_concorrencia": MODALITY_LIMITS[content_type],
+                **health
+            }
+        return {
+            "status": "Online",
+            "agentes": agents,
+            "whisper": get_whisper_pool().status(),
+            "cache": self.result_cache.stats(),
+            "indice_imagens": self.image_index.stats(),
+            "avaliacoes": self.evaluations.stats(),
+            "artefatos": self.artifacts.stats(),
+            "analises_em_andamento": len(self._in_flight),
+            "requisicoes_coalescidas": self.coalesced,
+            "llm": self._llm_stats()
+        }
+
+    def _llm_stats(self) -> Optional[Dict[str, Any]]:
+        # Só reporta depois que algum agente criou o cliente, para o /status não forçar o import do langchain
+        if self._synthesis_chain is None and not self._agents:
+            return None
+        from .llm_client import get_llm_client
+        return get_llm_client().stats()
+
+    async def analyze_content_item(self, content_info: Dict, criteria: str, use_cache: bool = True) -> Dict[str, Any]:
+        source = content_info.get('source', content_info.get('path'))
+        content_type = content_info.get('content_type') or self.detect_content_type(content_info.get('path'))
+        content_hash = content_info.get('content_hash')
+        if content_type == 'text':
+            # Arquivos .txt/.md são lidos e avaliados pelo conteúdo, não pelo caminho
+            source = await run_blocking(self._read_text, source)
+        return await self.analyze_single_content(source, content_type, criteria, content_hash=content_hash, use_cache=use_cache,
+                                                 content_name=content_info.get('name'))
+
+    def _read_text(self, source) -> str:
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            return bytes(source).decode('utf-8', errors='replace')
+        with open(source, 'r', encoding='utf-8', errors='replace') as f:
+            return f.read()
     
-    async def analyze_multiple_contents(self, contents: List[Dict], criteria: str) -> Dict[str, Any]:
-        tasks = []
-        for content_info in contents:
-            path = content_info.get('path')
-            content_type = self.detect_content_type(path)
-            tasks.append(self.analyze_single_content(path, content_type, criteria))
+    async def analyze_multiple_contents(self, contents: List[Dict], criteria: str, use_cache: bool = True) -> Dict[str, Any]:
+        tasks = [self.analyze_content_item(content_info, criteria, use_cache) for content_info in contents]
         
         individual_results = await asyncio.gather(*tasks)
         
@@ -82,31 +403,100 @@ class JudgeOrchestrator:
             "sintese_final": synthesis_result
         }
     
+    async def stream_multiple_contents(self, contents: List[Dict], criteria: str, use_cache: bool = True) -> AsyncIterator[Dict[str, Any]]:
+        # Emite cada análise assim que termina (ordem de conclusão) e, por último, a síntese
+        async def analyze_indexed(index, content_info):
+            return index, await self.analyze_content_item(content_info, criteria, use_cache)
+
+        tasks = [asyncio.create_task(analyze_indexed(i, content_info)) for i, content_info in enumerate(contents)]
+        individual_results = [None] * len(contents)
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                index, result = await next_done
+                result['content_name'] = contents[index].get('name', f"Item {index+1}")
+                individual_results[index] = result
+                yield {"evento": "analise", "indice": index, "total": len(contents), "resultado": result}
+
+            synthesis_result = await self._synthesize_analyses(individual_results, criteria)
+            yield {"evento": "sintese_final", "resultado": synthesis_result}
+        finally:
+            # Se o cliente desconectar no meio do stream, as análises restantes são canceladas
+            for task in tasks:
+                task.cancel()
+    
+    def _synthesis_items(self, analyses: List[Dict]) -> List[Dict[str, Any]]:
+        # Cada item leva a nota já normalizada e um veredicto curto, para o prompt crescer pouco por item
+        verdicts, _ = shrink_passages([str(analysis.get("veredicto") or "") for analysis in analyses],
+                                      SYNTHESIS_VERDICT_TOKENS * max(1, len(analyses)))
+        items = []
+        for analysis, verdict in zip(analyses, verdicts):
+            score = normalize_score(analysis)
+            items.append({
+                "content_name": analysis.get("content_name"),
+                "nota": score,
+                "itens_com_nota": 0 if score is None else 1,
+                "veredicto": verdict or analysis.get("erro"),
+            })
+        return items
+
+    def _parse_json(self, result) -> Dict[str, Any]:
+        content = result.content if hasattr(result, 'content') else str(result)
+        try:
+            start_idx = content.find('{')
+            end_idx = content.rfind('}') + 1
+            if start_idx != -1 and end_idx != 0:
+                return json.loads(content[start_idx:end_idx])
+            return {"veredicto_geral": content}
+        except json.JSONDecodeError:
+            return {"veredicto_geral": content}
+
+    async def _synthesize_group(self, group: List[Dict[str, Any]], criteria: str, name: str, semaphore: asyncio.Semaphore) -> Dict[str, Any]:
+        scored = [(item["nota"], item["itens_com_nota"]) for item in group if item["nota"] is not None]
+        weight = sum(count for _, count in scored)
+        async with semaphore:
+            with observe_stage("llm_group_synthesis"):
+                result = await self.group_synthesis_chain.ainvoke({"analyses": compact_json(group), "criteria": criteria})
+        summary = self._parse_json(result)
+        return {
+            "grupo": name,
+            "itens": sum(item.get("itens", 1) for item in group),
+            "itens_com_nota": weight,
+            # Média do grupo ponderada pelo número de itens com nota, calculada aqui e não pelo modelo
+            "nota": round(sum(score * count for score, count in scored) / weight, 2) if weight else None,
+            "resumo": summary.get("resumo") or summary.get("veredicto_geral"),
+            "pontos_fortes": list(summary.get("pontos_fortes") or [])[:SYNTHESIS_LIST_ITEMS],
+            "areas_melhoria": list(summary.get("areas_melhoria") or [])[:SYNTHESIS_LIST_ITEMS],
+            "destaques": list(summary.get("destaques") or [])[:SYNTHESIS_LIST_ITEMS],
+        }
+
+    @timed_stage("synthesis")
     async def _synthesize_analyses(self, analyses: List[Dict], criteria: str) -> Dict[str, Any]:
         try:
-            analyses_summary = []
-            for analysis in analyses:
-                summary_item = {
-                    "content_name": analysis.get("content_name"),
-                    "pontuacao": analysis.get("pontuacao"),
-                    "pontuacao_maxima": analysis.get("pontuacao_maxima"),
-                    "veredicto": analysis.get("veredicto")
-                }
-                analyses_summary.append(summary_item)
-
-            analyses_text = json.dumps(analyses_summary, indent=2, ensure_ascii=False)
-            
-            result = self.synthesis_chain.invoke({"analyses": analyses_text, "criteria": criteria})
-            content = result.content if hasattr(result, 'content') else str(result)
-            
-            try:
-                start_idx = content.find('{')
-                end_idx = content.rfind('}') + 1
-                if start_idx != -1 and end_idx != 0:
-                    return json.loads(content[start_idx:end_idx])
-                else:
-                    return {"veredicto_geral": content}
-            except json.JSONDecodeError:
-                return {"veredicto_geral": content}
+            ranking = rank_analyses(analyses)
+            scores = score_statistics(ranking, len(analyses))
+            items = self._synthesis_items(analyses)
+
+            # Acima de SYNTHESIS_GROUP_SIZE itens, cada nível resume grupos em paralelo até caber em um prompt:
+            # o tamanho de cada prompt fica limitado e a latência cresce com o número de níveis, não de itens
+            levels = 0
+            semaphore = asyncio.Semaphore(SYNTHESIS_CONCURRENCY)
+            while len(items) > SYNTHESIS_GROUP_SIZE:
+                groups = [items[i:i + SYNTHESIS_GROUP_SIZE] for i in range(0, len(items), SYNTHESIS_GROUP_SIZE)]
+                items = await asyncio.gather(*[
+                    self._synthesize_group(group, criteria, f"{levels + 1}.{index + 1}", semaphore)
+                    for index, group in enumerate(groups)
+                ])
+                levels += 1
+
+            with observe_stage("llm_synthesis"):
+                result = await self.synthesis_chain.ainvoke({"analyses": compact_json(items), "scores": compact_json(scores), "criteria": criteria})
+            synthesis = self._parse_json(result)
+            synthesis.update({
+                "pontuacao_final": scores["media"],
+                "estatisticas_notas": scores,
+                "ranking": ranking,
+                "niveis_sintese": levels,
+            })
+            return synthesis
         except Exception as e:
-            return {"erro": str(e)}
\ No newline at end of file
+            return {"erro": str(e)}
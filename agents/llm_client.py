@@ -0,0 +1,318 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+from langchain_core.runnables import Runnable
+from .metrics import observe_stage, LLM_CALLS
+from .prompt_budget import CHARS_PER_TOKEN
+
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+# Cota compartilhada por todos os agentes e pela síntese (requisições e tokens por minuto)
+LLM_RPM = int(os.getenv("LLM_RPM", "1000"))
+LLM_TPM = int(os.getenv("LLM_TPM", "1000000"))
+# Rajada máxima, em segundos de cota: um balde cheio de um minuto inteiro estouraria a janela
+# deslizante da API logo após um período ocioso
+LLM_BURST_SECONDS = float(os.getenv("LLM_BURST_SECONDS", "5"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "120"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "1"))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "30"))
+LLM_CIRCUIT_FAILURES = int(os.getenv("LLM_CIRCUIT_FAILURES", "5"))
+LLM_CIRCUIT_RESET_SECONDS = float(os.getenv("LLM_CIRCUIT_RESET_SECONDS", "30"))
+# Tokens de saída reservados por chamada, já que o tamanho da resposta só é conhecido depois
+LLM_OUTPUT_TOKENS_ESTIMATE = int(os.getenv("LLM_OUTPUT_TOKENS_ESTIMATE", "1024"))
+IMAGE_TOKENS = 258
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class LLMUnavailableError(Exception):
+    pass
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    # Erros da API do Google trazem o status em .code; o langchain às vezes os embrulha
+    while error is not None:
+        code = getattr(error, "code", None)
+        if isinstance(code, int):
+            return int(code)
+        error = error.__cause__
+    return None
+
+
+def is_retryable(error: BaseException) -> bool:
+    if isinstance(error, (TimeoutError, asyncio.TimeoutError, ConnectionError)):
+        return True
+    return _status_code(error) in RETRYABLE_STATUS
+
+
+def estimate_tokens(parts: Iterable[Any]) -> int:
+    tokens = LLM_OUTPUT_TOKENS_ESTIMATE
+    for part in parts:
+        if isinstance(part, str):
+            tokens += len(part) // CHARS_PER_TOKEN
+        elif hasattr(part, "to_string"):
+            tokens += len(part.to_string()) // CHARS_PER_TOKEN
+        elif isinstance(part, dict) and "text" in part:
+            tokens += len(part["text"]) // CHARS_PER_TOKEN
+        else:
+            tokens += IMAGE_TOKENS
+    return tokens
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float, burst_seconds: float = LLM_BURST_SECONDS):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        # Desconta na hora (o saldo pode ficar negativo) e devolve quanto o chamador deve esperar:
+        # chamadas concorrentes ficam enfileiradas na ordem em que reservaram
+        amount = min(amount, self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = LLM_CIRCUIT_FAILURES, reset_seconds: float = LLM_CIRCUIT_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "fechado"
+        return "meio-aberto" if self.probing else "aberto"
+
+    def check(self) -> bool:
+        # Retorna True quando a chamada admitida é o teste do meio-aberto
+        with self._lock:
+            if self.opened_at is None:
+                return False
+            remaining = self.opened_at + self.reset_seconds - time.monotonic()
+            if remaining > 0 or self.probing:
+                raise LLMUnavailableError(f"Serviço de LLM indisponível após falhas seguidas; tente novamente em {max(remaining, 1):.0f}s")
+            # Meio-aberto: uma única chamada de teste decide se o circuito fecha ou reabre
+            self.probing = True
+            return True
+
+    def release_probe(self):
+        # O teste foi interrompido sem resposta da API: a próxima chamada assume o teste
+        with self._lock:
+            self.probing = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.probing or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                self.probing = False
+
+
+class LLMClient:
+    def __init__(self, rpm: int = LLM_RPM, tpm: int = LLM_TPM, timeout: float = LLM_TIMEOUT_SECONDS,
+                 max_retries: int = LLM_MAX_RETRIES):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.request_bucket = TokenBucket(rpm)
+        self.token_bucket = TokenBucket(tpm)
+        self.breaker = CircuitBreaker()
+        self._lock = threading.Lock()
+        self._genai_configured = False
+        self._chat_models: Dict[float, "RateLimitedChatModel"] = {}
+        self._vision_models: Dict[str, "RateLimitedVisionModel"] = {}
+        self.rpm = rpm
+        self.tpm = tpm
+        self.processes = 1
+        self.counters = {"chamadas": 0, "retentativas": 0, "falhas": 0, "rejeitadas_circuito": 0, "espera_cota_s": 0.0}
+
+    def share_quota(self, processes: int):
+        # Cada worker do gunicorn tem seus próprios baldes; a cota da API é dividida igualmente entre eles
+        self.processes = max(1, processes)
+        self.request_bucket = TokenBucket(self.rpm / self.processes)
+        self.token_bucket = TokenBucket(self.tpm / self.processes)
+
+    def chat_model(self, temperature: float = 0.7) -> "RateLimitedChatModel":
+        # Uma instância (e um canal gRPC com keep-alive) por temperatura, compartilhada entre agentes
+        with self._lock:
+            if temperature not in self._chat_models:
+                from langchain_google_genai import ChatGoogleGenerativeAI
+
+                model = ChatGoogleGenerativeAI(
+                    model=GEMINI_MODEL,
+                    google_api_key=os.getenv("GOOGLE_API_KEY"),
+                    temperature=temperature,
+                    convert_system_message_to_human=True,
+                    timeout=self.timeout,
+                    # As retentativas ficam nesta camada, que respeita a cota e o circuito
+                    max_retries=1
+                )
+                self._chat_models[temperature] = RateLimitedChatModel(self, model)
+            return self._chat_models[temperature]
+
+    def vision_model(self, model_name: str = GEMINI_MODEL) -> "RateLimitedVisionModel":
+        with self._lock:
+            if model_name not in self._vision_models:
+                import google.generativeai as genai
+
+                if not self._genai_configured:
+                    genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+                    self._genai_configured = True
+                self._vision_models[model_name] = RateLimitedVisionModel(self, genai.GenerativeModel(model_name))
+            return self._vision_models[model_name]
+
+    def _admit(self, tokens: int) -> Tuple[float, bool]:
+        probe = self.breaker.check()
+        wait = max(self.request_bucket.reserve(1), self.token_bucket.reserve(tokens))
+        self.counters["espera_cota_s"] += wait
+        return wait, probe
+
+    def _backoff(self, attempt: int) -> float:
+        # Backoff exponencial com jitter completo, para as retentativas não chegarem em rajada
+        return random.uniform(0, min(LLM_BACKOFF_MAX_SECONDS, LLM_BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+    def _on_error(self, error: Exception, attempt: int) -> bool:
+        # Retorna True quando vale tentar de novo
+        if not is_retryable(error):
+            # A API respondeu (ex.: requisição inválida): conta como serviço disponível para o circuito
+            self.breaker.record_success()
+            LLM_CALLS.inc(outcome="erro")
+            self.counters["falhas"] += 1
+            return False
+        self.breaker.record_failure()
+        if attempt >= self.max_retries:
+            LLM_CALLS.inc(outcome="erro")
+            self.counters["falhas"] += 1
+            return False
+        LLM_CALLS.inc(outcome="retentativa")
+        self.counters["retentativas"] += 1
+        return True
+
+    def _on_success(self):
+        self.breaker.record_success()
+        LLM_CALLS.inc(outcome="sucesso")
+
+    def _reject(self):
+        LLM_CALLS.inc(outcome="circuito_aberto")
+        self.counters["rejeitadas_circuito"] += 1
+
+    def call(self, func: Callable[[], Any], tokens: int) -> Any:
+        for attempt in range(self.max_retries + 1):
+            try:
+                wait, probe = self._admit(tokens)
+            except LLMUnavailableError:
+                self._reject()
+                raise
+            try:
+                if wait:
+                    with observe_stage("llm_rate_limit_wait"):
+                        time.sleep(wait)
+                self.counters["chamadas"] += 1
+                result = func()
+            except Exception as e:
+                if not self._on_error(e, attempt):
+                    raise
+                time.sleep(self._backoff(attempt))
+                continue
+            except BaseException:
+                if probe:
+                    self.breaker.release_probe()
+                raise
+            self._on_success()
+            return result
+
+    async def acall(self, factory: Callable[[], Any], tokens: int) -> Any:
+        for attempt in range(self.max_retries + 1):
+            try:
+                wait, probe = self._admit(tokens)
+            except LLMUnavailableError:
+                self._reject()
+                raise
+            try:
+                if wait:
+                    with observe_stage("llm_rate_limit_wait"):
+                        await asyncio.sleep(wait)
+                self.counters["chamadas"] += 1
+                result = await asyncio.wait_for(factory(), self.timeout)
+            except Exception as e:
+                if not self._on_error(e, attempt):
+                    raise
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+            except BaseException:
+                # Cancelada (cliente desconectou, job removido) antes da resposta: sem liberar o teste
+                # do meio-aberto, todas as chamadas seguintes seriam rejeitadas até reiniciar o processo
+                if probe:
+                    self.breaker.release_probe()
+                raise
+            self._on_success()
+            return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limite_rpm": self.rpm,
+            "limite_tpm": self.tpm,
+            "processos_dividindo_cota": self.processes,
+            "circuito": self.breaker.state,
+            "falhas_consecutivas": self.breaker.failures,
+            **self.counters,
+        }
+
+
+class RateLimitedChatModel(Runnable):
+    # Entra no lugar do ChatGoogleGenerativeAI em `prompt | llm`, então as chains dos agentes
+    # passam pela cota, retentativas e circuito sem mudar as chamadas invoke/ainvoke
+    def __init__(self, client: LLMClient, model):
+        self.client = client
+        self.model = model
+
+    def invoke(self, input: Any, config=None, **kwargs) -> Any:
+        return self.client.call(lambda: self.model.invoke(input, config, **kwargs), estimate_tokens([input]))
+
+    async def ainvoke(self, input: Any, config=None, **kwargs) -> Any:
+        return await self.client.acall(lambda: self.model.ainvoke(input, config, **kwargs), estimate_tokens([input]))
+
+
+class RateLimitedVisionModel:
+    def __init__(self, client: LLMClient, model):
+        self.client = client
+        self.model = model
+
+    def generate_content(self, contents, **kwargs):
+        kwargs.setdefault("request_options", {"timeout": self.client.timeout})
+        return self.client.call(lambda: self.model.generate_content(contents, **kwargs), estimate_tokens(contents))
+
+    async def generate_content_async(self, contents, **kwargs):
+        kwargs.setdefault("request_options", {"timeout": self.client.timeout})
+        return await self.client.acall(lambda: self.model.generate_content_async(contents, **kwargs), estimate_tokens(contents))
+
+
+_client: Optional[LLMClient] = None
+_client_lock = threading.Lock()
+
+
+def get_llm_client() -> LLMClient:
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = LLMClient()
+    return _client
@@ -0,0 +1,138 @@
+import asyncio
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Tuple, List
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple, List] = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(f"{self.name}_bucket{_format_labels(key + (('le', repr(bound)),))} {bucket_count}")
+                lines.append(f"{self.name}_bucket{_format_labels(key + (('le', '+Inf'),))} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[tuple(sorted(labels.items()))] = value
+
+    def get(self, **labels) -> float:
+        return self._values.get(tuple(sorted(labels.items())), 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Counter(Gauge):
+    def render(self) -> List[str]:
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} counter"
+        return lines
+
+
+STAGE_DURATION = Histogram("jurado_stage_duration_seconds", "Duração de cada etapa do pipeline de análise.")
+HTTP_REQUEST_DURATION = Histogram("jurado_http_request_duration_seconds", "Duração das requisições HTTP por rota.")
+IN_FLIGHT = Gauge("jurado_analyses_in_flight", "Análises em execução por modalidade.")
+WAITING = Gauge("jurado_analyses_waiting", "Análises aguardando vaga por modalidade.")
+STAGE_ERRORS = Counter("jurado_stage_errors_total", "Falhas por etapa do pipeline.")
+JOB_QUEUE_DEPTH = Gauge("jurado_job_queue_depth", "Itens pendentes na fila de jobs.")
+LLM_CALLS = Counter("jurado_llm_calls_total", "Chamadas ao LLM por resultado (sucesso, retentativa, erro, circuito_aberto).")
+PROMPT_TOKENS_SENT = Counter("jurado_prompt_tokens_sent_total", "Tokens estimados das entradas enviadas nos prompts, por agente.")
+PROMPT_TOKENS_SAVED = Counter("jurado_prompt_tokens_saved_total", "Tokens estimados removidos pela compactação de prompts, por agente.")
+ADMITTED = Gauge("jurado_admitted_requests", "Requisições admitidas (em execução ou na fila) por faixa.")
+ADMISSION_REJECTED = Counter("jurado_admission_rejected_total", "Requisições recusadas com 429 por faixa cheia.")
+COALESCED_ANALYSES = Counter("jurado_coalesced_analyses_total", "Análises que aguardaram uma execução idêntica já em andamento, por modalidade.")
+ARTIFACT_LOOKUPS = Counter("jurado_artifact_lookups_total", "Consultas ao armazenamento de artefatos extraídos, por tipo de artefato e resultado (hit, miss).")
+
+REGISTRY = [STAGE_DURATION, HTTP_REQUEST_DURATION, IN_FLIGHT, WAITING, STAGE_ERRORS, JOB_QUEUE_DEPTH, LLM_CALLS,
+            PROMPT_TOKENS_SENT, PROMPT_TOKENS_SAVED, COALESCED_ANALYSES, ARTIFACT_LOOKUPS, ADMITTED, ADMISSION_REJECTED]
+
+
+@contextmanager
+def observe_stage(stage: str):
+    # Funciona tanto em código síncrono quanto dentro de corrotinas (mede o tempo de parede)
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        STAGE_DURATION.observe(time.perf_counter() - start, stage=stage)
+
+
+def render_prometheus() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def timed_stage(stage: str):
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with observe_stage(stage):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with observe_stage(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
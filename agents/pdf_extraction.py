@@ -0,0 +1,18 @@
+from io import BytesIO
+from typing import List
+
+# Funções executadas nos processos do pool de extração. Ficam em um módulo próprio,
+# que importa apenas o PyPDF2 (e só quando há um PDF para abrir), para que cada worker inicie rápido.
+
+
+def open_pdf(source) -> "PyPDF2.PdfReader":
+    import PyPDF2
+
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return PyPDF2.PdfReader(BytesIO(source))
+    return PyPDF2.PdfReader(source)
+
+
+def extract_page_range(source, start: int, end: int) -> List[str]:
+    reader = open_pdf(source)
+    return [reader.pages[i].extract_text() or "" for i in range(start, end)]
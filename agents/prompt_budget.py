@@ -0,0 +1,168 @@
+import json
+import math
+import os
+import re
+from collections import Counter as TermCounter
+from typing import Any, Dict, List, Optional, Tuple
+from .metrics import PROMPT_TOKENS_SENT, PROMPT_TOKENS_SAVED
+
+# Estimativa de tokens usada em todo o pipeline (orçamentos, cota do LLM); evita uma chamada
+# extra à API de contagem antes de cada prompt
+CHARS_PER_TOKEN = 4
+PASSAGE_TOKENS = int(os.getenv("PROMPT_PASSAGE_TOKENS", "200"))
+GAP_MARKER = "\n[...]\n"
+
+STOPWORDS = set("""
+a o as os um uma uns umas de da do das dos em na no nas nos por para com sem sob sobre entre e ou mas que se
+como mais menos muito muita pouco ao aos à às pelo pela pelos pelas este esta isto esse essa isso aquele aquela
+seu sua seus suas ser ter foi são está estão não sim já também the and of to in for with on is are be
+""".split())
+
+_PAGE_NUMBER = re.compile(r"^\s*(?:p[aá]gina|page|p\.)?\s*\d{1,4}\s*(?:(?:de|of|/)\s*\d{1,4})?\s*$", re.IGNORECASE)
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?…])\s+|\n+")
+_WORD = re.compile(r"\w{3,}", re.UNICODE)
+
+
+def count_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN
+
+
+def compact_json(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def compact_json_with_report(value: Any) -> Tuple[str, Dict[str, Any]]:
+    # Compara com o json.dumps(indent=2) que os prompts usavam antes
+    compact = compact_json(value)
+    original = count_tokens(json.dumps(value, indent=2, ensure_ascii=False))
+    return compact, {"tokens_originais": original, "tokens_enviados": count_tokens(compact), "etapas": ["json_compacto"]}
+
+
+def normalize_whitespace(text: str) -> str:
+    # Só espaços no fim das linhas e sequências de linhas em branco: a indentação (código, poemas,
+    # listas aninhadas) faz parte do conteúdo julgado
+    lines = [line.rstrip() for line in text.splitlines()]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip("\n")
+
+
+def strip_boilerplate(text: str, min_repeats: int = 3) -> str:
+    # Só para texto extraído de PDF: números de página e linhas curtas repetidas (cabeçalhos e rodapés).
+    # Em texto livre essas linhas podem ser conteúdo (listas numeradas, anos, refrões)
+    lines = text.split("\n")
+    counts = TermCounter(line.strip() for line in lines if 0 < len(line.strip()) <= 80)
+    repeated = {line for line, count in counts.items() if count >= min_repeats}
+    return "\n".join(line for line in lines if not _PAGE_NUMBER.match(line) and line.strip() not in repeated)
+
+
+def _terms(text: str) -> List[str]:
+    return [word for word in _WORD.findall(text.lower()) if word not in STOPWORDS]
+
+
+def split_passages(text: str, passage_tokens: int = PASSAGE_TOKENS) -> List[str]:
+    # Agrupa frases/linhas consecutivas em trechos de tamanho parecido; funciona tanto para
+    # documentos com quebras de linha quanto para transcrições em um único parágrafo
+    max_chars = passage_tokens * CHARS_PER_TOKEN
+    passages, current, size = [], [], 0
+    for unit in _SENTENCE_BREAK.split(text):
+        unit = unit.strip()
+        if not unit:
+            continue
+        if current and size + len(unit) > max_chars:
+            passages.append(" ".join(current))
+            current, size = [], 0
+        current.append(unit)
+        size += len(unit) + 1
+    if current:
+        passages.append(" ".join(current))
+    return passages
+
+
+def select_passages(text: str, query: str, budget_tokens: int) -> str:
+    # Seleção extrativa: pontua cada trecho pelos termos dos critérios (tf-idf) e pela
+    # centralidade no documento, mantém início e fim, e devolve os escolhidos na ordem original
+    passages = split_passages(text)
+    if len(passages) <= 1:
+        return text[:budget_tokens * CHARS_PER_TOKEN]
+
+    passage_terms = [TermCounter(_terms(passage)) for passage in passages]
+    document_freq = TermCounter(term for terms in passage_terms for term in terms)
+    idf = {term: math.log(len(passages) / freq) + 1 for term, freq in document_freq.items()}
+    query_terms = set(_terms(query))
+    top_terms = {term for term, _ in document_freq.most_common(50)}
+
+    scores = []
+    for i, terms in enumerate(passage_terms):
+        total = sum(terms.values()) or 1
+        relevance = sum(terms[t] * idf.get(t, 0) for t in query_terms) / total
+        centrality = sum(terms[t] for t in top_terms) / total
+        scores.append(3 * relevance + centrality)
+    scores[0] = scores[-1] = float("inf")
+
+    budget_chars = budget_tokens * CHARS_PER_TOKEN
+    chosen, used = set(), 0
+    for i in sorted(range(len(passages)), key=lambda i: scores[i], reverse=True):
+        cost = len(passages[i]) + len(GAP_MARKER)
+        if used + cost <= budget_chars:
+            chosen.add(i)
+            used += cost
+
+    output, previous = [], -1
+    for i in sorted(chosen):
+        if output and i != previous + 1:
+            output.append(GAP_MARKER.strip())
+        output.append(passages[i])
+        previous = i
+    if previous != len(passages) - 1 and output:
+        output.append(GAP_MARKER.strip())
+    return "\n".join(output)
+
+
+def shrink_passages(passages: List[str], budget_tokens: int) -> Tuple[List[str], bool]:
+    # Divide o orçamento igualmente entre os itens (ex.: descrições de frames), cortando cada um
+    # no fim de palavra, para não perder itens inteiros da linha do tempo
+    if sum(count_tokens(passage) for passage in passages) <= budget_tokens or not passages:
+        return passages, False
+    share = max(1, budget_tokens // len(passages)) * CHARS_PER_TOKEN
+    shrunk = []
+    for passage in passages:
+        if len(passage) > share:
+            cut = passage[:share]
+            passage = (cut[:cut.rfind(" ")] if " " in cut else cut) + "…"
+        shrunk.append(passage)
+    return shrunk, True
+
+
+def compact_text(text: str, budget_tokens: Optional[int] = None, query: str = "", document: bool = False,
+                 extractive_limit: Optional[int] = None) -> Tuple[str, Dict[str, Any]]:
+    # Dentro do orçamento o texto segue intacto. Acima dele: limpeza primeiro (cabeçalhos, rodapés e
+    # números de página só em PDFs) e seleção extrativa se ainda exceder (e, se extractive_limit for
+    # dado, só até esse tamanho: acima dele o chamador decide)
+    original = count_tokens(text)
+    steps = []
+    if budget_tokens is None or original <= budget_tokens:
+        return text, {"tokens_originais": original, "tokens_enviados": original, "etapas": steps}
+    cleaned = normalize_whitespace(strip_boilerplate(text) if document else text)
+    if len(cleaned) < len(text):
+        steps.append("limpeza")
+    text = cleaned
+    tokens = count_tokens(text)
+    if tokens > budget_tokens and (extractive_limit is None or tokens <= extractive_limit):
+        text = select_passages(text, query, budget_tokens)
+        steps.append("selecao_extrativa")
+    return text, {"tokens_originais": original, "tokens_enviados": count_tokens(text), "etapas": steps}
+
+
+def merge_reports(*reports: Dict[str, Any]) -> Dict[str, Any]:
+    merged = {"tokens_originais": 0, "tokens_enviados": 0, "etapas": []}
+    for report in reports:
+        merged["tokens_originais"] += report["tokens_originais"]
+        merged["tokens_enviados"] += report["tokens_enviados"]
+        merged["etapas"] += [step for step in report["etapas"] if step not in merged["etapas"]]
+    return merged
+
+
+def record_compaction(agent: str, report: Dict[str, Any]) -> Dict[str, Any]:
+    report["tokens_economizados"] = max(0, report["tokens_originais"] - report["tokens_enviados"])
+    PROMPT_TOKENS_SENT.inc(report["tokens_enviados"], agent=agent)
+    PROMPT_TOKENS_SAVED.inc(report["tokens_economizados"], agent=agent)
+    return report
@@ -0,0 +1,148 @@
+import copy
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+from PIL import Image
+
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "1024"))
+RESULT_CACHE_TTL = int(os.getenv("RESULT_CACHE_TTL", str(24 * 3600)))
+# Caminho de um arquivo SQLite para o nível em disco; vazio desativa o nível persistente
+RESULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH", "")
+# A cada tantas gravações as linhas expiradas são apagadas do disco (também ao abrir o arquivo)
+RESULT_CACHE_PURGE_EVERY = int(os.getenv("RESULT_CACHE_PURGE_EVERY", "256"))
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_content(content_input, content_type: str) -> str:
+    sha = hashlib.sha256()
+    if content_type == 'text':
+        sha.update(content_input.encode('utf-8'))
+    elif isinstance(content_input, (bytes, bytearray, memoryview)):
+        sha.update(content_input)
+    elif isinstance(content_input, Image.Image):
+        sha.update(content_input.tobytes())
+    else:
+        with open(content_input, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                sha.update(chunk)
+    return sha.hexdigest()
+
+
+class ResultCache:
+    def __init__(self, max_entries: int = RESULT_CACHE_MAX_ENTRIES, ttl: int = RESULT_CACHE_TTL, disk_path: str = RESULT_CACHE_PATH):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.disk_failures = 0
+        self._writes = 0
+        self.disk_path = disk_path
+        self._db = None
+        if disk_path:
+            self._db = self._connect()
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        try:
+            db = sqlite3.connect(self.disk_path, check_same_thread=False, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)")
+            db.execute("CREATE INDEX IF NOT EXISTS idx_results_expires ON results (expires_at)")
+            db.commit()
+        except sqlite3.Error:
+            # Arquivo inacessível ou corrompido: o cache segue só em memória em vez de impedir o processo de subir
+            self.disk_failures += 1
+            return None
+        self._purge(db)
+        return db
+
+    def _purge(self, db: sqlite3.Connection):
+        # Leituras já ignoram linhas vencidas; sem apagá-las o arquivo cresceria sem limite
+        try:
+            with db:
+                db.execute("DELETE FROM results WHERE expires_at <= ?", (time.time(),))
+        except sqlite3.Error:
+            self.disk_failures += 1
+
+    def reopen(self):
+        # Conexões SQLite não sobrevivem a um fork: cada worker do gunicorn abre a sua
+        if self.disk_path:
+            self._db = self._connect()
+
+    def make_key(self, content_hash: str, criteria: str, content_type: str, prompt_version: str) -> str:
+        raw = "\x1f".join([content_hash, criteria, content_type, prompt_version])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return copy.deepcopy(value)
+                del self._entries[key]
+
+            if self._db is not None:
+                try:
+                    row = self._db.execute("SELECT value, expires_at FROM results WHERE key = ?", (key,)).fetchone()
+                    value = json.loads(row[0]) if row is not None and row[1] > now else None
+                except (sqlite3.Error, ValueError):
+                    # Banco travado ou corrompido: conta como miss e a análise roda normalmente
+                    self.disk_failures += 1
+                    value = None
+                if value is not None:
+                    self._store_memory(key, value, row[1])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return copy.deepcopy(value)
+
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value: Dict[str, Any]):
+        expires_at = time.time() + self.ttl
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._store_memory(key, value, expires_at)
+            if self._db is not None:
+                try:
+                    with self._db:
+                        self._db.execute(
+                            "INSERT OR REPLACE INTO results (key, value, expires_at) VALUES (?, ?, ?)",
+                            (key, json.dumps(value, ensure_ascii=False), expires_at)
+                        )
+                except sqlite3.Error:
+                    # Disco cheio ou banco travado não podem derrubar uma análise que já foi feita
+                    self.disk_failures += 1
+                self._writes += 1
+                if self._writes % RESULT_CACHE_PURGE_EVERY == 0:
+                    self._purge(self._db)
+
+    def _store_memory(self, key: str, value: Dict[str, Any], expires_at: float):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "entradas_memoria": len(self._entries),
+            "hits": self.hits,
+            "hits_disco": self.disk_hits,
+            "misses": self.misses,
+            "taxa_acerto": self.hits / total if total else 0.0,
+            "persistente": self._db is not None,
+            "falhas_disco": self.disk_failures,
+        }
@@ -0,0 +1,70 @@
+import re
+import statistics
+from typing import Any, Dict, List, Optional
+
+DEFAULT_MAX_SCORE = 100.0
+_NUMBER = re.compile(r"-?\d+(?:[.,]\d+)?")
+_FRACTION = re.compile(r"(\d+(?:[.,]\d+)?)\s*/\s*(\d+(?:[.,]\d+)?)")
+
+
+def _to_number(value) -> Optional[float]:
+    # Os modelos às vezes devolvem a nota como texto ("8,5", "nota 7")
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _NUMBER.search(str(value))
+    return float(match.group().replace(",", ".")) if match else None
+
+
+def normalize_score(analysis: Dict[str, Any]) -> Optional[float]:
+    # Nota na escala 0-100, a partir da pontuação e da escala que o próprio agente informou
+    if "erro" in analysis:
+        return None
+    raw = analysis.get("pontuacao")
+    fraction = _FRACTION.search(raw) if isinstance(raw, str) else None
+    if fraction:
+        # "17/25" já traz a escala junto da nota
+        score, maximum = (float(part.replace(",", ".")) for part in fraction.groups())
+    else:
+        score, maximum = _to_number(raw), _to_number(analysis.get("pontuacao_maxima"))
+    if score is None:
+        return None
+    if not maximum or maximum <= 0:
+        maximum = DEFAULT_MAX_SCORE
+    return round(min(100.0, max(0.0, score / maximum * 100)), 2)
+
+
+def rank_analyses(analyses: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # Ranking de competição (1, 2, 2, 4): empates dividem a posição; itens sem nota ficam de fora
+    scored = [(normalize_score(analysis), index, analysis) for index, analysis in enumerate(analyses)]
+    scored = sorted((item for item in scored if item[0] is not None), key=lambda item: (-item[0], item[1]))
+    ranking, previous = [], None
+    for position, (score, index, analysis) in enumerate(scored, 1):
+        if previous is not None and score == previous["nota_normalizada"]:
+            position = previous["posicao"]
+        previous = {
+            "posicao": position,
+            "indice": index,
+            "content_name": analysis.get("content_name"),
+            "nota_normalizada": score,
+            "pontuacao": analysis.get("pontuacao"),
+            "pontuacao_maxima": analysis.get("pontuacao_maxima"),
+        }
+        ranking.append(previous)
+    return ranking
+
+
+def score_statistics(ranking: List[Dict[str, Any]], total: int) -> Dict[str, Any]:
+    scores = [entry["nota_normalizada"] for entry in ranking]
+    if not scores:
+        return {"itens": total, "itens_com_nota": 0, "media": None, "mediana": None, "minima": None, "maxima": None, "desvio_padrao": None}
+    return {
+        "itens": total,
+        "itens_com_nota": len(scores),
+        "media": round(statistics.fmean(scores), 2),
+        "mediana": round(statistics.median(scores), 2),
+        "minima": min(scores),
+        "maxima": max(scores),
+        "desvio_padrao": round(statistics.pstdev(scores), 2),
+    }
@@ -1,18 +1,38 @@
 import os
-from langchain_google_genai import ChatGoogleGenerativeAI
+import asyncio
 from langchain.prompts import PromptTemplate
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 import json
-import PyPDF2
+from .executors import run_blocking, get_process_executor, PROCESS_WORKERS
+from .metrics import observe_stage, timed_stage
+from .llm_client import get_llm_client
+from .pdf_extraction import open_pdf, extract_page_range
+from .prompt_budget import CHARS_PER_TOKEN, count_tokens, compact_text, compact_json, record_compaction
+from .artifact_store import ArtifactScope, fetch_artifact
+
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "32"))
+# Os leitores de PDF aceitam o cabeçalho %PDF- em qualquer ponto do primeiro KB
+PDF_HEADER_SEARCH_BYTES = 1024
+TEXT_TOKEN_BUDGET = int(os.getenv("TEXT_TOKEN_BUDGET", "30000"))
+# Até este múltiplo do orçamento, o excesso é resolvido por seleção extrativa (uma chamada);
+# acima dele o texto vai para map-reduce, que avalia o documento inteiro
+TEXT_EXTRACTIVE_MAX_RATIO = float(os.getenv("TEXT_EXTRACTIVE_MAX_RATIO", "1.25"))
+TEXT_CHUNK_TOKENS = int(os.getenv("TEXT_CHUNK_TOKENS", "8000"))
+TEXT_MAP_CONCURRENCY = int(os.getenv("TEXT_MAP_CONCURRENCY", "4"))
+
+
+class DocumentError(Exception):
+    pass
+
 
 class TextAnalysisAgent:
+    # Incrementar sempre que o prompt mudar, para invalidar resultados em cache
+    PROMPT_VERSION = "3"
+    # Incrementar sempre que a extração de texto dos PDFs mudar, para invalidar os textos guardados
+    EXTRACTOR_VERSION = "1"
+
     def __init__(self):
-        self.llm = ChatGoogleGenerativeAI(
-            model="gemini-1.5-flash",
-            google_api_key=os.getenv("GOOGLE_API_KEY"),
-            temperature=0.7,
-            convert_system_message_to_human=True
-        )
+        self.llm = get_llm_client().chat_model(temperature=0.7)
         
         self.prompt_template = PromptTemplate(
             input_variables=["text", "criteria"],
@@ -31,51 +51,173 @@ class TextAnalysisAgent:
         )
         
         self.chain = self.prompt_template | self.llm
+
+        # Documentos acima do orçamento de tokens são avaliados por partes (map) e consolidados (reduce)
+        self.chunk_template = PromptTemplate(
+            input_variables=["text", "criteria", "part", "total_parts"],
+            template="""
+            Você é um jurado especialista em análise textual. Você está avaliando a parte {part} de {total_parts} de um documento longo.
+            TRECHO PARA ANÁLISE: {text}
+            CRITÉRIOS DE AVALIAÇÃO: {criteria}
+            Avalie apenas este trecho e retorne um JSON com:
+            - pontuacao: (A nota numérica que você deu ao trecho)
+            - pontuacao_maxima: (O valor máximo da escala que você utilizou. Se os critérios pediram uma escala de 0-25, este valor deve ser 25. Se não, o padrão é 100.)
+            - resumo: resumo do conteúdo do trecho em até 5 frases
+            - pontos_fortes: lista de pontos positivos
+            - pontos_melhoria: lista de sugestões de melhoria
+            """
+        )
+        self.chunk_chain = self.chunk_template | self.llm
+
+        self.reduce_template = PromptTemplate(
+            input_variables=["partial_analyses", "criteria"],
+            template="""
+            Você é um jurado especialista em análise textual. Um documento longo foi avaliado em partes, em ordem.
+            AVALIAÇÕES DAS PARTES (em formato JSON): {partial_analyses}
+            CRITÉRIOS DE AVALIAÇÃO: {criteria}
+            Consolide as avaliações em uma análise única do documento inteiro, retornando um JSON com:
+            - pontuacao: (A nota numérica que você deu ao documento)
+            - pontuacao_maxima: (O valor máximo da escala que você utilizou. Se os critérios pediram uma escala de 0-25, este valor deve ser 25. Se não, o padrão é 100.)
+            - feedback: análise detalhada
+            - pontos_fortes: lista de pontos positivos
+            - pontos_melhoria: lista de sugestões de melhoria
+            - veredicto: resumo da avaliação
+            """
+        )
+        self.reduce_chain = self.reduce_template | self.llm
     
-    def analyze(self, text: str, criteria: str = "Avaliação geral de qualidade") -> Dict[str, Any]:
+    @timed_stage("json_extraction")
+    def _parse_result(self, result) -> Dict[str, Any]:
+        content = result.content if hasattr(result, 'content') else str(result)
+        
         try:
-            result = self.chain.invoke({"text": text, "criteria": criteria})
-            content = result.content if hasattr(result, 'content') else str(result)
-            
-            try:
-                start_idx = content.find('{')
-                end_idx = content.rfind('}') + 1
-                
-                if start_idx != -1 and end_idx != 0:
-                    json_content = content[start_idx:end_idx]
-                    analysis = json.loads(json_content)
-                else:
-                    analysis = {"pontuacao": 0, "feedback": content, "pontos_fortes": [], "pontos_melhoria": [], "veredicto": "Não foi possível extrair o JSON."}
-            except json.JSONDecodeError:
-                analysis = {"pontuacao": 0, "feedback": content, "pontos_fortes": [], "pontos_melhoria": [], "veredicto": "Erro ao decodificar o JSON."}
+            start_idx = content.find('{')
+            end_idx = content.rfind('}') + 1
             
-            analysis["tipo"] = "texto"
-            analysis["agente"] = "TextAnalysisAgent"
-            
-            return analysis
-            
-        except Exception as e:
-            return {"erro": str(e), "pontuacao": 0, "feedback": f"Erro na análise: {str(e)}", "tipo": "texto", "agente": "TextAnalysisAgent"}
+            if start_idx != -1 and end_idx != 0:
+                json_content = content[start_idx:end_idx]
+                analysis = json.loads(json_content)
+            else:
+                analysis = {"pontuacao": 0, "feedback": content, "pontos_fortes": [], "pontos_melhoria": [], "veredicto": "Não foi possível extrair o JSON."}
+        except json.JSONDecodeError:
+            analysis = {"pontuacao": 0, "feedback": content, "pontos_fortes": [], "pontos_melhoria": [], "veredicto": "Erro ao decodificar o JSON."}
+        
+        analysis["tipo"] = "texto"
+        analysis["agente"] = "TextAnalysisAgent"
+        
+        return analysis
+
+    def _error_result(self, e: Exception) -> Dict[str, Any]:
+        return {"erro": str(e), "pontuacao": 0, "feedback": f"Erro na análise: {str(e)}", "tipo": "texto", "agente": "TextAnalysisAgent"}
+
+    def _split_chunks(self, text: str) -> List[str]:
+        # Agrupa linhas até o tamanho máximo de cada parte; linhas gigantes são cortadas
+        max_chars = TEXT_CHUNK_TOKENS * CHARS_PER_TOKEN
+        chunks, current, current_size = [], [], 0
+        for line in text.split("\n"):
+            while len(line) > max_chars:
+                chunks.append(line[:max_chars])
+                line = line[max_chars:]
+            if current and current_size + len(line) > max_chars:
+                chunks.append("\n".join(current))
+                current, current_size = [], 0
+            current.append(line)
+            current_size += len(line) + 1
+        if current:
+            chunks.append("\n".join(current))
+        return chunks
+
+    def _needs_map_reduce(self, text: str) -> bool:
+        return count_tokens(text) > TEXT_TOKEN_BUDGET
+
+    @timed_stage("prompt_compaction")
+    def _compact(self, text: str, criteria: str, document: bool = False):
+        return compact_text(text, TEXT_TOKEN_BUDGET, criteria, document=document,
+                            extractive_limit=int(TEXT_TOKEN_BUDGET * TEXT_EXTRACTIVE_MAX_RATIO))
+
+    def _finish(self, analysis: Dict[str, Any], compaction: Dict[str, Any]) -> Dict[str, Any]:
+        analysis["compactacao_prompt"] = record_compaction("text", compaction)
+        return analysis
+
+    def _build_chunk_inputs(self, chunks: List[str], criteria: str) -> List[Dict[str, Any]]:
+        return [{"text": chunk, "criteria": criteria, "part": i, "total_parts": len(chunks)} for i, chunk in enumerate(chunks, 1)]
+
+    def _build_reduce_inputs(self, partial_results: List[Any], criteria: str) -> Dict[str, Any]:
+        partial_analyses = []
+        for result in partial_results:
+            partial = self._parse_result(result)
+            partial_analyses.append({key: partial.get(key) for key in ("pontuacao", "pontuacao_maxima", "resumo", "pontos_fortes", "pontos_melhoria")})
+        return {"partial_analyses": compact_json(partial_analyses), "criteria": criteria}
 
-    def analyze_document(self, file_path: str, criteria: str) -> Dict[str, Any]:
+    def _mark_map_reduce(self, analysis: Dict[str, Any], num_chunks: int) -> Dict[str, Any]:
+        analysis["modo_analise"] = "map_reduce"
+        analysis["partes_analisadas"] = num_chunks
+        return analysis
+
+    async def aanalyze(self, text: str, criteria: str = "Avaliação geral de qualidade", document: bool = False) -> Dict[str, Any]:
         try:
-            _, extension = os.path.splitext(file_path)
-            
-            extracted_text = ""
-            if extension.lower() == '.pdf':
-                with open(file_path, 'rb') as f:
-                    reader = PyPDF2.PdfReader(f)
-                    if reader.is_encrypted:
-                        return {"erro": "O arquivo PDF está criptografado e não pode ser lido."}
-                    for page in reader.pages:
-                        extracted_text += page.extract_text() or ""
-            else:
-                return {"erro": f"Tipo de documento '{extension}' não suportado."}
+            text, compaction = await run_blocking(self._compact, text, criteria, document)
+            if self._needs_map_reduce(text):
+                chunks = self._split_chunks(text)
+                semaphore = asyncio.Semaphore(TEXT_MAP_CONCURRENCY)
 
-            if not extracted_text.strip():
-                return {"erro": "Nenhum texto pôde ser extraído do documento."}
-            
-            return self.analyze(extracted_text, criteria)
+                async def evaluate_chunk(inputs):
+                    async with semaphore:
+                        with observe_stage("llm_text"):
+                            return await self.chunk_chain.ainvoke(inputs)
+
+                partial_results = await asyncio.gather(*[evaluate_chunk(inputs) for inputs in self._build_chunk_inputs(chunks, criteria)])
+                with observe_stage("llm_text"):
+                    result = await self.reduce_chain.ainvoke(self._build_reduce_inputs(partial_results, criteria))
+                return self._finish(self._mark_map_reduce(self._parse_result(result), len(chunks)), compaction)
+
+            with observe_stage("llm_text"):
+                result = await self.chain.ainvoke({"text": text, "criteria": criteria})
+            return self._finish(self._parse_result(result), compaction)
+        except Exception as e:
+            return self._error_result(e)
+
+    def _extract_document_text(self, document_input) -> str:
+        # O formato é conferido pelo cabeçalho, não pela extensão: arquivos gravados em disco na ingestão,
+        # itens de jobs e membros de arquivos compactados nem sempre terminam em .pdf
+        if isinstance(document_input, (bytes, bytearray, memoryview)):
+            document_input = bytes(document_input)
+            head = document_input[:PDF_HEADER_SEARCH_BYTES]
+        else:
+            with open(document_input, 'rb') as f:
+                head = f.read(PDF_HEADER_SEARCH_BYTES)
+        if b'%PDF-' not in head:
+            raise DocumentError("O documento não é um PDF válido.")
+        return self._extract_pdf_text(document_input)
+
+    @timed_stage("pdf_extraction")
+    def _extract_pdf_text(self, source) -> str:
+        reader = open_pdf(source)
+        if reader.is_encrypted:
+            raise DocumentError("O arquivo PDF está criptografado e não pode ser lido.")
 
+        num_pages = len(reader.pages)
+        if num_pages >= PDF_PARALLEL_MIN_PAGES:
+            # Faixas de páginas extraídas em paralelo no pool de processos, cada worker abrindo o PDF
+            step = max(1, -(-num_pages // (PROCESS_WORKERS * 4)))
+            executor = get_process_executor()
+            futures = [executor.submit(extract_page_range, source, start, min(start + step, num_pages)) for start in range(0, num_pages, step)]
+            pages = [text for future in futures for text in future.result()]
+        else:
+            pages = [page.extract_text() or "" for page in reader.pages]
+
+        extracted_text = "\n".join(pages)
+        if not extracted_text.strip():
+            raise DocumentError("Nenhum texto pôde ser extraído do documento.")
+        return extracted_text
+
+    async def aanalyze_document(self, file_path, criteria: str, artifacts: Optional[ArtifactScope] = None) -> Dict[str, Any]:
+        try:
+            # O texto extraído independe dos critérios: um novo julgamento do mesmo PDF não o reextrai
+            extracted_text = await fetch_artifact(artifacts, "texto_documento", self.EXTRACTOR_VERSION,
+                                                  lambda: run_blocking(self._extract_document_text, file_path))
+            return await self.aanalyze(extracted_text, criteria, document=True)
+        except DocumentError as e:
+            return {"erro": str(e)}
         except Exception as e:
-            return {"erro": f"Erro ao processar o documento: {str(e)}"}
\ No newline at end of file
+            return {"erro": f"Erro ao processar o documento: {str(e)}"}
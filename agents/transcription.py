@@ -0,0 +1,72 @@
+import asyncio
+import os
+from typing import Any, Dict, List, Optional, Tuple
+from .audio_processing import decode_audio, plan_chunks
+from .executors import run_blocking
+from .whisper_pool import get_whisper_pool, WHISPER_LANGUAGE
+
+# Transcrição com o pool do Whisper, compartilhada pelo agente de áudio e pela trilha sonora dos vídeos
+AUDIO_CHUNK_THRESHOLD_SECONDS = float(os.getenv("AUDIO_CHUNK_THRESHOLD_SECONDS", "600"))
+AUDIO_CHUNK_SECONDS = float(os.getenv("AUDIO_CHUNK_SECONDS", "120"))
+# Incrementar sempre que a montagem da transcrição mudar, para invalidar as transcrições guardadas
+TRANSCRIPTION_VERSION = "1"
+TRANSCRIPTION_ERROR_PREFIX = "[Erro na transcrição com Whisper:"
+
+
+def transcription_fingerprint() -> Dict[str, Any]:
+    # Tudo que muda o texto transcrito: backend, modelo, idioma e divisão em trechos
+    return {
+        "versao": TRANSCRIPTION_VERSION,
+        "backend": get_whisper_pool().backend.describe(),
+        "idioma": WHISPER_LANGUAGE,
+        "trechos": [AUDIO_CHUNK_THRESHOLD_SECONDS, AUDIO_CHUNK_SECONDS],
+    }
+
+
+def transcription_failed(text: str) -> bool:
+    return text.startswith(TRANSCRIPTION_ERROR_PREFIX)
+
+
+def format_transcription(text: str) -> str:
+    if not text.strip():
+        return "[Áudio não contém fala detectável]"
+    return text
+
+
+def chunk_plan(source, audio_info: Dict[str, Any]) -> List[tuple]:
+    # Gravações longas em disco são transcritas em trechos paralelos; o resto em uma só passada
+    duration = audio_info.get("duracao", 0)
+    if not isinstance(source, str) or duration <= AUDIO_CHUNK_THRESHOLD_SECONDS:
+        return [(0.0, None)]
+    return plan_chunks(source, duration, AUDIO_CHUNK_SECONDS)
+
+
+def _offset_segments(result: Dict[str, Any], offset: float) -> List[Dict[str, Any]]:
+    return [
+        {"inicio": round(segment["start"] + offset, 2), "fim": round(segment["end"] + offset, 2), "texto": segment["text"].strip()}
+        for segment in result.get("segments", [])
+    ]
+
+
+def _stitch(results: List[Dict[str, Any]], offsets: List[float]):
+    segments = [segment for result, offset in zip(results, offsets) for segment in _offset_segments(result, offset)]
+    text = " ".join(result["text"].strip() for result in results)
+    return format_transcription(text), segments
+
+
+async def atranscribe(source, audio_info: Dict[str, Any]) -> Tuple[str, List[Dict[str, Any]]]:
+    try:
+        plan = await run_blocking(chunk_plan, source, audio_info)
+        pool = get_whisper_pool()
+        # Decodificar só quando há um slot do Whisper livre mantém em memória no máximo um trecho por slot
+        semaphore = asyncio.Semaphore(pool.pool_size)
+
+        async def transcribe_chunk(start: float, duration: Optional[float]):
+            async with semaphore:
+                audio = await run_blocking(decode_audio, source, start, duration)
+                return await asyncio.wrap_future(pool.submit(audio))
+
+        results = await asyncio.gather(*[transcribe_chunk(start, duration) for start, duration in plan])
+        return _stitch(list(results), [start for start, _ in plan])
+    except Exception as e:
+        return f"{TRANSCRIPTION_ERROR_PREFIX} {str(e)}]", []
@@ -0,0 +1,84 @@
+import os
+from typing import Any, Dict, Optional
+import numpy as np
+
+# Motor de transcrição usado pelo WhisperPool: "openai" (openai-whisper sobre torch) ou
+# "faster" (faster-whisper/CTranslate2, com quantização int8 em CPU)
+WHISPER_BACKEND = os.getenv("WHISPER_BACKEND", "openai")
+# Vazio mantém o padrão de cada backend (openai-whisper: busca gulosa com fallback de temperatura; faster-whisper: 5)
+WHISPER_BEAM_SIZE = int(os.getenv("WHISPER_BEAM_SIZE") or 0) or None
+WHISPER_COMPUTE_TYPE = os.getenv("WHISPER_COMPUTE_TYPE", "int8")
+
+
+class OpenAIWhisperBackend:
+    name = "openai"
+    # Pesos do torch carregados antes do fork são herdados pelos workers do gunicorn
+    fork_safe = True
+    # O transcribe instala hooks de cache no modelo: cada slot do pool precisa da sua instância
+    shared_model = False
+
+    def __init__(self, model_name: str, beam_size: Optional[int] = WHISPER_BEAM_SIZE, **_):
+        self.model_name = model_name
+        self.beam_size = beam_size
+
+    def load(self, threads: int, workers: int):
+        import torch
+        import whisper
+
+        torch.set_num_threads(threads)
+        return whisper.load_model(self.model_name, device="cpu")
+
+    def set_threads(self, threads: int):
+        import torch
+        torch.set_num_threads(threads)
+
+    def transcribe(self, model, audio: np.ndarray, options: Dict[str, Any]) -> Dict[str, Any]:
+        if self.beam_size:
+            options = {**options, "beam_size": self.beam_size}
+        return model.transcribe(audio, fp16=False, **options)
+
+    def describe(self) -> Dict[str, Any]:
+        return {"nome": self.name, "modelo": self.model_name, "beam_size": self.beam_size, "compute_type": "float32"}
+
+
+class FasterWhisperBackend:
+    name = "faster"
+    # O CTranslate2 cria suas threads ao carregar o modelo, e threads não sobrevivem a um fork:
+    # sob o gunicorn o modelo é carregado em cada worker
+    fork_safe = False
+    # Uma instância atende chamadas concorrentes (num_workers = tamanho do pool)
+    shared_model = True
+
+    def __init__(self, model_name: str, beam_size: Optional[int] = WHISPER_BEAM_SIZE, compute_type: str = WHISPER_COMPUTE_TYPE):
+        self.model_name = model_name
+        self.beam_size = beam_size or 5
+        self.compute_type = compute_type
+
+    def load(self, threads: int, workers: int):
+        try:
+            from faster_whisper import WhisperModel
+        except ImportError:
+            raise RuntimeError("WHISPER_BACKEND=faster requer o pacote faster-whisper")
+        return WhisperModel(self.model_name, device="cpu", compute_type=self.compute_type, cpu_threads=threads, num_workers=workers)
+
+    def set_threads(self, threads: int):
+        # Fixo desde o carregamento; como o modelo nunca é carregado antes do fork, já nasce com o valor certo
+        pass
+
+    def transcribe(self, model, audio: np.ndarray, options: Dict[str, Any]) -> Dict[str, Any]:
+        segments, info = model.transcribe(audio, language=options.get("language"), beam_size=self.beam_size)
+        # Os segmentos são gerados sob demanda: a decodificação acontece ao consumir o iterador
+        segments = [{"start": segment.start, "end": segment.end, "text": segment.text} for segment in segments]
+        return {"text": "".join(segment["text"] for segment in segments), "segments": segments, "language": info.language}
+
+    def describe(self) -> Dict[str, Any]:
+        return {"nome": self.name, "modelo": self.model_name, "beam_size": self.beam_size, "compute_type": self.compute_type}
+
+
+BACKENDS = {backend.name: backend for backend in (OpenAIWhisperBackend, FasterWhisperBackend)}
+
+
+def create_backend(name: str, model_name: str, **options):
+    if name not in BACKENDS:
+        raise ValueError(f"WHISPER_BACKEND desconhecido: '{name}' (opções: {', '.join(BACKENDS)})")
+    return BACKENDS[name](model_name, **options)
@@ -1,30 +1,55 @@
 import os
+import asyncio
 import cv2
 from PIL import Image
-import google.generativeai as genai
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.prompts import PromptTemplate
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
+from io import BytesIO
 import json
 import numpy as np
+from .executors import run_blocking
+from .metrics import observe_stage, timed_stage
+from .llm_client import get_llm_client, GEMINI_MODEL
+from .audio_processing import probe_audio
+from .transcription import atranscribe, transcription_failed, transcription_fingerprint
+from .prompt_budget import count_tokens, shrink_passages, compact_text, compact_json_with_report, merge_reports, record_compaction
+from .artifact_store import ArtifactScope, fetch_artifact, fingerprint
+
+VIDEO_SAMPLE_FPS = float(os.getenv("VIDEO_SAMPLE_FPS", "2"))
+VIDEO_FRAME_MAX_EDGE = int(os.getenv("VIDEO_FRAME_MAX_EDGE", "768"))
+VIDEO_MIN_FRAMES = int(os.getenv("VIDEO_MIN_FRAMES", "3"))
+VIDEO_MAX_FRAMES = int(os.getenv("VIDEO_MAX_FRAMES", "12"))
+VIDEO_SECONDS_PER_FRAME = float(os.getenv("VIDEO_SECONDS_PER_FRAME", "20"))
+VIDEO_BATCH_FRAMES = os.getenv("VIDEO_BATCH_FRAMES", "1") == "1"
+# O Gemini aceita até ~20 MB de dados inline por requisição
+VIDEO_BATCH_MAX_BYTES = int(os.getenv("VIDEO_BATCH_MAX_MB", "15")) * 1024 * 1024
+VIDEO_FRAMES_TOKEN_BUDGET = int(os.getenv("VIDEO_FRAMES_TOKEN_BUDGET", "4000"))
+VIDEO_FRAME_JPEG_QUALITY = int(os.getenv("VIDEO_FRAME_JPEG_QUALITY", "80"))
+VIDEO_FRAME_CONCURRENCY = int(os.getenv("VIDEO_FRAME_CONCURRENCY", "4"))
+# A trilha sonora é transcrita pelo mesmo pool do Whisper do agente de áudio, em paralelo aos frames
+VIDEO_TRANSCRIBE_AUDIO = os.getenv("VIDEO_TRANSCRIBE_AUDIO", "1") == "1"
+VIDEO_TRANSCRIPT_TOKEN_BUDGET = int(os.getenv("VIDEO_TRANSCRIPT_TOKEN_BUDGET", "6000"))
+NO_SOUNDTRACK = "[Vídeo sem trilha de áudio]"
+FRAME_ERROR = "Erro na análise"
 
 class VideoAnalysisAgent:
+    # Incrementar sempre que o prompt mudar, para invalidar resultados em cache
+    PROMPT_VERSION = "5"
+    # Incrementar sempre que a seleção de frames, a descrição ou a leitura da trilha mudarem,
+    # para invalidar os artefatos guardados
+    EXTRACTOR_VERSION = "1"
+
     def __init__(self):
-        genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-        self.vision_model = genai.GenerativeModel('gemini-1.5-flash')
+        self.vision_model = get_llm_client().vision_model()
         
-        self.llm = ChatGoogleGenerativeAI(
-            model="gemini-1.5-flash",
-            google_api_key=os.getenv("GOOGLE_API_KEY"),
-            temperature=0.7,
-            convert_system_message_to_human=True
-        )
+        self.llm = get_llm_client().chat_model(temperature=0.7)
         
         self.prompt_template = PromptTemplate(
-            input_variables=["frame_analysis", "video_info", "criteria"],
+            input_variables=["frame_analysis", "soundtrack", "video_info", "criteria"],
             template="""
             Você é um jurado especialista em análise audiovisual. Analise o seguinte conteúdo de vídeo.
             ANÁLISE DOS FRAMES PRINCIPAIS: {frame_analysis}
+            TRANSCRIÇÃO DA TRILHA SONORA (fala e narração): {soundtrack}
             INFORMAÇÕES TÉCNICAS DO VÍDEO: {video_info}
             CRITÉRIOS DE AVALIAÇÃO: {criteria}
             
@@ -35,6 +60,7 @@ class VideoAnalysisAgent:
             - qualidade_tecnica: avaliação técnica do vídeo
             - cinematografia: análise da composição visual
             - narrativa: avaliação do conteúdo/história
+            - audio: avaliação da trilha sonora (fala, narração) e de como ela se relaciona com as imagens
             - pontos_fortes: lista de pontos positivos
             - pontos_melhoria: lista de sugestões de melhoria
             - veredicto: resumo da avaliação
@@ -43,9 +69,16 @@ class VideoAnalysisAgent:
         
         self.chain = self.prompt_template | self.llm
     
-    def _extract_video_info(self, video_path: str) -> Dict[str, Any]:
+    def _frame_budget(self, duration: float) -> int:
+        # Vídeos mais longos recebem mais frames, dentro dos limites configurados
+        return int(np.clip(round(duration / VIDEO_SECONDS_PER_FRAME), VIDEO_MIN_FRAMES, VIDEO_MAX_FRAMES))
+
+    @timed_stage("frame_extraction")
+    def _scan_video(self, video_path: str):
+        # Uma única passagem sequencial: metadados, detecção de cena e seleção de frames
+        # usam o mesmo handle, sem seeks (que redecodificam a partir do keyframe anterior).
+        cap = cv2.VideoCapture(video_path)
         try:
-            cap = cv2.VideoCapture(video_path)
             if not cap.isOpened(): raise IOError("Não foi possível abrir o vídeo")
             fps = cap.get(cv2.CAP_PROP_FPS)
             frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
@@ -53,68 +86,211 @@ class VideoAnalysisAgent:
             width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
             height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
             info = { "duracao": duration, "fps": fps, "resolucao": f"{width}x{height}" }
+
+            num_frames = self._frame_budget(duration)
+            stride = max(1, int(round(fps / VIDEO_SAMPLE_FPS))) if fps > 0 else 1
+            scale = min(1.0, VIDEO_FRAME_MAX_EDGE / max(width, height)) if width and height else 1.0
+
+            # Cada segmento da linha do tempo guarda apenas seu frame de maior mudança de cena,
+            # o que mantém a memória limitada a num_frames imagens mesmo em vídeos longos
+            best: Dict[int, tuple] = {}
+            prev_hist = None
+            index = 0
+            while cap.grab():
+                if index % stride == 0:
+                    ret, frame = cap.retrieve()
+                    if ret:
+                        thumb = cv2.resize(frame, (64, 36), interpolation=cv2.INTER_AREA)
+                        hist = cv2.calcHist([cv2.cvtColor(thumb, cv2.COLOR_BGR2HSV)], [0, 1], None, [16, 16], [0, 180, 0, 256])
+                        cv2.normalize(hist, hist)
+                        score = 1.0 if prev_hist is None else cv2.compareHist(prev_hist, hist, cv2.HISTCMP_BHATTACHARYYA)
+                        prev_hist = hist
+
+                        if frame_count > 0:
+                            segment = min(num_frames - 1, index * num_frames // frame_count)
+                        else:
+                            segment = len(best) if len(best) < num_frames else min(best, key=lambda k: best[k][0])
+                        if segment not in best or score > best[segment][0]:
+                            if scale < 1.0:
+                                frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+                            best[segment] = (score, index, frame)
+                index += 1
+
+            selected = sorted(best.values(), key=lambda item: item[1])
+            frames = [Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)) for _, _, frame in selected]
+            if fps > 0:
+                info["timestamps_frames"] = [round(frame_index / fps, 2) for _, frame_index, _ in selected]
+            return info, frames
+        finally:
             cap.release()
-            return info
+
+    def _extract_video_data(self, video_path: str):
+        try:
+            return self._scan_video(video_path)
         except Exception as e:
-            return {"erro": f"Erro ao extrair informações: {str(e)}"}
+            return {"erro": f"Erro ao extrair informações: {str(e)}"}, []
     
-    def _extract_key_frames(self, video_path: str, num_frames: int = 3) -> List[Image.Image]:
-        frames = []
+    def _probe_soundtrack(self, video_path: str) -> Optional[Dict[str, Any]]:
+        # None quando o vídeo não tem fluxo de áudio (ou a transcrição está desligada)
+        if not VIDEO_TRANSCRIBE_AUDIO:
+            return None
         try:
-            cap = cv2.VideoCapture(video_path)
-            if not cap.isOpened(): raise IOError("Não foi possível abrir o vídeo para extrair frames")
-            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-            if total_frames == 0: return []
-            frame_indices = np.linspace(0, total_frames - 1, num_frames, dtype=int)
-            for index in frame_indices:
-                cap.set(cv2.CAP_PROP_POS_FRAMES, index)
-                ret, frame = cap.read()
-                if ret:
-                    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                    pil_image = Image.fromarray(rgb_frame)
-                    frames.append(pil_image)
-            cap.release()
-            return frames
+            audio_info = probe_audio(video_path)
         except Exception as e:
-            if 'cap' in locals() and cap.isOpened(): cap.release()
-            return frames
-    
-    def _analyze_frame(self, frame: Image.Image, frame_number: int) -> str:
+            return {"erro": f"Erro ao ler a trilha de áudio: {str(e)}"}
+        return audio_info if audio_info["canais"] > 0 else None
+
+    async def _aextract_soundtrack(self, video_path: str) -> Dict[str, Any]:
+        # O ffmpeg lê só o fluxo de áudio (-vn): os frames continuam sendo decodificados uma única vez, pelo OpenCV
+        audio_info = await run_blocking(self._probe_soundtrack, video_path)
+        if audio_info is None:
+            return {"info": None, "transcricao": NO_SOUNDTRACK, "segmentos": []}
+        if "erro" in audio_info:
+            return {"info": audio_info, "transcricao": f"[{audio_info['erro']}]", "segmentos": []}
+        transcription, segments = await atranscribe(video_path, audio_info)
+        return {"info": audio_info, "transcricao": transcription, "segmentos": segments}
+
+    def _soundtrack_ok(self, artifact: Dict[str, Any]) -> bool:
+        return (artifact["info"] is None or "erro" not in artifact["info"]) and not transcription_failed(artifact["transcricao"])
+
+    async def _asoundtrack(self, video_path: str, artifacts: Optional[ArtifactScope] = None):
+        version = fingerprint(self.EXTRACTOR_VERSION, VIDEO_TRANSCRIBE_AUDIO, transcription_fingerprint() if VIDEO_TRANSCRIBE_AUDIO else None)
+        artifact = await fetch_artifact(artifacts, "trilha_video", version, lambda: self._aextract_soundtrack(video_path), self._soundtrack_ok)
+        return artifact["info"], artifact["transcricao"], artifact["segmentos"]
+
+    async def _aextract_visual(self, video_path: str) -> Dict[str, Any]:
+        video_info, frames = await run_blocking(self._extract_video_data, video_path)
+        return {"info": video_info, "descricoes": await self._adescribe_frames(frames)}
+
+    def _visual_ok(self, artifact: Dict[str, Any]) -> bool:
+        # Um frame que o modelo de visão não descreveu invalida o conjunto: o próximo julgamento tenta de novo
+        return "erro" not in artifact["info"] and not any(
+            description.split(": ", 1)[-1].startswith(FRAME_ERROR) for description in artifact["descricoes"]
+        )
+
+    def _visual_fingerprint(self) -> str:
+        settings = [VIDEO_SAMPLE_FPS, VIDEO_FRAME_MAX_EDGE, VIDEO_MIN_FRAMES, VIDEO_MAX_FRAMES, VIDEO_SECONDS_PER_FRAME,
+                    VIDEO_BATCH_FRAMES, VIDEO_BATCH_MAX_BYTES, VIDEO_FRAME_JPEG_QUALITY]
+        return fingerprint(self.EXTRACTOR_VERSION, GEMINI_MODEL, settings, self.FRAME_PROMPT, self.BATCH_FRAME_PROMPT)
+
+    async def _avisual(self, video_path: str, artifacts: Optional[ArtifactScope] = None):
+        # Frames selecionados e suas descrições independem dos critérios: um novo julgamento do mesmo vídeo
+        # não decodifica o arquivo nem chama o modelo de visão
+        artifact = await fetch_artifact(artifacts, "frames_video", self._visual_fingerprint(),
+                                        lambda: self._aextract_visual(video_path), self._visual_ok)
+        return artifact["info"], artifact["descricoes"]
+
+    FRAME_PROMPT = "Analise este frame de um vídeo. Descreva concisamente os elementos visuais principais e a composição."
+    BATCH_FRAME_PROMPT = """
+            Estas são {count} imagens extraídas de um vídeo, em ordem cronológica.
+            Para cada frame, descreva concisamente os elementos visuais principais e a composição.
+            Responda apenas com um JSON no formato {{"frames": ["descrição do frame 1", "descrição do frame 2", ...]}},
+            com exatamente {count} descrições, na mesma ordem das imagens.
+            """
+
+    @timed_stage("frame_encoding")
+    def _encode_frames(self, frames: List[Image.Image]) -> List[Dict[str, Any]]:
+        blobs = []
+        for frame in frames:
+            buffer = BytesIO()
+            frame.save(buffer, format="JPEG", quality=VIDEO_FRAME_JPEG_QUALITY)
+            blobs.append({"mime_type": "image/jpeg", "data": buffer.getvalue()})
+        return blobs
+
+    def _can_batch(self, blobs: List[Dict[str, Any]]) -> bool:
+        return VIDEO_BATCH_FRAMES and len(blobs) > 1 and sum(len(blob["data"]) for blob in blobs) <= VIDEO_BATCH_MAX_BYTES
+
+    @timed_stage("json_extraction")
+    def _parse_batch_response(self, text: str, count: int) -> Optional[List[str]]:
+        try:
+            descriptions = json.loads(text[text.find('{'):text.rfind('}') + 1]).get("frames")
+        except (json.JSONDecodeError, AttributeError):
+            return None
+        if not isinstance(descriptions, list) or len(descriptions) != count:
+            return None
+        return [f"Frame {i}: {description}" for i, description in enumerate(descriptions, 1)]
+
+    async def _aanalyze_frame(self, frame, frame_number: int) -> str:
         try:
-            prompt = "Analise este frame de um vídeo. Descreva concisamente os elementos visuais principais e a composição."
-            response = self.vision_model.generate_content([prompt, frame])
+            with observe_stage("llm_video_frame"):
+                response = await self.vision_model.generate_content_async([self.FRAME_PROMPT, frame])
             return f"Frame {frame_number}: {response.text}"
         except Exception as e:
-            return f"Frame {frame_number}: Erro na análise - {str(e)}"
-    
-    def analyze(self, video_path: str, criteria: str = "Avaliação geral") -> Dict[str, Any]:
-        try:
-            video_info = self._extract_video_info(video_path)
-            frames = self._extract_key_frames(video_path)
-            frame_analyses = [self._analyze_frame(frame, i) for i, frame in enumerate(frames, 1)]
-            frame_analysis_text = "\n\n".join(frame_analyses)
-            
-            result = self.chain.invoke({
-                "frame_analysis": frame_analysis_text,
-                "video_info": json.dumps(video_info, indent=2, ensure_ascii=False),
-                "criteria": criteria
-            })
-            content = result.content if hasattr(result, 'content') else str(result)
-            
+            return f"Frame {frame_number}: {FRAME_ERROR} - {str(e)}"
+
+    async def _adescribe_frames(self, frames: List[Image.Image]) -> List[str]:
+        # Uma única chamada multi-imagem; se o payload for grande demais ou a resposta
+        # não trouxer uma descrição por frame, cai para chamadas por frame com concorrência limitada
+        blobs = await run_blocking(self._encode_frames, frames)
+        if self._can_batch(blobs):
             try:
-                start_idx = content.find('{')
-                end_idx = content.rfind('}') + 1
-                if start_idx != -1 and end_idx != 0:
-                    analysis = json.loads(content[start_idx:end_idx])
-                else:
-                    analysis = {"pontuacao": 0, "feedback": content}
-            except json.JSONDecodeError:
+                with observe_stage("llm_video_frames_batch"):
+                    response = await self.vision_model.generate_content_async([self.BATCH_FRAME_PROMPT.format(count=len(blobs))] + blobs)
+                descriptions = self._parse_batch_response(response.text, len(blobs))
+                if descriptions is not None:
+                    return descriptions
+            except Exception:
+                pass
+
+        semaphore = asyncio.Semaphore(VIDEO_FRAME_CONCURRENCY)
+
+        async def analyze_bounded(blob, frame_number):
+            async with semaphore:
+                return await self._aanalyze_frame(blob, frame_number)
+
+        return list(await asyncio.gather(*[analyze_bounded(blob, i) for i, blob in enumerate(blobs, 1)]))
+
+    @timed_stage("prompt_compaction")
+    def _build_inputs(self, frame_analyses: List[str], transcription: str, video_info: Dict[str, Any], criteria: str):
+        # Descrições verbosas são encurtadas por igual, para todos os frames caberem no orçamento
+        original = count_tokens("\n\n".join(frame_analyses))
+        frame_analyses, shrunk = shrink_passages(frame_analyses, VIDEO_FRAMES_TOKEN_BUDGET)
+        frame_analysis = "\n".join(frame_analyses)
+        frames_report = {"tokens_originais": original, "tokens_enviados": count_tokens(frame_analysis),
+                         "etapas": ["resumo_frames"] if shrunk else []}
+        soundtrack, soundtrack_report = compact_text(transcription, VIDEO_TRANSCRIPT_TOKEN_BUDGET, criteria)
+        info, info_report = compact_json_with_report(video_info)
+        inputs = {"frame_analysis": frame_analysis, "soundtrack": soundtrack, "video_info": info, "criteria": criteria}
+        return inputs, merge_reports(frames_report, soundtrack_report, info_report)
+
+    @timed_stage("json_extraction")
+    def _parse_result(self, result, video_info: Dict[str, Any], transcription: str, segments: List[Dict[str, Any]],
+                      compaction: Dict[str, Any]) -> Dict[str, Any]:
+        content = result.content if hasattr(result, 'content') else str(result)
+        
+        try:
+            start_idx = content.find('{')
+            end_idx = content.rfind('}') + 1
+            if start_idx != -1 and end_idx != 0:
+                analysis = json.loads(content[start_idx:end_idx])
+            else:
                 analysis = {"pontuacao": 0, "feedback": content}
+        except json.JSONDecodeError:
+            analysis = {"pontuacao": 0, "feedback": content}
 
-            analysis["tipo"] = "video"
-            analysis["agente"] = "VideoAnalysisAgent"
-            analysis["info_tecnica"] = video_info
+        analysis["tipo"] = "video"
+        analysis["agente"] = "VideoAnalysisAgent"
+        analysis["info_tecnica"] = video_info
+        analysis["transcricao"] = transcription
+        analysis["segmentos_transcricao"] = segments
+        analysis["compactacao_prompt"] = record_compaction("video", compaction)
+        
+        return analysis
+
+    async def aanalyze(self, video_path: str, criteria: str = "Avaliação geral",
+                       artifacts: Optional[ArtifactScope] = None) -> Dict[str, Any]:
+        try:
+            # Frames (OpenCV + descrição pelo modelo de visão) e trilha sonora (ffmpeg + Whisper) em paralelo:
+            # o custo fica próximo do ramo mais lento, não da soma dos dois
+            (video_info, frame_analyses), (audio_info, transcription, segments) = await asyncio.gather(
+                self._avisual(video_path, artifacts), self._asoundtrack(video_path, artifacts)
+            )
+            if audio_info is not None:
+                video_info["audio"] = audio_info
+            inputs, compaction = await run_blocking(self._build_inputs, frame_analyses, transcription, video_info, criteria)
             
-            return analysis
+            with observe_stage("llm_video"):
+                result = await self.chain.ainvoke(inputs)
+            return self._parse_result(result, video_info, transcription, segments, compaction)
         except Exception as e:
-            return {"erro": str(e), "pontuacao": 0, "tipo": "video", "agente": "VideoAnalysisAgent"}
\ No newline at end of file
+            return {"erro": str(e), "pontuacao": 0, "tipo": "video", "agente": "VideoAnalysisAgent"}
@@ -0,0 +1,121 @@
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional
+import numpy as np
+from .audio_processing import SAMPLE_RATE
+from .metrics import timed_stage
+from .transcription_backends import WHISPER_BACKEND, create_backend
+
+WHISPER_MODEL = os.getenv("WHISPER_MODEL", "base")
+WHISPER_POOL_SIZE = int(os.getenv("WHISPER_POOL_SIZE", str(max(1, min(4, (os.cpu_count() or 1) // 2)))))
+WHISPER_LANGUAGE = os.getenv("WHISPER_LANGUAGE", "pt")
+# Threads por slot; vazio divide os núcleos entre slots e workers do gunicorn
+WHISPER_THREADS = int(os.getenv("WHISPER_THREADS") or 0)
+
+
+# Cada slot do pool carrega o modelo na primeira utilização (ou no warm-up). Com o openai-whisper,
+# um modelo por slot: o transcribe instala hooks de cache no modelo e não pode ser chamado
+# concorrentemente na mesma instância. O faster-whisper atende todos os slots com um modelo só.
+class WhisperPool:
+    def __init__(self, model_name: str = WHISPER_MODEL, pool_size: int = WHISPER_POOL_SIZE, backend: str = WHISPER_BACKEND, **backend_options):
+        self.model_name = model_name
+        self.pool_size = max(1, pool_size)
+        self.backend = create_backend(backend, model_name, **backend_options)
+        self._shared_model = None
+        self._load_lock = threading.Lock()
+        self._slots: "queue.Queue[Dict[str, Any]]" = queue.Queue()
+        for i in range(self.pool_size):
+            self._slots.put({"id": i, "model": None})
+        self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="whisper")
+        self.loaded_models = 0
+        self.warmed_up = False
+        # Processos que dividem a máquina (workers do gunicorn); ajustado por share_cores após o fork
+        self.processes = 1
+
+    def _threads_per_slot(self) -> int:
+        if WHISPER_THREADS:
+            return WHISPER_THREADS
+        return max(1, (os.cpu_count() or 1) // (self.pool_size * self.processes))
+
+    def _load_slot(self, slot: Dict[str, Any]):
+        if slot["model"] is None:
+            with self._load_lock:
+                if self.backend.shared_model and self._shared_model is not None:
+                    slot["model"] = self._shared_model
+                    return slot["model"]
+                # As bibliotecas do backend só são importadas quando o primeiro modelo é carregado.
+                # Os núcleos são divididos entre os slots para que as transcrições paralelas não disputem threads
+                slot["model"] = self.backend.load(self._threads_per_slot(), self.pool_size)
+                if self.backend.shared_model:
+                    self._shared_model = slot["model"]
+                self.loaded_models += 1
+        return slot["model"]
+
+    @timed_stage("whisper_transcription")
+    def _run(self, audio, options: Dict[str, Any]) -> Dict[str, Any]:
+        slot = self._slots.get()
+        try:
+            model = self._load_slot(slot)
+            return self.backend.transcribe(model, audio, options)
+        finally:
+            self._slots.put(slot)
+
+    def transcribe(self, audio, language: Optional[str] = WHISPER_LANGUAGE, **options) -> Dict[str, Any]:
+        return self.submit(audio, language=language, **options).result()
+
+    def submit(self, audio, language: Optional[str] = WHISPER_LANGUAGE, **options):
+        options["language"] = language
+        return self._executor.submit(self._run, audio, options)
+
+    def load_models(self):
+        # Só os pesos, sem inferência: é o que o processo mestre do gunicorn faz antes do fork, para que
+        # os workers herdem os modelos copy-on-write (rodar o torch antes do fork arriscaria travar os filhos)
+        slots = [self._slots.get() for _ in range(self.pool_size)]
+        try:
+            for slot in slots:
+                self._load_slot(slot)
+        finally:
+            for slot in slots:
+                self._slots.put(slot)
+
+    def share_cores(self, processes: int):
+        self.processes = max(1, processes)
+        if self.loaded_models:
+            self.backend.set_threads(self._threads_per_slot())
+
+    def warm_up(self):
+        # Um segundo de silêncio é suficiente para carregar pesos e inicializar os kernels
+        silence = np.zeros(SAMPLE_RATE, dtype=np.float32)
+        slots = [self._slots.get() for _ in range(self.pool_size)]
+        try:
+            for slot in slots:
+                self.backend.transcribe(self._load_slot(slot), silence, {"language": WHISPER_LANGUAGE})
+        finally:
+            for slot in slots:
+                self._slots.put(slot)
+        self.warmed_up = True
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "modelo": self.model_name,
+            "backend": self.backend.describe(),
+            "tamanho_pool": self.pool_size,
+            "modelos_carregados": self.loaded_models,
+            "aquecido": self.warmed_up,
+            "threads_por_slot": self._threads_per_slot(),
+        }
+
+
+_pool: Optional[WhisperPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_whisper_pool() -> WhisperPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = WhisperPool()
+    return _pool
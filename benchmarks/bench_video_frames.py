@@ -0,0 +1,91 @@
+# Compara a extração antiga de frames (um seek por frame, em uma segunda abertura
+# do vídeo) com a passagem única com detecção de cena do VideoAnalysisAgent.
+#
+# Uso: python -m benchmarks.bench_video_frames --durations 60 1800
+import argparse
+import json
+import os
+import tempfile
+import time
+import cv2
+import numpy as np
+
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+
+from agents.video_agent import VideoAnalysisAgent
+
+
+FOURCC = {"mp4": "mp4v", "avi": "XVID"}
+
+
+def write_fixture_video(path: str, seconds: int, fps: int = 24, size=(640, 360), scene_seconds: int = 7):
+    fourcc = FOURCC[os.path.splitext(path)[1].lstrip(".")]
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), fps, size)
+    rng = np.random.default_rng(0)
+    color = rng.integers(0, 255, 3)
+    for index in range(seconds * fps):
+        if index % (scene_seconds * fps) == 0:
+            color = rng.integers(0, 255, 3)
+        frame = np.empty((size[1], size[0], 3), dtype=np.uint8)
+        frame[:] = color
+        x = (index * 4) % size[0]
+        cv2.rectangle(frame, (x, 100), (x + 60, 160), (255, 255, 255), -1)
+        writer.write(frame)
+    writer.release()
+
+
+def extract_seek_baseline(path: str, num_frames: int = 3):
+    cap = cv2.VideoCapture(path)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+
+    cap = cv2.VideoCapture(path)
+    frames = []
+    for index in np.linspace(0, frame_count - 1, num_frames, dtype=int):
+        cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+        ret, frame = cap.read()
+        if ret:
+            frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+    cap.release()
+    return fps, frames
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--durations", type=int, nargs="+", default=[60, 1800])
+    parser.add_argument("--containers", nargs="+", default=["mp4", "avi"], choices=sorted(FOURCC))
+    args = parser.parse_args()
+
+    agent = VideoAnalysisAgent()
+    report = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for seconds, container in [(s, c) for s in args.durations for c in args.containers]:
+            path = os.path.join(tmp, f"fixture_{seconds}s.{container}")
+            write_fixture_video(path, seconds)
+
+            start = time.perf_counter()
+            _, baseline_frames = extract_seek_baseline(path)
+            baseline = time.perf_counter() - start
+
+            start = time.perf_counter()
+            info, frames = agent._scan_video(path)
+            single_pass = time.perf_counter() - start
+
+            report.append({
+                "duracao_s": seconds,
+                "container": container,
+                "seek_por_frame": {"tempo_s": baseline, "frames": len(baseline_frames)},
+                "passagem_unica": {
+                    "tempo_s": single_pass,
+                    "frames": len(frames),
+                    "timestamps": info.get("timestamps_frames"),
+                    "resolucao_frames": f"{frames[0].width}x{frames[0].height}" if frames else None,
+                },
+            })
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
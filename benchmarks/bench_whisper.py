@@ -0,0 +1,90 @@
+# Compara o carregamento do Whisper a cada requisição (comportamento antigo)
+# com o pool residente de agents/whisper_pool.py.
+#
+# Uso: python -m benchmarks.bench_whisper --requests 8 --seconds 10
+import argparse
+import json
+import os
+import tempfile
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import whisper
+
+from agents.whisper_pool import WhisperPool, WHISPER_MODEL
+
+
+def write_fixture_wav(path: str, seconds: float, sample_rate: int = 16000):
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    signal = 0.2 * np.sin(2 * np.pi * 220 * t) + 0.02 * np.random.default_rng(0).standard_normal(t.size)
+    with wave.open(path, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes((signal * 32767).astype(np.int16).tobytes())
+
+
+def bench_load_per_request(path: str, requests: int, model_name: str) -> list:
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        model = whisper.load_model(model_name)
+        model.transcribe(path, language="pt", fp16=False)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def bench_pool(path: str, requests: int, model_name: str, pool_size: int) -> dict:
+    pool = WhisperPool(model_name=model_name, pool_size=pool_size)
+    start = time.perf_counter()
+    pool.warm_up()
+    warm_up = time.perf_counter() - start
+
+    def one(_):
+        t0 = time.perf_counter()
+        pool.transcribe(path)
+        return time.perf_counter() - t0
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=pool_size) as executor:
+        latencies = list(executor.map(one, range(requests)))
+    return {"warm_up_s": warm_up, "latencias_s": latencies, "total_s": time.perf_counter() - start}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--model", default=WHISPER_MODEL)
+    parser.add_argument("--pool-size", type=int, default=max(1, (os.cpu_count() or 1) // 2))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "fixture.wav")
+        write_fixture_wav(path, args.seconds)
+
+        start = time.perf_counter()
+        baseline = bench_load_per_request(path, args.requests, args.model)
+        baseline_total = time.perf_counter() - start
+        pooled = bench_pool(path, args.requests, args.model, args.pool_size)
+
+    print(json.dumps({
+        "modelo": args.model,
+        "requisicoes": args.requests,
+        "carregamento_por_requisicao": {
+            "latencia_media_s": float(np.mean(baseline)),
+            "total_s": baseline_total,
+        },
+        "pool_residente": {
+            "tamanho_pool": args.pool_size,
+            "warm_up_s": pooled["warm_up_s"],
+            "latencia_media_s": float(np.mean(pooled["latencias_s"])),
+            "total_s": pooled["total_s"],
+        },
+        "speedup_total": baseline_total / pooled["total_s"] if pooled["total_s"] else None,
+    }, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# Substitutos locais para ChatGoogleGenerativeAI e genai.GenerativeModel, com latência
+# configurável, para medir o serviço sem chamar o Gemini.
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Optional
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import Runnable
+
+LLM_LATENCY = 0.5
+VISION_LATENCY = 0.8
+LATENCY_JITTER = 0.2
+# Cota simulada: acima deste número de chamadas por minuto o fake responde 429, como o Gemini
+QUOTA_RPM: Optional[int] = None
+stats = {"chamadas": 0, "rejeitadas_429": 0}
+_recent_calls: deque = deque()
+_quota_lock = threading.Lock()
+
+
+def _latency(base: float) -> float:
+    return max(0.0, base * (1 + random.uniform(-LATENCY_JITTER, LATENCY_JITTER)))
+
+
+def _check_quota():
+    from google.api_core.exceptions import ResourceExhausted
+
+    with _quota_lock:
+        stats["chamadas"] += 1
+        if QUOTA_RPM is None:
+            return
+        now = time.monotonic()
+        while _recent_calls and now - _recent_calls[0] > 60:
+            _recent_calls.popleft()
+        if len(_recent_calls) >= QUOTA_RPM:
+            stats["rejeitadas_429"] += 1
+            raise ResourceExhausted("Quota exceeded (simulado)")
+        _recent_calls.append(now)
+
+
+def fake_analysis(seed_text: str) -> str:
+    score = 40 + (sum(seed_text.encode("utf-8", errors="ignore")[:256]) % 60)
+    return json.dumps({
+        "pontuacao": score,
+        "pontuacao_maxima": 100,
+        "feedback": "Análise simulada para benchmark.",
+        "pontos_fortes": ["clareza"],
+        "pontos_melhoria": ["profundidade"],
+        "veredicto": "Resultado simulado.",
+        "pontuacao_final": score,
+        "veredicto_geral": "Síntese simulada.",
+        "resumo": "Trecho simulado.",
+    }, ensure_ascii=False)
+
+
+class FakeChatModel(Runnable):
+    def __init__(self, latency: Optional[float] = None, **kwargs):
+        self.latency = latency
+
+    def _respond(self, input: Any) -> AIMessage:
+        text = input.to_string() if hasattr(input, "to_string") else str(input)
+        return AIMessage(content=fake_analysis(text))
+
+    def invoke(self, input: Any, config=None, **kwargs) -> AIMessage:
+        time.sleep(_latency(self.latency if self.latency is not None else LLM_LATENCY))
+        _check_quota()
+        return self._respond(input)
+
+    async def ainvoke(self, input: Any, config=None, **kwargs) -> AIMessage:
+        await asyncio.sleep(_latency(self.latency if self.latency is not None else LLM_LATENCY))
+        _check_quota()
+        return self._respond(input)
+
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeGenerativeModel:
+    def __init__(self, model_name: str = "fake", latency: Optional[float] = None, **kwargs):
+        self.model_name = model_name
+        self.latency = latency
+
+    def _respond(self, parts) -> FakeResponse:
+        prompt = parts[0] if parts and isinstance(parts[0], str) else ""
+        match = re.search(r"exatamente (\d+) descrições", prompt)
+        if match:
+            count = int(match.group(1))
+            return FakeResponse(json.dumps({"frames": [f"Descrição simulada do frame {i}." for i in range(1, count + 1)]}))
+        if "frame" in prompt.lower():
+            return FakeResponse("Descrição simulada do frame.")
+        return FakeResponse(fake_analysis(prompt))
+
+    def generate_content(self, parts, **kwargs) -> FakeResponse:
+        time.sleep(_latency(self.latency if self.latency is not None else VISION_LATENCY))
+        _check_quota()
+        return self._respond(parts)
+
+    async def generate_content_async(self, parts, **kwargs) -> FakeResponse:
+        await asyncio.sleep(_latency(self.latency if self.latency is not None else VISION_LATENCY))
+        _check_quota()
+        return self._respond(parts)
+
+
+def install(llm_latency: float = LLM_LATENCY, vision_latency: float = VISION_LATENCY, jitter: float = LATENCY_JITTER,
+            quota_rpm: Optional[int] = None):
+    # Precisa ser chamado antes do primeiro uso dos agentes: o agents/llm_client importa
+    # ChatGoogleGenerativeAI e genai.GenerativeModel sob demanda, direto dos pacotes
+    global LLM_LATENCY, VISION_LATENCY, LATENCY_JITTER, QUOTA_RPM
+    LLM_LATENCY, VISION_LATENCY, LATENCY_JITTER, QUOTA_RPM = llm_latency, vision_latency, jitter, quota_rpm
+
+    import google.generativeai as genai
+    import langchain_google_genai
+
+    genai.configure = lambda **kwargs: None
+    genai.GenerativeModel = FakeGenerativeModel
+    langchain_google_genai.ChatGoogleGenerativeAI = FakeChatModel
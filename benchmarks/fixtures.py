@@ -0,0 +1,107 @@
+# Gera entradas sintéticas determinísticas para os benchmarks (texto, PDF, imagem, WAV e MP4)
+import io
+import os
+import wave
+import cv2
+import numpy as np
+from PIL import Image
+
+WORDS = ("o jurado avalia a clareza a originalidade e a qualidade técnica de cada trabalho "
+         "apresentado considerando os critérios definidos pela organização do evento").split()
+
+
+def make_text(words: int = 400, seed: int = 0) -> str:
+    rng = np.random.default_rng(seed)
+    lines = []
+    for start in range(0, words, 12):
+        lines.append(" ".join(WORDS[i] for i in rng.integers(0, len(WORDS), min(12, words - start))).capitalize() + ".")
+    return "\n".join(lines)
+
+
+def make_pdf(num_pages: int = 10, lines_per_page: int = 30) -> bytes:
+    # PDF mínimo escrito à mão: uma fonte Type1 padrão e um content stream por página
+    objects = []
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    pages_id = len(objects) + 1 + 2 * num_pages
+    kids = []
+    for page in range(num_pages):
+        text = "BT /F1 10 Tf 50 780 Td 12 TL " + " ".join(
+            f"(Pagina {page + 1} linha {line} texto de exemplo para o jurado) '" for line in range(lines_per_page)
+        ) + " ET"
+        stream = text.encode()
+        content = add(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        kids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] /Contents %d 0 R /Resources << /Font << /F1 %d 0 R >> >> >>"
+            % (pages_id, content, font)
+        ))
+    add(b"<< /Type /Pages /Kids [" + b" ".join(b"%d 0 R" % kid for kid in kids) + b"] /Count %d >>" % num_pages)
+    catalog = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % i + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog, xref)
+    return bytes(out)
+
+
+def make_image(width: int = 1920, height: int = 1080, seed: int = 0, fmt: str = "PNG") -> bytes:
+    rng = np.random.default_rng(seed)
+    gradient = np.linspace(0, 255, width, dtype=np.uint8)[None, :, None]
+    pixels = np.broadcast_to(gradient, (height, width, 3)).copy()
+    pixels[:, :, 1] = rng.integers(0, 255, dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format=fmt)
+    return buffer.getvalue()
+
+
+def make_wav(seconds: float = 10.0, sample_rate: int = 16000) -> bytes:
+    # Tom de 440 Hz com pausas a cada 2 s, para o corte por silêncio ter onde atuar
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    signal = 0.3 * np.sin(2 * np.pi * 440 * t) * ((t % 2) < 1.6)
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes((signal * 32767).astype(np.int16).tobytes())
+    return buffer.getvalue()
+
+
+def make_mp4(path: str, seconds: int = 10, fps: int = 24, size=(640, 360), scene_seconds: int = 3) -> str:
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+    rng = np.random.default_rng(0)
+    color = rng.integers(0, 255, 3)
+    for index in range(seconds * fps):
+        if index % (scene_seconds * fps) == 0:
+            color = rng.integers(0, 255, 3)
+        frame = np.empty((size[1], size[0], 3), dtype=np.uint8)
+        frame[:] = color
+        x = (index * 4) % size[0]
+        cv2.rectangle(frame, (x, 100), (x + 60, 160), (255, 255, 255), -1)
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+def build_fixtures(directory: str, pdf_pages: int = 10, audio_seconds: float = 10.0, video_seconds: int = 10) -> dict:
+    video_path = make_mp4(os.path.join(directory, "fixture.mp4"), seconds=video_seconds)
+    with open(video_path, "rb") as f:
+        video = f.read()
+    return {
+        "text": make_text().encode("utf-8"),
+        "document": make_pdf(pdf_pages),
+        "image": make_image(),
+        "audio": make_wav(audio_seconds),
+        "video": video,
+    }
@@ -0,0 +1,272 @@
+# Mede latência (p50/p95/p99), vazão e pico de RSS de todos os endpoints do main.py e de
+# JudgeOrchestrator.analyze_multiple_contents, com o Gemini substituído por stand-ins locais
+# (benchmarks/fakes.py). A saída é JSON, para comparar otimizações entre commits.
+#
+# Uso: python -m benchmarks.run_benchmarks --concurrency 1 4 16 --output resultado.json
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+SCENARIOS = ["status", "metrics", "cache_stats", "text", "document", "image", "audio", "video",
+             "multiple", "multiple_stream", "jobs", "orchestrator_multiple"]
+
+MIME_TYPES = {
+    "text": ("fixture.txt", "text/plain"),
+    "document": ("fixture.pdf", "application/pdf"),
+    "image": ("fixture.png", "image/png"),
+    "audio": ("fixture.wav", "audio/wav"),
+    "video": ("fixture.mp4", "video/mp4"),
+}
+
+
+def peak_rss_mb() -> dict:
+    # ru_maxrss é em KB no Linux e em bytes no macOS; RUSAGE_CHILDREN cobre ffmpeg e o pool de processos
+    unit = 1 if sys.platform == "darwin" else 1024
+    return {
+        "processo": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit / (1024 * 1024),
+        "filhos": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit / (1024 * 1024),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "desconhecido"
+
+
+def summarize(latencies: list, failures: int, elapsed: float) -> dict:
+    values = np.array(latencies) if latencies else np.array([0.0])
+    return {
+        "requisicoes": len(latencies),
+        "falhas": failures,
+        "latencia_s": {
+            "p50": float(np.percentile(values, 50)),
+            "p95": float(np.percentile(values, 95)),
+            "p99": float(np.percentile(values, 99)),
+            "media": float(values.mean()),
+            "max": float(values.max()),
+        },
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "duracao_s": elapsed,
+    }
+
+
+class ScenarioRunner:
+    def __init__(self, client, judge, fixtures: dict, criteria: str, use_cache: bool, job_poll: float):
+        self.client = client
+        self.judge = judge
+        self.fixtures = fixtures
+        self.criteria = criteria
+        self.form = {"criteria": criteria, "use_cache": str(use_cache).lower()}
+        self.use_cache = use_cache
+        self.job_poll = job_poll
+
+    def _file(self, content_type: str, field: str = "file"):
+        name, mime = MIME_TYPES[content_type]
+        return (field, (name, self.fixtures[content_type], mime))
+
+    def _all_files(self):
+        return [self._file(content_type, "files") for content_type in MIME_TYPES]
+
+    @staticmethod
+    def _check(response):
+        # Retorna a mensagem de erro, ou None quando a requisição foi bem-sucedida
+        if response.status_code != 200:
+            return f"HTTP {response.status_code}: {response.text[:200]}"
+        if response.headers.get("content-type", "").startswith("application/json"):
+            body = response.json()
+            if isinstance(body, dict) and body.get("success") is False:
+                return body.get("error")
+        return None
+
+    async def run(self, scenario: str):
+        if scenario == "status":
+            return self._check(await self.client.get("/status"))
+        if scenario == "metrics":
+            return self._check(await self.client.get("/metrics"))
+        if scenario == "cache_stats":
+            return self._check(await self.client.get("/cache/stats"))
+        if scenario == "text":
+            payload = {"text": self.fixtures["text"].decode("utf-8"), "criteria": self.criteria, "use_cache": self.use_cache}
+            return self._check(await self.client.post("/analyze/text", json=payload))
+        if scenario in ("document", "image", "audio", "video"):
+            return self._check(await self.client.post(f"/analyze/{scenario}", data=self.form, files=[self._file(scenario)]))
+        if scenario == "multiple":
+            return self._check(await self.client.post("/analyze/multiple", data=self.form, files=self._all_files()))
+        if scenario == "multiple_stream":
+            async with self.client.stream("POST", "/analyze/multiple/stream", data=self.form, files=self._all_files()) as response:
+                events = [json.loads(line) async for line in response.aiter_lines() if line.strip()]
+            if response.status_code != 200:
+                return f"HTTP {response.status_code}"
+            final = events[-1] if events else {}
+            return None if final.get("evento") == "sintese_final" else "Stream terminou sem síntese final"
+        if scenario == "jobs":
+            return await self._run_job()
+        if scenario == "orchestrator_multiple":
+            contents = [{"source": memoryview(self.fixtures[content_type]), "content_type": content_type, "name": name}
+                        for content_type, (name, _) in MIME_TYPES.items()]
+            result = await self.judge.analyze_multiple_contents(contents, self.criteria, use_cache=self.use_cache)
+            return result["sintese_final"].get("erro")
+        raise ValueError(f"Cenário desconhecido: {scenario}")
+
+    async def _run_job(self):
+        response = await self.client.post("/jobs", data=self.form, files=self._all_files())
+        error = self._check(response)
+        if error:
+            return error
+        job_id = response.json()["job_id"]
+        while True:
+            await asyncio.sleep(self.job_poll)
+            job = (await self.client.get(f"/jobs/{job_id}")).json()
+            if job["status"] == "completed":
+                return (job["sintese_final"] or {}).get("erro")
+            if job["status"] == "cancelled":
+                return "Job cancelado"
+
+
+async def run_level(runner: ScenarioRunner, scenario: str, concurrency: int, total: int) -> dict:
+    latencies, errors, rejected = [], [], []
+    remaining = iter(range(total))
+
+    async def worker():
+        for _ in remaining:
+            start = time.perf_counter()
+            try:
+                error = await runner.run(scenario)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            elapsed = time.perf_counter() - start
+            # Recusas do controle de admissão não são falhas: medem a sobrecarga, fora das latências atendidas
+            if error and str(error).startswith("HTTP 429"):
+                rejected.append(elapsed)
+                continue
+            latencies.append(elapsed)
+            if error:
+                errors.append(str(error))
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    report = summarize(latencies, len(errors), time.perf_counter() - start)
+    report.update({"cenario": scenario, "concorrencia": concurrency, "recusadas_429": len(rejected), "pico_rss_mb": peak_rss_mb()})
+    if errors:
+        report["exemplo_erro"] = errors[0]
+    return report
+
+
+async def run_all(args, fixtures: dict) -> list:
+    import httpx
+    import main as service
+
+    service.job_workers.start()
+    transport = httpx.ASGITransport(app=service.app)
+    results = []
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            runner = ScenarioRunner(client, service.judge, fixtures, args.criteria, args.use_cache, args.job_poll)
+            for scenario in args.scenarios:
+                if args.warmup:
+                    await run_level(runner, scenario, 1, 1)
+                for concurrency in args.concurrency:
+                    total = max(concurrency * args.rounds, args.min_requests)
+                    report = await run_level(runner, scenario, concurrency, total)
+                    print(f"{scenario} c={concurrency}: p50={report['latencia_s']['p50']:.3f}s "
+                          f"rps={report['throughput_rps']:.2f} falhas={report['falhas']} recusadas={report['recusadas_429']}", file=sys.stderr)
+                    results.append(report)
+    finally:
+        await service.job_workers.stop()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenarios", nargs="+", default=SCENARIOS, choices=SCENARIOS)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--rounds", type=int, default=3, help="Requisições por worker em cada nível")
+    parser.add_argument("--min-requests", type=int, default=5)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--vision-latency", type=float, default=0.8)
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--quota-rpm", type=int, help="Cota simulada do fake; acima dela responde 429")
+    parser.add_argument("--llm-rpm", type=int, default=100000, help="Limite do agents/llm_client (LLM_RPM)")
+    parser.add_argument("--llm-tpm", type=int, default=10 ** 9, help="Limite do agents/llm_client (LLM_TPM)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--pdf-pages", type=int, default=10)
+    parser.add_argument("--audio-seconds", type=float, default=10.0)
+    parser.add_argument("--video-seconds", type=int, default=10)
+    parser.add_argument("--criteria", default="Avaliação geral")
+    parser.add_argument("--use-cache", action="store_true", help="Mede com o cache de resultados ligado")
+    parser.add_argument("--no-warmup", dest="warmup", action="store_false")
+    parser.add_argument("--job-poll", type=float, default=0.05)
+    parser.add_argument("--output", help="Arquivo JSON de saída (padrão: stdout)")
+    args = parser.parse_args()
+
+    from benchmarks import fakes
+    from benchmarks.fixtures import build_fixtures
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Estado isolado por execução e nada de warm-up em thread concorrendo com as medições
+        os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+        os.environ["WHISPER_WARMUP"] = "0"
+        os.environ["JOBS_DIR"] = os.path.join(tmp, "jobs")
+        os.environ["JOBS_DB_PATH"] = os.path.join(tmp, "jobs.db")
+        # Notas e artefatos das execuções com backends falsos não podem ir para o placar e o armazenamento reais
+        os.environ["EVALUATIONS_DB_PATH"] = os.path.join(tmp, "evaluations.db")
+        os.environ["ARTIFACT_STORE_PATH"] = os.path.join(tmp, "artifacts.db")
+        os.environ.pop("RESULT_CACHE_PATH", None)
+        os.environ["LLM_RPM"] = str(args.llm_rpm)
+        os.environ["LLM_TPM"] = str(args.llm_tpm)
+
+        np.random.seed(args.seed)
+        fakes.random.seed(args.seed)
+        fakes.install(args.llm_latency, args.vision_latency, args.jitter, args.quota_rpm)
+        fixtures = build_fixtures(tmp, args.pdf_pages, args.audio_seconds, args.video_seconds)
+
+        started = time.time()
+        results = asyncio.run(run_all(args, fixtures))
+
+    report = {
+        "commit": git_commit(),
+        "executado_em": started,
+        "ambiente": {
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "cpus": os.cpu_count(),
+            # Sem ffmpeg o áudio não é transcrito: os cenários de áudio medem só o caminho de erro
+            "ffmpeg": shutil.which("ffmpeg") is not None and shutil.which("ffprobe") is not None,
+            "whisper_model": os.getenv("WHISPER_MODEL", "base"),
+        },
+        "configuracao": {
+            "llm_latency_s": args.llm_latency,
+            "vision_latency_s": args.vision_latency,
+            "jitter": args.jitter,
+            "quota_rpm_simulada": args.quota_rpm,
+            "llm_rpm": args.llm_rpm,
+            "llm_tpm": args.llm_tpm,
+            "use_cache": args.use_cache,
+            "rounds": args.rounds,
+            "fixtures_bytes": {name: len(data) for name, data in fixtures.items()},
+        },
+        "resultados": results,
+        "llm_fake": dict(fakes.stats),
+        "pico_rss_mb": peak_rss_mb(),
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+# Compara os backends de transcrição (agents/transcription_backends.py): fator de tempo real, memória
+# e, quando há transcrição de referência, taxa de erro por palavra.
+#
+# Cada configuração roda em um subprocesso próprio, para que a memória de um backend não contamine a
+# medição do outro. RTF = tempo de transcrição / duração do áudio (abaixo de 1 é mais rápido que o
+# tempo real). A primeira transcrição de cada configuração é descartada como warm-up.
+#
+# Uso: python -m benchmarks.transcription_backends --backends openai faster --models base small \
+#          --audio fala.wav --reference fala.txt --output transcricao.json
+import argparse
+import itertools
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from benchmarks.run_benchmarks import git_commit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    # Distância de Levenshtein entre as sequências de palavras, dividida pelo tamanho da referência
+    ref, hyp = reference.lower().split(), hypothesis.lower().split()
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        current = [i]
+        for j, hyp_word in enumerate(hyp, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_word != hyp_word)))
+        previous = current
+    return previous[-1] / max(1, len(ref))
+
+
+def run_config(config: dict) -> dict:
+    # Executado no subprocesso: carrega o backend, transcreve cada áudio e devolve as medições
+    from agents.audio_processing import SAMPLE_RATE, decode_audio
+    from agents.transcription_backends import create_backend
+
+    options = {"beam_size": config["beam_size"]}
+    if config["backend"] == "faster":
+        options["compute_type"] = config["compute_type"]
+    backend = create_backend(config["backend"], config["model"], **options)
+    rss_before = rss_mb()
+    start = time.perf_counter()
+    model = backend.load(config["threads"], 1)
+    load_s = time.perf_counter() - start
+    rss_loaded = rss_mb()
+
+    audios = [decode_audio(path) for path in config["audio"]]
+    backend.transcribe(model, audios[0][:SAMPLE_RATE], {"language": config["language"]})
+
+    files = []
+    for path, audio, reference in itertools.zip_longest(config["audio"], audios, config["reference"]):
+        start = time.perf_counter()
+        result = backend.transcribe(model, audio, {"language": config["language"]})
+        elapsed = time.perf_counter() - start
+        duration = len(audio) / SAMPLE_RATE
+        row = {"arquivo": os.path.basename(path), "duracao_s": duration, "transcricao_s": elapsed, "rtf": elapsed / duration}
+        if reference is not None:
+            with open(reference, encoding="utf-8") as f:
+                row["wer"] = word_error_rate(f.read(), result["text"])
+        row["texto"] = result["text"].strip()[:200]
+        files.append(row)
+
+    total_audio = sum(row["duracao_s"] for row in files)
+    total_time = sum(row["transcricao_s"] for row in files)
+    return {
+        **config,
+        "backend_descricao": backend.describe(),
+        "carregamento_s": load_s,
+        "rss_modelo_mb": rss_loaded - rss_before,
+        "rss_pico_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "rtf": total_time / total_audio,
+        "wer_medio": (sum(row["wer"] for row in files if "wer" in row) / len(config["reference"])) if config["reference"] else None,
+        "arquivos": files,
+    }
+
+
+def measure(config: dict, timeout: float) -> dict:
+    process = subprocess.run([sys.executable, "-m", "benchmarks.transcription_backends", "--run", json.dumps(config)],
+                             cwd=ROOT, capture_output=True, text=True, timeout=timeout)
+    if process.returncode != 0:
+        return {**config, "erro": process.stderr.strip().splitlines()[-1] if process.stderr.strip() else f"código {process.returncode}"}
+    return json.loads(process.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--run", help=argparse.SUPPRESS)
+    parser.add_argument("--backends", nargs="+", default=["openai", "faster"])
+    parser.add_argument("--models", nargs="+", default=[os.getenv("WHISPER_MODEL", "base")])
+    parser.add_argument("--compute-types", nargs="+", default=["int8"], help="Só para o backend faster")
+    parser.add_argument("--beam-sizes", nargs="+", type=int, default=[0], help="0 usa o padrão de cada backend")
+    parser.add_argument("--threads", nargs="+", type=int, default=[os.cpu_count() or 1])
+    parser.add_argument("--audio", nargs="+", help="Arquivos de áudio (padrão: WAV sintético de benchmarks/fixtures.py)")
+    parser.add_argument("--reference", nargs="+", default=[], help="Transcrições de referência (.txt), na ordem de --audio")
+    parser.add_argument("--seconds", type=float, default=30.0, help="Duração do WAV sintético")
+    parser.add_argument("--language", default=os.getenv("WHISPER_LANGUAGE", "pt"))
+    parser.add_argument("--timeout", type=float, default=1800, help="Limite por configuração, em segundos")
+    parser.add_argument("--output", help="Arquivo JSON de saída (padrão: stdout)")
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(run_config(json.loads(args.run)), ensure_ascii=False))
+        return
+    if args.reference and len(args.reference) != len(args.audio or []):
+        parser.error("--reference precisa de um arquivo por item de --audio")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        audio = [os.path.abspath(path) for path in args.audio or []]
+        if not audio:
+            from benchmarks.fixtures import make_wav
+
+            audio = [os.path.join(tmp, "fixture.wav")]
+            with open(audio[0], "wb") as f:
+                f.write(make_wav(args.seconds))
+
+        results = []
+        for backend, model, beam_size, threads in itertools.product(args.backends, args.models, args.beam_sizes, args.threads):
+            # O openai-whisper só roda em float32 na CPU
+            for compute_type in (args.compute_types if backend == "faster" else ["float32"]):
+                config = {
+                    "backend": backend, "model": model, "compute_type": compute_type, "beam_size": beam_size or None,
+                    "threads": threads, "language": args.language,
+                    "audio": audio, "reference": [os.path.abspath(path) for path in args.reference],
+                }
+                result = measure(config, args.timeout)
+                if "erro" in result:
+                    print(f"{backend}/{model}/{compute_type}: erro: {result['erro']}", file=sys.stderr)
+                else:
+                    print(f"{backend}/{model}/{compute_type} beam={beam_size or 'padrão'} threads={threads}: "
+                          f"rtf={result['rtf']:.3f} rss_pico={result['rss_pico_mb']:.0f}MB", file=sys.stderr)
+                results.append(result)
+
+    report = {
+        "commit": git_commit(),
+        "ambiente": {"python": platform.python_version(), "plataforma": platform.platform(), "cpus": os.cpu_count()},
+        "resultados": results,
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
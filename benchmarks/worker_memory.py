@@ -0,0 +1,167 @@
+# Mede a memória por worker do modo multi-processo (gunicorn.conf.py), com e sem preload_app.
+# Lê /proc/<pid>/smaps_rollup (só Linux): o RSS conta as páginas compartilhadas em todo processo que
+# as usa; o PSS as divide entre eles (a soma dos PSS é a memória real ocupada); o USS são as páginas
+# privadas de cada processo, ou seja, o custo de um worker a mais.
+#
+# Sobe o servidor de verdade (sem os fakes do Gemini: nenhuma chamada ao LLM é feita) e espera cada
+# worker terminar o preload e o warm-up do Whisper antes de medir.
+#
+# Uso: python -m benchmarks.worker_memory --workers 1 2 4 --output memoria.json
+import argparse
+import json
+import os
+import platform
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from benchmarks.run_benchmarks import git_commit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SMAPS_FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def read_memory(pid: int) -> dict:
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            name, _, rest = line.partition(":")
+            if name in SMAPS_FIELDS:
+                values[name] = int(rest.split()[0]) / 1024
+    return {
+        "pid": pid,
+        "rss_mb": values["Rss"],
+        "pss_mb": values["Pss"],
+        "uss_mb": values["Private_Clean"] + values["Private_Dirty"],
+        "compartilhada_mb": values["Shared_Clean"] + values["Shared_Dirty"],
+    }
+
+
+def child_pids(pid: int) -> list:
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        return [int(child) for child in f.read().split()]
+
+
+def fetch_status(port: int):
+    # Uma conexão nova por requisição, para o kernel distribuir entre os workers
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/status", timeout=5) as response:
+            return json.loads(response.read())
+    except OSError:
+        return None
+
+
+def wait_until_ready(port: int, workers: int, warmup: bool, timeout: float, server) -> set:
+    # Cada worker informa seu pid em /status; pronto = preload (e warm-up do Whisper) concluído
+    ready, deadline = set(), time.time() + timeout
+    while len(ready) < workers and time.time() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"gunicorn terminou com código {server.returncode}")
+        status = fetch_status(port)
+        if status is not None:
+            startup = status.get("inicializacao", {})
+            if "preload_s" in startup and (status["whisper"]["aquecido"] or not warmup):
+                ready.add(startup.get("pid"))
+        time.sleep(0.2)
+    if len(ready) < workers:
+        raise TimeoutError(f"Só {len(ready)} de {workers} workers ficaram prontos em {timeout:.0f}s")
+    return ready
+
+
+def measure(workers: int, preload: bool, args, tmp: str) -> dict:
+    port = free_port()
+    env = dict(os.environ)
+    env.update({
+        "PORT": str(port),
+        "WEB_CONCURRENCY": str(workers),
+        "GUNICORN_PRELOAD": "1" if preload else "0",
+        "WHISPER_WARMUP": "1" if args.warmup else "0",
+        "JOBS_DIR": os.path.join(tmp, f"jobs-{workers}-{int(preload)}"),
+        "JOBS_DB_PATH": os.path.join(tmp, f"jobs-{workers}-{int(preload)}.db"),
+        "EVALUATIONS_DB_PATH": os.path.join(tmp, f"evaluations-{workers}-{int(preload)}.db"),
+        "ARTIFACT_STORE_PATH": os.path.join(tmp, f"artifacts-{workers}-{int(preload)}.db"),
+    })
+    env.setdefault("GOOGLE_API_KEY", "benchmark")
+
+    start = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "-m", "gunicorn", "main:app", "-c", "gunicorn.conf.py"],
+                              cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_ready(port, workers, args.warmup, args.timeout, server)
+        ready_s = time.perf_counter() - start
+        time.sleep(args.settle)
+        master = read_memory(server.pid)
+        worker_rows = [read_memory(pid) for pid in child_pids(server.pid)]
+    finally:
+        server.send_signal(signal.SIGTERM)
+        try:
+            server.wait(timeout=60)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+    total_pss = master["pss_mb"] + sum(row["pss_mb"] for row in worker_rows)
+    return {
+        "modo": "preload" if preload else "sem_preload",
+        "workers": workers,
+        "pronto_s": ready_s,
+        "mestre": master,
+        "processos_worker": worker_rows,
+        "pss_total_mb": total_pss,
+        "uss_medio_worker_mb": sum(row["uss_mb"] for row in worker_rows) / len(worker_rows),
+        "rss_medio_worker_mb": sum(row["rss_mb"] for row in worker_rows) / len(worker_rows),
+    }
+
+
+def main():
+    if not os.path.exists("/proc/self/smaps_rollup"):
+        sys.exit("Requer Linux (/proc/<pid>/smaps_rollup)")
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--modes", nargs="+", default=["preload", "sem_preload"], choices=["preload", "sem_preload"])
+    parser.add_argument("--no-warmup", dest="warmup", action="store_false", help="Mede sem o warm-up do Whisper em cada worker")
+    parser.add_argument("--timeout", type=float, default=900, help="Espera máxima pelos workers, em segundos")
+    parser.add_argument("--settle", type=float, default=3, help="Pausa entre o último worker pronto e a medição")
+    parser.add_argument("--output", help="Arquivo JSON de saída (padrão: stdout)")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in args.modes:
+            for workers in args.workers:
+                result = measure(workers, mode == "preload", args, tmp)
+                print(f"{mode} workers={workers}: pss_total={result['pss_total_mb']:.0f}MB "
+                      f"uss_medio_worker={result['uss_medio_worker_mb']:.0f}MB", file=sys.stderr)
+                results.append(result)
+
+    report = {
+        "commit": git_commit(),
+        "ambiente": {
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "cpus": os.cpu_count(),
+            "whisper_model": os.getenv("WHISPER_MODEL", "base"),
+            "whisper_pool_size": os.getenv("WHISPER_POOL_SIZE", "padrão"),
+            "warmup": args.warmup,
+        },
+        "resultados": results,
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+# Modo multi-processo: gunicorn com workers uvicorn. Com preload_app o main.py (agentes e pesos do
+# Whisper) é carregado uma vez no mestre e herdado copy-on-write pelos workers após o fork.
+# Uso: gunicorn main:app -c gunicorn.conf.py
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '10000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+worker_class = "uvicorn_worker.UvicornWorker"
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") == "1"
+# Análises longas rodam no event loop do worker, que continua respondendo ao heartbeat do mestre
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "60"))
+
+
+def on_starting(server):
+    # Itens de jobs interrompidos voltam para a fila aqui, uma única vez, e não na subida de cada worker
+    from agents.job_queue import JobQueue
+
+    JobQueue().resume()
+    if server.cfg.preload_app:
+        import main
+
+        main.prepare_for_fork()
+
+
+def post_fork(server, worker):
+    import main
+
+    main.after_fork(server.cfg.workers)
@@ -108,6 +108,12 @@ function SingleAnalysis() {
   );
 }
 
+function rankResults(results) {
+  const sorted = [...results].sort((a, b) => (b.pontuacao || 0) - (a.pontuacao || 0));
+  const medals = ['🥇', '🥈', '🥉'];
+  return sorted.map((item, index) => ({ ...item, posicao: index + 1, medalha: medals[index] }));
+}
+
 function CompetitionAnalysis() {
   const [files, setFiles] = useState([]);
   const [criteria, setCriteria] = useState('');
@@ -122,23 +128,39 @@ function CompetitionAnalysis() {
     const formData = new FormData();
     files.forEach(file => { formData.append('files', file); });
     formData.append('criteria', criteria || 'Avaliação comparativa de qualidade');
-    const backendUrl = `${import.meta.env.VITE_API_URL}/analyze/multiple`;
+    const backendUrl = `${import.meta.env.VITE_API_URL}/analyze/multiple/stream`;
+    // Cada análise chega como uma linha NDJSON assim que termina; a síntese vem por último
+    const partial = { analises_individuais: [], sintese_final: {} };
+    const handleEvent = (event) => {
+      if (event.evento === 'analise') {
+        partial.analises_individuais = rankResults([...partial.analises_individuais, event.resultado]);
+      } else if (event.evento === 'sintese_final') {
+        if (event.resultado?.erro) { setError(event.resultado.erro); }
+        partial.sintese_final = event.resultado || {};
+      }
+      setResult({ ...partial });
+    };
     try {
-      const response = await axios.post(backendUrl, formData);
-      if (response.data.success) {
-        const sortedData = response.data.data;
-        sortedData.analises_individuais.sort((a, b) => (b.pontuacao || 0) - (a.pontuacao || 0));
-        sortedData.analises_individuais.forEach((item, index) => {
-          item.posicao = index + 1;
-          if (index === 0) item.medalha = '🥇';
-          if (index === 1) item.medalha = '🥈';
-          if (index === 2) item.medalha = '🥉';
-        });
-        setResult(sortedData);
-      } else { setError(response.data.error || 'Ocorreu um erro na análise.'); }
-    } catch (err) {
-      const errorMsg = err.response?.data?.detail || 'Erro de conexão com o servidor. O back-end está rodando?';
-      setError(errorMsg);
+      const response = await fetch(backendUrl, { method: 'POST', body: formData, headers: { Accept: 'application/x-ndjson' } });
+      if (!response.ok) {
+        const body = await response.json().catch(() => ({}));
+        setError(body.detail || 'Ocorreu um erro na análise.');
+        return;
+      }
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      for (;;) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+        lines.filter(line => line.trim()).forEach(line => handleEvent(JSON.parse(line)));
+      }
+      if (buffer.trim()) handleEvent(JSON.parse(buffer));
+    } catch {
+      setError('Erro de conexão com o servidor. O back-end está rodando?');
     } finally { setIsLoading(false); }
   };
   return (
@@ -161,7 +183,8 @@ function CompetitionAnalysis() {
         <button type="submit" className="main-button" disabled={isLoading || files.length === 0}>{isLoading ? 'Analisando...' : `Analisar ${files.length} Itens`}</button>
       </form>
       {error && <p className="error-message">{error}</p>}
-      {isLoading && (<div className="loading-overlay"><div className="loader"></div><p>Analisando com Gemini...</p><span>Isso pode levar alguns segundos.</span></div>)}
+      {isLoading && !result && (<div className="loading-overlay"><div className="loader"></div><p>Analisando com Gemini...</p><span>Isso pode levar alguns segundos.</span></div>)}
+      {isLoading && result && (<p className="stream-progress">{result.analises_individuais.length} de {files.length} itens analisados...</p>)}
       <CompetitionResultsDisplay result={result} />
     </div>
   );
@@ -1,10 +1,17 @@
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+import time
+_PROCESS_IMPORT_STARTED = time.perf_counter()
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse, PlainTextResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from typing import Callable, List, Optional, Dict, Any, Tuple
 import os
-import tempfile
+import json
+import asyncio
+import gc
 import shutil
+import threading
 from dotenv import load_dotenv
 
 
@@ -12,6 +19,14 @@ load_dotenv()
 
 
 from agents.judge_orchestrator import JudgeOrchestrator
+from agents.whisper_pool import get_whisper_pool
+from agents.ingestion import ingest_multipart, IngestedUpload, IngestionError, UploadSink
+from agents.archive_ingestion import ingest_archive
+from agents.job_queue import JobQueue, JobWorkers
+from agents.executors import run_blocking, run_io, lane_for
+from agents.admission import AdmissionController, AdmissionRejected
+from agents.evaluation_store import criteria_hash as hash_criteria
+from agents.metrics import render_prometheus, HTTP_REQUEST_DURATION, JOB_QUEUE_DEPTH
 
 app = FastAPI(
     title="Jurado IA - Sistema de Avaliação Inteligente",
@@ -31,11 +46,68 @@ app.add_middleware(
 
 
 judge = JudgeOrchestrator()
+job_queue = JobQueue()
+job_workers = JobWorkers(job_queue, judge)
+admission = AdmissionController()
+startup_report: Dict[str, Any] = {"importacao_s": time.perf_counter() - _PROCESS_IMPORT_STARTED}
+
+
+def prepare_for_fork():
+    # Chamado pelo gunicorn.conf.py no processo mestre (preload_app), antes de criar os workers:
+    # agentes e pesos do Whisper carregados aqui são compartilhados copy-on-write por todos eles
+    start = time.perf_counter()
+    judge.preload()
+    pool = get_whisper_pool()
+    # O faster-whisper não sobrevive ao fork: cada worker o carrega no warm-up
+    if pool.backend.fork_safe:
+        pool.load_models()
+    startup_report["preload_mestre_s"] = time.perf_counter() - start
+    # Tira os objetos já criados do alcance do coletor de lixo: percorrê-los em cada worker
+    # escreveria nas páginas herdadas e desfaria o compartilhamento
+    gc.freeze()
+
+def after_fork(workers: int):
+    # Roda em cada worker logo após o fork; o mestre já recolocou os jobs órfãos na fila
+    from agents.llm_client import get_llm_client
+
+    job_queue.reopen()
+    judge.after_fork()
+    job_workers.resume_on_start = False
+    get_llm_client().share_quota(workers)
+    get_whisper_pool().share_cores(workers)
+    startup_report["pid"] = os.getpid()
+
+def preload_models():
+    start = time.perf_counter()
+    if os.getenv("PRELOAD_AGENTS", "1") == "1":
+        judge.preload()
+    if os.getenv("WHISPER_WARMUP", "1") == "1":
+        try:
+            get_whisper_pool().warm_up()
+        except Exception as e:
+            # Sem isto a thread de preload morreria em silêncio; a falha aparece em /status (erros_carregamento)
+            judge.load_errors["whisper"] = str(e)
+    startup_report["preload_s"] = time.perf_counter() - start
+
+@app.on_event("startup")
+async def warm_up_models():
+    # Agentes e Whisper são carregados em segundo plano, depois que o servidor já aceita requisições
+    startup_report["pronto_s"] = time.perf_counter() - _PROCESS_IMPORT_STARTED
+    threading.Thread(target=preload_models, daemon=True).start()
+
+@app.on_event("startup")
+async def start_job_workers():
+    job_workers.start()
+
+@app.on_event("shutdown")
+async def stop_job_workers():
+    await job_workers.stop()
 
 
 class TextAnalysisRequest(BaseModel):
     text: str
     criteria: str = "Avaliação geral de qualidade"
+    use_cache: bool = True
 
 class AnalysisResponse(BaseModel):
     success: bool
@@ -51,124 +123,335 @@ async def root():
         "version": "1.0.0"
     }
 
+# Rotas de upload de uma modalidade só: a admissão é decidida pelo caminho, antes de o corpo ser recebido
+UPLOAD_ROUTES = {"/analyze/image": "image", "/analyze/audio": "audio", "/analyze/video": "video", "/analyze/document": "document"}
+
+def too_busy(error: AdmissionRejected) -> JSONResponse:
+    return JSONResponse(status_code=429, content={"detail": str(error)}, headers={"Retry-After": str(error.retry_after)})
+
+@app.middleware("http")
+async def admission_control(request: Request, call_next):
+    lane = UPLOAD_ROUTES.get(request.url.path) if request.method == "POST" else None
+    if lane is None:
+        return await call_next(request)
+    try:
+        ticket = admission.enter([lane])
+    except AdmissionRejected as e:
+        return too_busy(e)
+    try:
+        return await call_next(request)
+    finally:
+        admission.leave(ticket)
+
+@app.middleware("http")
+async def record_request_duration(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    # Usa o template da rota (ex.: /jobs/{job_id}) para não explodir a cardinalidade das séries
+    route = request.scope.get("route")
+    HTTP_REQUEST_DURATION.observe(
+        time.perf_counter() - start,
+        method=request.method, path=getattr(route, "path", "desconhecida"), status=str(response.status_code)
+    )
+    return response
+
 @app.get("/status", response_model=Dict[str, Any])
 async def get_status():
-    return judge.get_agent_status()
+    status = judge.get_agent_status()
+    status["fila_jobs"] = await run_blocking(job_queue.queue_depth)
+    status["admissao"] = admission.stats()
+    status["inicializacao"] = {**startup_report, "agentes_s": dict(judge.load_times), "erros_carregamento": dict(judge.load_errors)}
+    return status
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    JOB_QUEUE_DEPTH.set(await run_blocking(job_queue.queue_depth))
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+@app.get("/cache/stats", response_model=Dict[str, Any])
+async def get_cache_stats():
+    return judge.result_cache.stats()
 
 @app.post("/analyze/text", response_model=AnalysisResponse)
 async def analyze_text(request: TextAnalysisRequest):
     try:
-        result = await judge.analyze_single_content(
-            request.text, 
-            'text', 
-            request.criteria
-        )
+        async with admission.admit([lane_for('text', request.text)]):
+            result = await judge.analyze_single_content(
+                request.text, 
+                'text', 
+                request.criteria,
+                use_cache=request.use_cache
+            )
         if "erro" in result:
             return AnalysisResponse(success=False, error=result["erro"])
         return AnalysisResponse(success=True, data=result)
+    except AdmissionRejected as e:
+        return too_busy(e)
     except Exception as e:
         return AnalysisResponse(success=False, error=str(e))
 
-@app.post("/analyze/image", response_model=AnalysisResponse)
-async def analyze_image(file: UploadFile = File(...), criteria: str = Form("Avaliação geral")):
-    if not file.content_type.startswith('image/'):
-        raise HTTPException(status_code=400, detail="Arquivo deve ser uma imagem")
-    
-    with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1]) as temp_file:
-        shutil.copyfileobj(file.file, temp_file)
-        temp_path = temp_file.name
-    
-    try:
-        result = judge.image_agent.analyze(temp_path, criteria)
-        if "erro" in result:
-             return AnalysisResponse(success=False, error=result["erro"])
-        return AnalysisResponse(success=True, data=result)
-    finally:
-        os.unlink(temp_path)
+def upload_form(field: str, criteria: str, multiple: bool = False) -> Dict[str, Any]:
+    # As rotas leem o corpo com ingest_multipart, não pelo FastAPI: o formulário é declarado só para a documentação
+    binary = {"type": "string", "format": "binary"}
+    schema = {
+        "type": "object",
+        "required": [field],
+        "properties": {
+            field: {"type": "array", "items": binary} if multiple else binary,
+            "criteria": {"type": "string", "default": criteria},
+            "use_cache": {"type": "boolean", "default": True},
+        },
+    }
+    return {"requestBody": {"required": True, "content": {"multipart/form-data": {"schema": schema}}}}
 
-@app.post("/analyze/audio", response_model=AnalysisResponse)
-async def analyze_audio(file: UploadFile = File(...), criteria: str = Form("Avaliação geral")):
-    if not file.content_type.startswith('audio/'):
-        raise HTTPException(status_code=400, detail="Arquivo deve ser de áudio")
-    
-    with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1]) as temp_file:
-        shutil.copyfileobj(file.file, temp_file)
-        temp_path = temp_file.name
-        
+def form_bool(value: Optional[str], default: bool = True) -> bool:
+    if value is None or not value.strip():
+        return default
+    return value.strip().lower() in ("1", "true", "t", "yes", "y", "on")
+
+async def read_uploads(request: Request, field: str, open_file: Callable[[Optional[str], Optional[str]], UploadSink]) -> Tuple[Dict[str, str], List[IngestedUpload]]:
     try:
-        result = await judge.analyze_single_content(temp_path, 'audio', criteria)
-        if "erro" in result:
-             return AnalysisResponse(success=False, error=result["erro"])
-        return AnalysisResponse(success=True, data=result)
-    finally:
-        os.unlink(temp_path)
+        fields, uploads = await ingest_multipart(request.headers.get("content-type", ""), request.stream(), field, open_file)
+    except IngestionError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message)
+    if not uploads:
+        raise HTTPException(status_code=400, detail=f"Envie ao menos um arquivo no campo '{field}'")
+    return fields, uploads
 
-@app.post("/analyze/video", response_model=AnalysisResponse)
-async def analyze_video(file: UploadFile = File(...), criteria: str = Form("Avaliação geral")):
-    if not file.content_type.startswith('video/'):
-        raise HTTPException(status_code=400, detail="Arquivo deve ser de vídeo")
-    
-    with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1]) as temp_file:
-        shutil.copyfileobj(file.file, temp_file)
-        temp_path = temp_file.name
+def detected_file(filename: Optional[str], mime: Optional[str]) -> UploadSink:
+    return UploadSink(filename, mime, fallback_type=judge.detect_content_type(filename))
 
-    try:
-        result = await judge.analyze_single_content(temp_path, 'video', criteria)
-        if "erro" in result:
-             return AnalysisResponse(success=False, error=result["erro"])
-        return AnalysisResponse(success=True, data=result)
-    finally:
-        os.unlink(temp_path)
+def admitted_file(ticket) -> Callable[[Optional[str], Optional[str]], UploadSink]:
+    # Análises múltiplas: a admissão acompanha a chegada de cada arquivo em vez de esperar o corpo inteiro
+    def open_file(filename: Optional[str], mime: Optional[str]) -> UploadSink:
+        admission.extend(ticket, judge.detect_content_type(filename))
+        return detected_file(filename, mime)
+    return open_file
 
-@app.post("/analyze/document", response_model=AnalysisResponse)
-async def analyze_document(file: UploadFile = File(...), criteria: str = Form("Avaliação geral")):
-    if file.content_type != 'application/pdf':
-        raise HTTPException(status_code=400, detail="Arquivo deve ser um PDF")
-    
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as temp_file:
-        shutil.copyfileobj(file.file, temp_file)
-        temp_path = temp_file.name
-        
+async def analyze_upload(request: Request, content_type: str, accepts: Callable[[str], bool], wrong_type: str) -> AnalysisResponse:
+    opened = []
+
+    def open_file(filename: Optional[str], mime: Optional[str]) -> UploadSink:
+        # Recusado pelo tipo declarado antes de receber o conteúdo
+        if opened:
+            raise IngestionError("Envie um único arquivo no campo 'file'.", 400)
+        if not accepts(mime or ""):
+            raise IngestionError(wrong_type, 400)
+        opened.append(filename)
+        return UploadSink(filename, mime, fallback_type=content_type, expected_type=content_type)
+
+    fields, (upload,) = await read_uploads(request, "file", open_file)
     try:
-        result = judge.text_agent.analyze_document(temp_path, criteria)
+        result = await judge.analyze_single_content(upload.source, content_type, fields.get("criteria") or "Avaliação geral",
+                                                    content_hash=upload.sha256, use_cache=form_bool(fields.get("use_cache")),
+                                                    content_name=upload.name)
         if "erro" in result:
              return AnalysisResponse(success=False, error=result["erro"])
         return AnalysisResponse(success=True, data=result)
     finally:
-        os.unlink(temp_path)
+        upload.cleanup()
 
-@app.post("/analyze/multiple", response_model=AnalysisResponse)
-async def analyze_multiple_files(
-    files: List[UploadFile] = File(...),
-    criteria: str = Form("Avaliação comparativa")
-):
-    temp_files = []
+@app.post("/analyze/image", response_model=AnalysisResponse, openapi_extra=upload_form("file", "Avaliação geral"))
+async def analyze_image(request: Request):
+    return await analyze_upload(request, 'image', lambda mime: mime.startswith('image/'), "Arquivo deve ser uma imagem")
+
+@app.post("/analyze/audio", response_model=AnalysisResponse, openapi_extra=upload_form("file", "Avaliação geral"))
+async def analyze_audio(request: Request):
+    return await analyze_upload(request, 'audio', lambda mime: mime.startswith('audio/'), "Arquivo deve ser de áudio")
+
+@app.post("/analyze/video", response_model=AnalysisResponse, openapi_extra=upload_form("file", "Avaliação geral"))
+async def analyze_video(request: Request):
+    return await analyze_upload(request, 'video', lambda mime: mime.startswith('video/'), "Arquivo deve ser de vídeo")
+
+@app.post("/analyze/document", response_model=AnalysisResponse, openapi_extra=upload_form("file", "Avaliação geral"))
+async def analyze_document(request: Request):
+    return await analyze_upload(request, 'document', lambda mime: mime == 'application/pdf', "Arquivo deve ser um PDF")
+
+@app.post("/analyze/multiple", response_model=AnalysisResponse, openapi_extra=upload_form("files", "Avaliação comparativa", multiple=True))
+async def analyze_multiple_files(request: Request):
+    uploads = []
+    ticket = admission.enter([])
     try:
-        contents = []
-        for file in files:
-            suffix = os.path.splitext(file.filename)[1]
-            with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
-                shutil.copyfileobj(file.file, temp_file)
-                temp_path = temp_file.name
-                temp_files.append(temp_path)
-            
-            contents.append({
-                'path': temp_path,
-                'name': file.filename
-            })
+        fields, uploads = await read_uploads(request, "files", admitted_file(ticket))
+        admission.settle(ticket, [upload.content_type for upload in uploads])
+        contents = [{
+            'source': upload.source,
+            'content_type': upload.content_type,
+            'content_hash': upload.sha256,
+            'name': upload.name
+        } for upload in uploads]
         
-        result = await judge.analyze_multiple_contents(contents, criteria)
+        result = await judge.analyze_multiple_contents(contents, fields.get("criteria") or "Avaliação comparativa",
+                                                       use_cache=form_bool(fields.get("use_cache")))
         if "erro" in result.get("sintese_final", {}):
              return AnalysisResponse(success=False, error=result["sintese_final"]["erro"])
         return AnalysisResponse(success=True, data=result)
         
+    except AdmissionRejected as e:
+        return too_busy(e)
+    except HTTPException as e:
+        return AnalysisResponse(success=False, error=e.detail)
     except Exception as e:
         return AnalysisResponse(success=False, error=str(e))
     
     finally:
-        for path in temp_files:
-            if os.path.exists(path):
-                os.unlink(path)
+        admission.leave(ticket)
+        for upload in uploads:
+            upload.cleanup()
+
+@app.post("/analyze/multiple/stream", openapi_extra=upload_form("files", "Avaliação comparativa", multiple=True))
+async def analyze_multiple_files_stream(request: Request):
+    # NDJSON por padrão; Server-Sent Events quando o cliente pede text/event-stream
+    use_sse = "text/event-stream" in request.headers.get("accept", "")
+    ticket = admission.enter([])
+    uploads = []
+    try:
+        fields, uploads = await read_uploads(request, "files", admitted_file(ticket))
+        admission.settle(ticket, [upload.content_type for upload in uploads])
+    except BaseException as e:
+        admission.leave(ticket)
+        for upload in uploads:
+            upload.cleanup()
+        if isinstance(e, AdmissionRejected):
+            return too_busy(e)
+        raise
+
+    contents = [{
+        'source': upload.source,
+        'content_type': upload.content_type,
+        'content_hash': upload.sha256,
+        'name': upload.name
+    } for upload in uploads]
+    criteria = fields.get("criteria") or "Avaliação comparativa"
+    use_cache = form_bool(fields.get("use_cache"))
+
+    async def event_stream():
+        try:
+            async for event in judge.stream_multiple_contents(contents, criteria, use_cache=use_cache):
+                payload = json.dumps(event, ensure_ascii=False)
+                yield f"event: {event['evento']}\ndata: {payload}\n\n" if use_sse else payload + "\n"
+        finally:
+            admission.leave(ticket)
+            for upload in uploads:
+                upload.cleanup()
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream" if use_sse else "application/x-ndjson")
+
+# --- Jobs assíncronos para lotes grandes ---
+@app.post("/jobs", response_model=Dict[str, Any], openapi_extra=upload_form("files", "Avaliação comparativa", multiple=True))
+async def submit_job(request: Request):
+    job_id = await run_io(job_queue.new_job_id)
+    directory = job_queue.job_dir(job_id)
+
+    def open_file(filename: Optional[str], mime: Optional[str]) -> UploadSink:
+        # Arquivos grandes já são gravados no diretório do job: persist só os renomeia
+        return UploadSink(filename, mime, fallback_type=judge.detect_content_type(filename), spill_dir=directory)
+
+    try:
+        fields, uploads = await read_uploads(request, "files", open_file)
+        items = []
+        for index, upload in enumerate(uploads):
+            destination = os.path.join(directory, f"{index}{os.path.splitext(upload.name or '')[1]}")
+            await run_blocking(upload.persist, destination)
+            items.append({"name": upload.name, "path": destination, "content_type": upload.content_type, "content_hash": upload.sha256})
+
+        await run_blocking(job_queue.create_job, job_id, fields.get("criteria") or "Avaliação comparativa", form_bool(fields.get("use_cache")), items)
+    except BaseException:
+        # Qualquer falha antes de o job existir no banco (envio inválido, cliente desconectado, erro no SQLite)
+        # não pode deixar o diretório órfão em JOBS_DIR
+        await run_io(shutil.rmtree, directory, True)
+        raise
+    job_workers.notify()
+    return {"job_id": job_id, "status": "pending", "itens": len(items)}
+
+@app.post("/jobs/archive", response_model=Dict[str, Any])
+async def submit_archive_job(request: Request, criteria: str = "Avaliação comparativa", use_cache: bool = True):
+    # Corpo bruto (ZIP ou tar, com ou sem gzip/bz2/xz), não multipart: a extração começa com os primeiros
+    # bytes e cada membro extraído já entra na fila dos workers enquanto o restante ainda está chegando
+    job_id = await run_io(job_queue.new_job_id)
+    try:
+        await run_blocking(job_queue.create_job, job_id, criteria, use_cache, [], "receiving")
+    except BaseException:
+        await run_io(shutil.rmtree, job_queue.job_dir(job_id), True)
+        raise
+    loop = asyncio.get_running_loop()
+
+    def on_member(index: int, member: Dict[str, Any]) -> bool:
+        # Roda na thread de extração
+        added = job_queue.add_item(job_id, index, member)
+        loop.call_soon_threadsafe(job_workers.notify)
+        return added
+
+    try:
+        summary = await ingest_archive(request.stream(), job_queue.job_dir(job_id), judge.detect_content_type, on_member)
+        if summary["itens"] == 0:
+            raise IngestionError("Nenhum arquivo suportado no arquivo compactado.", 400)
+    except BaseException as e:
+        job_workers.cancel_job(job_id)
+        if isinstance(e, IngestionError):
+            raise HTTPException(status_code=e.status_code, detail=e.message)
+        raise
+    await run_blocking(job_queue.finish_receiving, job_id)
+    job_workers.notify()
+    return {"job_id": job_id, "status": "pending", "itens": summary["itens"], "ignorados": summary["ignorados"]}
+
+@app.get("/jobs/{job_id}", response_model=Dict[str, Any])
+async def get_job(job_id: str):
+    job = await run_blocking(job_queue.get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    return job
+
+@app.get("/jobs/{job_id}/results", response_model=Dict[str, Any])
+async def get_job_results(job_id: str):
+    job = await run_blocking(job_queue.get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    return {
+        "job_id": job_id,
+        "status": job["status"],
+        "analises_individuais": await run_blocking(job_queue.item_results, job_id),
+        "sintese_final": job["sintese_final"]
+    }
+
+@app.delete("/jobs/{job_id}", response_model=Dict[str, Any])
+async def cancel_job(job_id: str):
+    if await run_blocking(job_queue.get_job, job_id) is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    return {"job_id": job_id, "cancelado": job_workers.cancel_job(job_id)}
+
+# --- Placar e histórico das avaliações ---
+def evaluations_or_unavailable():
+    if not judge.evaluations.enabled:
+        raise HTTPException(status_code=503, detail="Armazenamento de avaliações desativado (EVALUATIONS_DB_PATH)")
+    return judge.evaluations
+
+@app.get("/leaderboard", response_model=Dict[str, Any])
+async def get_leaderboard(
+    criteria: Optional[str] = None,
+    criteria_hash: Optional[str] = None,
+    content_type: Optional[str] = None,
+    limit: int = 50,
+    offset: int = 0
+):
+    # Os critérios identificam o concurso; criteria_hash (devolvido em cada página) evita reenviar o texto
+    store = evaluations_or_unavailable()
+    if criteria is None and criteria_hash is None:
+        raise HTTPException(status_code=400, detail="Informe criteria ou criteria_hash")
+    key = hash_criteria(criteria) if criteria is not None else criteria_hash
+    return await run_blocking(store.leaderboard, key, content_type, limit, offset)
+
+@app.get("/evaluations", response_model=Dict[str, Any])
+async def get_evaluation_history(
+    content_hash: Optional[str] = None,
+    criteria: Optional[str] = None,
+    criteria_hash: Optional[str] = None,
+    limit: int = 50,
+    offset: int = 0
+):
+    store = evaluations_or_unavailable()
+    key = hash_criteria(criteria) if criteria is not None else criteria_hash
+    return await run_blocking(store.history, content_hash, key, limit, offset)
 
 # --- Entrypoint para rodar o servidor ---
 if __name__ == "__main__":
@@ -0,0 +1,70 @@
+import pytest
+
+from agents.admission import AdmissionController, AdmissionRejected
+
+
+def _controller():
+    return AdmissionController(limits={"image": 1, "video": 1, "text": 2}, queue_limits={"image": 1, "video": 0, "text": 0})
+
+
+def test_enter_is_all_or_nothing():
+    admission = _controller()
+    admission.enter(["video"])
+    with pytest.raises(AdmissionRejected) as error:
+        admission.enter(["image", "video"])
+    assert error.value.lane == "video" and error.value.retry_after >= 1
+    assert admission.admitted == {"image": 0, "video": 1, "text": 0}
+
+
+def test_unknown_types_take_no_slot():
+    admission = _controller()
+    ticket = admission.enter(["unknown", "image"])
+    assert ticket.lanes == ["image"]
+
+
+def test_leave_releases_and_learns_service_time():
+    admission = _controller()
+    admission.leave(admission.enter(["image"]))
+    assert admission.admitted["image"] == 0
+    assert admission.service_seconds["image"] < 5.0
+
+
+def test_extend_rejects_as_files_arrive():
+    admission = _controller()
+    ticket = admission.enter([])
+    admission.extend(ticket, "image")
+    admission.extend(ticket, "image")
+    with pytest.raises(AdmissionRejected):
+        admission.extend(ticket, "image")
+    assert ticket.lanes == ["image", "image"]
+    admission.leave(ticket)
+    assert admission.admitted["image"] == 0
+
+
+def test_settle_swaps_guessed_lanes_for_detected_ones():
+    admission = _controller()
+    ticket = admission.enter([])
+    admission.extend(ticket, "image")
+    admission.extend(ticket, "text")
+    admission.settle(ticket, ["image", "video", "unknown"])
+    assert sorted(ticket.lanes) == ["image", "video"]
+    assert admission.admitted == {"image": 1, "video": 1, "text": 0}
+
+
+def test_failed_settle_keeps_original_slots():
+    admission = _controller()
+    admission.enter(["video"])
+    ticket = admission.enter(["text"])
+    with pytest.raises(AdmissionRejected):
+        admission.settle(ticket, ["video"])
+    assert ticket.lanes == ["text"]
+    admission.leave(ticket)
+    assert admission.admitted == {"image": 0, "video": 1, "text": 0}
+
+
+def test_retry_after_grows_with_queue():
+    admission = AdmissionController(limits={"audio": 1}, queue_limits={"audio": 3})
+    admission.service_seconds = {"audio": 10.0}
+    for _ in range(4):
+        admission.try_admit("audio")
+    assert admission.retry_after("audio") == 40
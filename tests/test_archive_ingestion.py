@@ -0,0 +1,122 @@
+import io
+import zipfile
+
+import pytest
+
+from agents.archive_ingestion import ArchivePipe, extract_archive
+from agents.ingestion import IngestionError
+
+
+class _Unseekable(io.RawIOBase):
+    # Sem seek o zipfile grava tamanhos e CRC em descritores depois dos dados (flag 0x08)
+    def __init__(self):
+        self.data = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.data += data
+        return len(data)
+
+
+def _zip(members, compression=zipfile.ZIP_DEFLATED, seekable=True, force_zip64=False) -> bytes:
+    target = io.BytesIO() if seekable else _Unseekable()
+    with zipfile.ZipFile(target, "w") as archive:
+        for name, data, *method in members:
+            info = zipfile.ZipInfo(name)
+            info.compress_type = method[0] if method else compression
+            with archive.open(info, "w", force_zip64=force_zip64) as f:
+                f.write(data)
+    return target.getvalue() if seekable else bytes(target.data)
+
+
+def _corrupt(archive: bytes, payload: bytes) -> bytes:
+    position = archive.index(payload)
+    return archive[:position] + bytes([archive[position] ^ 0xFF]) + archive[position + 1:]
+
+
+def _extract(archive: bytes, tmp_path):
+    pipe = ArchivePipe(max_buffered=len(archive) + 1)
+    pipe.write(archive)
+    pipe.close()
+    members = {}
+
+    def on_member(index, member):
+        with open(member["path"], "rb") as f:
+            members[member["name"]] = f.read()
+        return True
+
+    summary = extract_archive(pipe, str(tmp_path), lambda name, head: "text", on_member)
+    return summary, members
+
+
+TEXT = b"Texto de teste para o jurado. " * 200
+
+
+def test_stored_members(tmp_path):
+    summary, members = _extract(_zip([("a.txt", TEXT), ("b.txt", b"segundo")], zipfile.ZIP_STORED), tmp_path)
+    assert summary == {"itens": 2, "ignorados": []}
+    assert members == {"a.txt": TEXT, "b.txt": b"segundo"}
+
+
+def test_deflated_members(tmp_path):
+    summary, members = _extract(_zip([("a.txt", TEXT), ("b.txt", b"segundo")]), tmp_path)
+    assert summary["itens"] == 2
+    assert members == {"a.txt": TEXT, "b.txt": b"segundo"}
+
+
+def test_deflated_members_with_data_descriptor(tmp_path):
+    archive = _zip([("a.txt", TEXT), ("b.txt", b"segundo")], seekable=False)
+    assert zipfile.ZipFile(io.BytesIO(archive)).infolist()[0].flag_bits & 0x08
+    summary, members = _extract(archive, tmp_path)
+    assert summary["itens"] == 2
+    assert members == {"a.txt": TEXT, "b.txt": b"segundo"}
+
+
+def test_stored_member_with_data_descriptor_is_rejected(tmp_path):
+    archive = _zip([("a.txt", TEXT)], zipfile.ZIP_STORED, seekable=False)
+    with pytest.raises(IngestionError) as error:
+        _extract(archive, tmp_path)
+    assert error.value.status_code == 415
+
+
+def test_zip64_members(tmp_path):
+    summary, members = _extract(_zip([("a.txt", TEXT), ("b.txt", b"segundo")], force_zip64=True), tmp_path)
+    assert summary["itens"] == 2
+    assert members == {"a.txt": TEXT, "b.txt": b"segundo"}
+
+
+def test_corrupt_stored_member_is_skipped(tmp_path):
+    archive = _corrupt(_zip([("a.txt", TEXT), ("b.txt", b"segundo")], zipfile.ZIP_STORED), TEXT[:32])
+    summary, members = _extract(archive, tmp_path)
+    assert summary == {"itens": 1, "ignorados": [{"nome": "a.txt", "motivo": "CRC não confere"}]}
+    assert members == {"b.txt": b"segundo"}
+
+
+def test_corrupt_deflated_member_is_skipped(tmp_path):
+    compressed = _zip([("a.txt", TEXT)])
+    payload = compressed[30 + len("a.txt"):30 + len("a.txt") + 8]
+    archive = _corrupt(_zip([("a.txt", TEXT), ("b.txt", b"segundo")]), payload)
+    summary, members = _extract(archive, tmp_path)
+    assert [item["nome"] for item in summary["ignorados"]] == ["a.txt"]
+    assert members == {"b.txt": b"segundo"}
+
+
+def test_unsupported_method_is_skipped(tmp_path):
+    archive = _zip([("a.txt", TEXT, zipfile.ZIP_BZIP2), ("b.txt", b"segundo")])
+    summary, members = _extract(archive, tmp_path)
+    assert summary["ignorados"] == [{"nome": "a.txt", "motivo": "método de compressão 12 não suportado"}]
+    assert members == {"b.txt": b"segundo"}
+
+
+def test_corrupt_or_unsupported_junk_is_ignored(tmp_path):
+    junk = b"metadados do finder " * 50
+    archive = _zip([
+        ("__MACOSX/._a.txt", junk, zipfile.ZIP_STORED),
+        (".DS_Store", b"\x00\x01" * 100, zipfile.ZIP_BZIP2),
+        ("a.txt", TEXT),
+    ])
+    summary, members = _extract(_corrupt(archive, junk[:32]), tmp_path)
+    assert summary == {"itens": 1, "ignorados": []}
+    assert members == {"a.txt": TEXT}
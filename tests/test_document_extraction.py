@@ -0,0 +1,46 @@
+import pytest
+
+from agents.text_agent import DocumentError, TextAnalysisAgent
+
+
+def _pdf(text: str) -> bytes:
+    stream = f"BT /F1 24 Tf 72 720 Td ({text}) Tj ET".encode()
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R /Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    body, offsets = b"%PDF-1.4\n", []
+    for number, obj in enumerate(objects, 1):
+        offsets.append(len(body))
+        body += b"%d 0 obj\n" % number + obj + b"\nendobj\n"
+    xref = len(body)
+    body += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    body += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    return body + b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+
+
+@pytest.fixture
+def agent():
+    # Só a extração: sem criar o cliente do LLM
+    return TextAnalysisAgent.__new__(TextAnalysisAgent)
+
+
+def test_pdf_without_pdf_extension(agent, tmp_path):
+    # Arquivos gravados na ingestão (tmpXXXX) e membros de arquivos compactados nem sempre terminam em .pdf
+    path = tmp_path / "3"
+    path.write_bytes(_pdf("Redacao do concurso"))
+    assert "Redacao do concurso" in agent._extract_document_text(str(path))
+
+
+def test_pdf_in_memory(agent):
+    assert "Ola" in agent._extract_document_text(memoryview(_pdf("Ola")))
+
+
+def test_non_pdf_named_pdf_is_rejected(agent, tmp_path):
+    path = tmp_path / "falso.pdf"
+    path.write_bytes(b"PK\x03\x04 um docx renomeado")
+    with pytest.raises(DocumentError):
+        agent._extract_document_text(str(path))
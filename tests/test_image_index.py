@@ -0,0 +1,48 @@
+import sqlite3
+
+from agents.image_preprocessing import PerceptualHashIndex
+
+
+def _rows(path):
+    return sqlite3.connect(path).execute("SELECT content_hash FROM image_hashes ORDER BY created_at").fetchall()
+
+
+def test_find_or_add_registers_first_occurrence():
+    index = PerceptualHashIndex(max_distance=2, disk_path="")
+    assert index.find_or_add(0b1111, "original") is None
+    assert index.find_or_add(0b1110, "recorte") == {"content_hash": "original", "distancia": 1}
+    assert index.find_or_add(0xFFFF0000, "outra") is None
+    assert index.stats()["imagens_indexadas"] == 2
+
+
+def test_disk_index_is_pruned_on_open(tmp_path):
+    path = str(tmp_path / "index.db")
+    index = PerceptualHashIndex(max_entries=10, disk_path=path)
+    for i in range(5):
+        index.add(i << 20, f"hash{i}")
+    reopened = PerceptualHashIndex(max_entries=3, disk_path=path)
+    assert list(reopened._entries) == ["hash2", "hash3", "hash4"]
+    assert _rows(path) == [("hash2",), ("hash3",), ("hash4",)]
+
+
+def test_reopen_loads_entries_written_by_other_workers(tmp_path):
+    path = str(tmp_path / "index.db")
+    worker = PerceptualHashIndex(disk_path=path)
+    PerceptualHashIndex(disk_path=path).add(1 << 40, "de_outro_worker")
+    worker.reopen()
+    assert worker.find(1 << 40) == {"content_hash": "de_outro_worker", "distancia": 0}
+
+
+def test_write_failure_keeps_memory_entry(tmp_path):
+    index = PerceptualHashIndex(disk_path=str(tmp_path / "index.db"))
+    index._db.close()
+    index.add(42, "imagem")
+    assert index.find(42) == {"content_hash": "imagem", "distancia": 0}
+    assert index.stats()["falhas_disco"] == 1
+
+
+def test_unopenable_path_falls_back_to_memory(tmp_path):
+    index = PerceptualHashIndex(disk_path=str(tmp_path))
+    assert index.stats()["persistente"] is False
+    assert index.find_or_add(42, "imagem") is None
+    assert index.find_or_add(42, "copia") == {"content_hash": "imagem", "distancia": 0}
@@ -0,0 +1,123 @@
+import asyncio
+
+import pytest
+
+from agents.job_queue import JobQueue, JobWorkers
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return {"db_path": str(tmp_path / "jobs.db"), "jobs_dir": str(tmp_path / "jobs")}
+
+
+def _items(queue, job_id, count):
+    items = []
+    for i in range(count):
+        path = f"{queue.job_dir(job_id)}/{i}.txt"
+        with open(path, "w") as f:
+            f.write(f"item {i}")
+        items.append({"name": f"{i}.txt", "path": path, "content_type": "text", "content_hash": f"h{i}"})
+    return items
+
+
+def _job(queue, count=3, status="pending"):
+    job_id = queue.new_job_id()
+    queue.create_job(job_id, "criterios", True, _items(queue, job_id, count), status)
+    return job_id
+
+
+def test_items_are_claimed_once(paths):
+    queue = JobQueue(**paths)
+    job_id = _job(queue, 2)
+    other = JobQueue(**paths)
+    claimed = [queue.claim_next_item(), other.claim_next_item(), queue.claim_next_item()]
+    assert [item["idx"] for item in claimed[:2]] == [0, 1]
+    assert claimed[2] is None
+    assert queue.get_job(job_id)["status"] == "running"
+
+
+def test_resume_after_crash_requeues_running_items(paths):
+    queue = JobQueue(**paths)
+    job_id = _job(queue, 3)
+    queue.finish_item(job_id, queue.claim_next_item()["idx"], {"pontuacao": 7})
+    queue.claim_next_item()
+    del queue
+
+    # Novo processo sobre o mesmo banco, como depois de um kill -9
+    restarted = JobQueue(**paths)
+    restarted.resume()
+    progress = restarted.get_job(job_id)["progresso"]
+    assert progress["concluidos"] == 1 and progress["pendentes"] == 2 and progress["em_execucao"] == 0
+    assert [restarted.claim_next_item()["idx"], restarted.claim_next_item()["idx"]] == [1, 2]
+
+
+def test_resume_reruns_interrupted_synthesis(paths):
+    queue = JobQueue(**paths)
+    job_id = _job(queue, 1)
+    queue.finish_item(job_id, queue.claim_next_item()["idx"], {"pontuacao": 7})
+    assert queue.mark_synthesizing(job_id)
+
+    restarted = JobQueue(**paths)
+    restarted.resume()
+    assert restarted.jobs_ready_for_synthesis() == [job_id]
+
+
+def test_resume_cancels_interrupted_archive_upload(paths):
+    queue = JobQueue(**paths)
+    job_id = _job(queue, 0, status="receiving")
+    queue.add_item(job_id, 0, _items(queue, job_id, 1)[0])
+
+    restarted = JobQueue(**paths)
+    restarted.resume()
+    assert restarted.get_job(job_id)["status"] == "cancelled"
+    assert restarted.claim_next_item() is None
+
+
+class _Judge:
+    def __init__(self, fail_on=()):
+        self.fail_on = fail_on
+        self.analyzed = []
+
+    async def analyze_content_item(self, item, criteria, use_cache):
+        if item["name"] in self.fail_on:
+            raise RuntimeError("agente caiu")
+        self.analyzed.append(item["name"])
+        return {"pontuacao": 8}
+
+    async def _synthesize_analyses(self, results, criteria):
+        return {"itens": len(results)}
+
+
+async def _run_until_done(queue, judge, job_id):
+    workers = JobWorkers(queue, judge, concurrency=2)
+    workers.start()
+    try:
+        for _ in range(200):
+            if queue.get_job(job_id)["status"] == "completed":
+                break
+            await asyncio.sleep(0.02)
+    finally:
+        await workers.stop()
+    return queue.get_job(job_id)
+
+
+def test_workers_finish_recovered_job(paths):
+    queue = JobQueue(**paths)
+    job_id = _job(queue, 3)
+    queue.claim_next_item()
+
+    restarted = JobQueue(**paths)
+    judge = _Judge()
+    job = asyncio.run(_run_until_done(restarted, judge, job_id))
+    assert job["status"] == "completed"
+    assert job["sintese_final"] == {"itens": 3}
+    assert sorted(judge.analyzed) == ["0.txt", "1.txt", "2.txt"]
+
+
+def test_failing_item_does_not_stop_the_job(paths):
+    queue = JobQueue(**paths)
+    job_id = _job(queue, 3)
+    job = asyncio.run(_run_until_done(queue, _Judge(fail_on={"1.txt"}), job_id))
+    assert job["status"] == "completed"
+    assert job["progresso"]["falhas"] == 1 and job["progresso"]["concluidos"] == 2
+    assert "agente caiu" in queue.item_results(job_id)[1]["erro"]
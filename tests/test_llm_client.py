@@ -0,0 +1,157 @@
+import asyncio
+import time
+
+import pytest
+
+from agents.llm_client import CircuitBreaker, LLMClient, LLMUnavailableError, TokenBucket
+
+
+class _ApiError(Exception):
+    def __init__(self, code):
+        super().__init__(f"status {code}")
+        self.code = code
+
+
+def _client(**kwargs) -> LLMClient:
+    client = LLMClient(rpm=60000, tpm=10 ** 9, **kwargs)
+    client._backoff = lambda attempt: 0
+    return client
+
+
+def _half_open(breaker: CircuitBreaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    breaker.opened_at = time.monotonic() - breaker.reset_seconds - 1
+
+
+def test_breaker_opens_after_threshold():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=30)
+    breaker.record_failure()
+    assert breaker.state == "fechado"
+    breaker.record_failure()
+    assert breaker.state == "aberto"
+    with pytest.raises(LLMUnavailableError):
+        breaker.check()
+
+
+def test_breaker_half_open_admits_single_probe():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=30)
+    _half_open(breaker)
+    assert breaker.check() is True
+    assert breaker.state == "meio-aberto"
+    with pytest.raises(LLMUnavailableError):
+        breaker.check()
+    breaker.record_success()
+    assert breaker.state == "fechado"
+    assert breaker.check() is False
+
+
+def test_failed_probe_reopens():
+    breaker = CircuitBreaker(failure_threshold=5, reset_seconds=30)
+    _half_open(breaker)
+    breaker.check()
+    breaker.record_failure()
+    assert breaker.state == "aberto"
+    with pytest.raises(LLMUnavailableError):
+        breaker.check()
+
+
+def test_cancelled_probe_releases_half_open():
+    client = _client()
+    _half_open(client.breaker)
+
+    async def scenario():
+        started = asyncio.Event()
+
+        async def hang():
+            started.set()
+            await asyncio.sleep(3600)
+
+        probe = asyncio.create_task(client.acall(hang, 10))
+        await started.wait()
+        assert client.breaker.state == "meio-aberto"
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+        async def ok():
+            return "resposta"
+
+        return await client.acall(ok, 10)
+
+    assert asyncio.run(scenario()) == "resposta"
+    assert client.breaker.state == "fechado"
+
+
+def test_cancelled_regular_call_keeps_probe():
+    # Só a chamada que virou o teste libera o meio-aberto
+    client = _client()
+    client.breaker.probing = True
+    client.breaker.opened_at = time.monotonic() - client.breaker.reset_seconds - 1
+
+    async def scenario():
+        async def hang():
+            await asyncio.sleep(3600)
+
+        with pytest.raises(LLMUnavailableError):
+            await client.acall(hang, 10)
+
+    asyncio.run(scenario())
+    assert client.breaker.probing is True
+
+
+def test_interrupted_sync_probe_releases_half_open():
+    client = _client()
+    _half_open(client.breaker)
+
+    def interrupted():
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        client.call(interrupted, 10)
+    assert client.breaker.check() is True
+
+
+def test_retries_transient_errors():
+    client = _client(max_retries=3)
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise _ApiError(503)
+        return "ok"
+
+    assert asyncio.run(client.acall(flaky, 10)) == "ok"
+    assert len(attempts) == 3
+    assert client.counters["retentativas"] == 2
+    assert client.breaker.state == "fechado"
+
+
+def test_client_errors_are_not_retried():
+    client = _client(max_retries=3)
+    attempts = []
+
+    async def invalid():
+        attempts.append(1)
+        raise _ApiError(400)
+
+    with pytest.raises(_ApiError):
+        asyncio.run(client.acall(invalid, 10))
+    assert len(attempts) == 1
+    assert client.breaker.failures == 0
+
+
+def test_token_bucket_queues_reservations():
+    bucket = TokenBucket(per_minute=60, burst_seconds=2)
+    assert bucket.capacity == 2
+    assert bucket.reserve(1) == 0
+    assert bucket.reserve(1) == 0
+    assert bucket.reserve(1) == pytest.approx(1, abs=0.05)
+    assert bucket.reserve(1) == pytest.approx(2, abs=0.05)
+
+
+def test_token_bucket_clamps_oversized_requests():
+    bucket = TokenBucket(per_minute=60, burst_seconds=2)
+    assert bucket.reserve(100) == 0
+    assert bucket.tokens == pytest.approx(0, abs=0.05)
@@ -0,0 +1,116 @@
+import asyncio
+
+import pytest
+
+from agents import ingestion
+from agents.ingestion import IngestionError, UploadSink, ingest_multipart
+
+BOUNDARY = "limite-de-teste"
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+
+
+def _body(*parts) -> bytes:
+    body = b""
+    for name, value, *file in parts:
+        disposition = f'form-data; name="{name}"'
+        headers = ""
+        if file:
+            filename, mime = file
+            disposition += f'; filename="{filename}"'
+            headers = f"Content-Type: {mime}\r\n"
+        body += f"--{BOUNDARY}\r\nContent-Disposition: {disposition}\r\n{headers}\r\n".encode() + value + b"\r\n"
+    return body + f"--{BOUNDARY}--\r\n".encode()
+
+
+async def _chunks(body: bytes, size: int, consumed: list):
+    for start in range(0, len(body), size):
+        consumed.append(start)
+        yield body[start:start + size]
+
+
+def _ingest(body: bytes, open_file, chunk_size: int = 7, consumed=None):
+    consumed = [] if consumed is None else consumed
+    return asyncio.run(ingest_multipart(f"multipart/form-data; boundary={BOUNDARY}", _chunks(body, chunk_size, consumed), "files", open_file))
+
+
+def _detect(filename, mime):
+    return UploadSink(filename, mime, fallback_type="text")
+
+
+def test_fields_and_files_in_small_chunks():
+    body = _body(("criteria", "Originalidade".encode()), ("files", PNG, "a.png", "image/png"),
+                 ("files", b"Um texto qualquer", "b.txt", "text/plain"), ("use_cache", b"false"))
+    fields, uploads = _ingest(body, _detect)
+    assert fields == {"criteria": "Originalidade", "use_cache": "false"}
+    assert [(u.name, u.content_type, bytes(u.source)) for u in uploads] == [("a.png", "image", PNG), ("b.txt", "text", b"Um texto qualquer")]
+    assert uploads[0].sha256 and uploads[0].size == len(PNG)
+
+
+def test_file_shorter_than_signature():
+    fields, uploads = _ingest(_body(("files", b"oi", "curto.txt", "text/plain")), _detect)
+    assert bytes(uploads[0].source) == b"oi"
+
+
+def test_empty_file_is_rejected():
+    with pytest.raises(IngestionError) as error:
+        _ingest(_body(("files", b"", "vazio.txt", "text/plain")), _detect)
+    assert error.value.status_code == 400
+
+
+def test_size_limit_stops_reading_the_body(monkeypatch):
+    monkeypatch.setitem(ingestion.MAX_UPLOAD_BYTES, "image", 1024)
+    body = _body(("files", PNG + b"\x00" * 100000, "grande.png", "image/png"))
+    consumed = []
+    with pytest.raises(IngestionError) as error:
+        _ingest(body, _detect, chunk_size=256, consumed=consumed)
+    assert error.value.status_code == 413
+    assert len(consumed) < len(body) // 256 // 10
+
+
+def test_refused_file_is_rejected_before_its_content():
+    def refuse(filename, mime):
+        raise IngestionError("Arquivo deve ser uma imagem", 400)
+
+    consumed = []
+    body = _body(("files", b"x" * 10000, "a.txt", "text/plain"))
+    with pytest.raises(IngestionError):
+        _ingest(body, refuse, chunk_size=128, consumed=consumed)
+    assert len(consumed) == 1
+
+
+def test_large_files_spill_into_given_directory(tmp_path, monkeypatch):
+    monkeypatch.setitem(ingestion.SPILL_THRESHOLD_BYTES, "image", 16)
+    fields, uploads = _ingest(_body(("files", PNG, "a.png", "image/png")),
+                              lambda filename, mime: UploadSink(filename, mime, spill_dir=str(tmp_path)))
+    assert uploads[0].path.startswith(str(tmp_path))
+    with open(uploads[0].path, "rb") as f:
+        assert f.read() == PNG
+
+
+def test_failure_removes_spilled_files(tmp_path, monkeypatch):
+    monkeypatch.setitem(ingestion.SPILL_THRESHOLD_BYTES, "image", 16)
+    body = _body(("files", PNG, "a.png", "image/png"), ("files", b"", "vazio.png", "image/png"))
+    with pytest.raises(IngestionError):
+        _ingest(body, lambda filename, mime: UploadSink(filename, mime, spill_dir=str(tmp_path)))
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_truncated_body_is_rejected():
+    body = _body(("files", PNG, "a.png", "image/png"))
+    with pytest.raises(IngestionError) as error:
+        _ingest(body[:-20], _detect)
+    assert error.value.status_code == 400
+
+
+def test_unexpected_file_field_and_content_type():
+    with pytest.raises(IngestionError):
+        _ingest(_body(("outro", PNG, "a.png", "image/png")), _detect)
+    with pytest.raises(IngestionError):
+        asyncio.run(ingest_multipart("application/json", _chunks(b"{}", 2, []), "files", _detect))
+
+
+def test_expected_type_is_checked_on_the_signature():
+    with pytest.raises(IngestionError) as error:
+        _ingest(_body(("files", b"%PDF-1.4 conteudo", "a.png", "image/png")),
+                lambda filename, mime: UploadSink(filename, mime, fallback_type="image", expected_type="image"))
+    assert error.value.status_code == 415
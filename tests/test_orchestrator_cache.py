@@ -0,0 +1,125 @@
+import asyncio
+
+import pytest
+
+from agents.artifact_store import ArtifactStore
+from agents.evaluation_store import EvaluationStore
+from agents.judge_orchestrator import JudgeOrchestrator
+from agents.result_cache import ResultCache
+
+
+class _TextAgent:
+    PROMPT_VERSION = "teste"
+
+    def __init__(self):
+        self.calls = []
+        self.results = []
+        self.release = None
+
+    async def aanalyze(self, text, criteria):
+        self.calls.append((text, criteria))
+        if self.release is not None:
+            await self.release.wait()
+        return self.results.pop(0) if self.results else {"pontuacao": 8, "criterio": criteria}
+
+
+@pytest.fixture
+def judge():
+    judge = JudgeOrchestrator()
+    judge.result_cache = ResultCache(disk_path="")
+    judge.evaluations = EvaluationStore(db_path="")
+    judge.artifacts = ArtifactStore(disk_path="")
+    judge._agents["text"] = _TextAgent()
+    return judge
+
+
+def test_identical_requests_share_one_analysis(judge):
+    agent = judge._agents["text"]
+
+    async def scenario():
+        agent.release = asyncio.Event()
+        requests = [asyncio.ensure_future(judge.analyze_single_content("mesmo texto", "text", "criterios")) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        agent.release.set()
+        return await asyncio.gather(*requests)
+
+    results = asyncio.run(scenario())
+    assert len(agent.calls) == 1
+    assert judge.coalesced == 2
+    results[0]["pontuacao"] = 0
+    assert results[1]["pontuacao"] == 8 and results[2]["pontuacao"] == 8
+    assert judge._in_flight == {}
+
+
+def test_cache_key_includes_criteria_and_content(judge):
+    agent = judge._agents["text"]
+
+    async def scenario():
+        await judge.analyze_single_content("texto", "text", "criterios A")
+        await judge.analyze_single_content("texto", "text", "criterios A")
+        await judge.analyze_single_content("texto", "text", "criterios B")
+        await judge.analyze_single_content("outro texto", "text", "criterios A")
+
+    asyncio.run(scenario())
+    assert agent.calls == [("texto", "criterios A"), ("texto", "criterios B"), ("outro texto", "criterios A")]
+    assert judge.result_cache.stats()["hits"] == 1
+
+
+def test_errors_are_not_cached(judge):
+    agent = judge._agents["text"]
+    agent.results = [{"erro": "cota esgotada"}]
+
+    async def scenario():
+        first = await judge.analyze_single_content("texto", "text", "criterios")
+        second = await judge.analyze_single_content("texto", "text", "criterios")
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first == {"erro": "cota esgotada"}
+    assert second["pontuacao"] == 8
+    assert len(agent.calls) == 2
+
+
+def test_use_cache_false_runs_again(judge):
+    agent = judge._agents["text"]
+
+    async def scenario():
+        await judge.analyze_single_content("texto", "text", "criterios")
+        await judge.analyze_single_content("texto", "text", "criterios", use_cache=False)
+
+    asyncio.run(scenario())
+    assert len(agent.calls) == 2
+
+
+def test_cancelled_waiter_does_not_cancel_shared_analysis(judge):
+    agent = judge._agents["text"]
+
+    async def scenario():
+        agent.release = asyncio.Event()
+        first = asyncio.ensure_future(judge.analyze_single_content("texto", "text", "criterios"))
+        second = asyncio.ensure_future(judge.analyze_single_content("texto", "text", "criterios"))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        await asyncio.sleep(0.01)
+        agent.release.set()
+        return await second
+
+    assert asyncio.run(scenario())["pontuacao"] == 8
+    assert len(agent.calls) == 1
+
+
+def test_last_waiter_cancels_the_analysis(judge):
+    agent = judge._agents["text"]
+
+    async def scenario():
+        agent.release = asyncio.Event()
+        request = asyncio.ensure_future(judge.analyze_single_content("texto", "text", "criterios"))
+        await asyncio.sleep(0.01)
+        request.cancel()
+        await asyncio.sleep(0.01)
+        assert judge._in_flight == {}
+        agent.release.set()
+        return await judge.analyze_single_content("texto", "text", "criterios")
+
+    assert asyncio.run(scenario())["pontuacao"] == 8
+    assert len(agent.calls) == 2
@@ -0,0 +1,62 @@
+from agents.prompt_budget import compact_text, count_tokens, normalize_whitespace, select_passages, shrink_passages, strip_boilerplate
+
+FREE_TEXT = "Lista de compras\n1\n2024\ndef f(x):\n    return x\nPágina 3"
+
+
+def test_text_within_budget_is_untouched():
+    text, report = compact_text(FREE_TEXT + "  \n\n\n\n", 30000, document=True)
+    assert text == FREE_TEXT + "  \n\n\n\n"
+    assert report["etapas"] == []
+    assert report["tokens_enviados"] == report["tokens_originais"]
+
+
+def test_free_text_keeps_numbers_and_indentation():
+    text = FREE_TEXT + "   " + "\n" * 40 + "fim"
+    compacted, report = compact_text(text, 20)
+    assert compacted == FREE_TEXT + "\n\nfim"
+    assert report["etapas"] == ["limpeza"]
+
+
+def test_document_strips_page_numbers_and_repeated_lines():
+    pages = ["Relatório Anual\nConteúdo da página %d com texto suficiente.\n%d de 3" % (i, i) for i in range(1, 4)]
+    text = "\n".join(pages)
+    compacted, report = compact_text(text, count_tokens(text) - 1, document=True)
+    assert "Relatório Anual" not in compacted
+    assert "de 3" not in compacted
+    assert "Conteúdo da página 2 com texto suficiente." in compacted
+    assert report["etapas"] == ["limpeza"]
+
+
+def test_extractive_selection_only_within_limit():
+    text = "\n".join(f"Frase número {i} sobre o tema do concurso." for i in range(2000))
+    compacted, report = compact_text(text, 5000, "tema")
+    assert report["etapas"] == ["selecao_extrativa"]
+    assert report["tokens_enviados"] <= 5000
+    assert compacted.startswith("Frase número 0 ")
+    assert compacted.endswith("Frase número 1999 sobre o tema do concurso.")
+
+    untouched, report = compact_text(text, 5000, "tema", extractive_limit=10000)
+    assert untouched == text
+    assert report["etapas"] == []
+
+
+def test_normalize_whitespace_preserves_indentation():
+    assert normalize_whitespace("  a  \n\n\n\n    b\t\n") == "  a\n\n    b"
+
+
+def test_strip_boilerplate_keeps_short_unique_lines():
+    assert strip_boilerplate("Título\n12\nCapítulo 1") == "Título\nCapítulo 1"
+
+
+def test_select_passages_keeps_order_and_marks_gaps():
+    text = " ".join(f"Sentença {i} fala de assunto qualquer." for i in range(300))
+    selected = select_passages(text, "assunto", 200)
+    assert "[...]" in selected
+    assert len(selected) <= 200 * 4
+
+
+def test_shrink_passages_splits_budget():
+    passages, shrunk = shrink_passages(["a " * 100, "b " * 100], 20)
+    assert shrunk
+    assert all(len(passage) <= 41 for passage in passages)
+    assert shrink_passages(["curto"], 20) == (["curto"], False)
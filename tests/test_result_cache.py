@@ -0,0 +1,81 @@
+import sqlite3
+import time
+
+from agents.result_cache import ResultCache, hash_content
+
+
+def test_key_covers_every_input():
+    cache = ResultCache(disk_path="")
+    base = cache.make_key("hash", "criterios", "text", "v1")
+    assert base == cache.make_key("hash", "criterios", "text", "v1")
+    assert len({
+        base,
+        cache.make_key("outro", "criterios", "text", "v1"),
+        cache.make_key("hash", "outros criterios", "text", "v1"),
+        cache.make_key("hash", "criterios", "document", "v1"),
+        cache.make_key("hash", "criterios", "text", "v2"),
+    }) == 5
+
+
+def test_hash_content_matches_file_and_bytes(tmp_path):
+    path = tmp_path / "arquivo.bin"
+    path.write_bytes(b"conteudo" * 1000)
+    assert hash_content(str(path), "document") == hash_content(b"conteudo" * 1000, "document")
+
+
+def test_memory_lru_and_copies():
+    cache = ResultCache(max_entries=2, disk_path="")
+    cache.set("a", {"nota": 1})
+    cache.set("b", {"nota": 2})
+    cache.get("a")["nota"] = 99
+    cache.set("c", {"nota": 3})
+    assert cache.get("a") == {"nota": 1}
+    assert cache.get("b") is None
+
+
+def test_expired_entries_miss():
+    cache = ResultCache(ttl=-1, disk_path="")
+    cache.set("a", {"nota": 1})
+    assert cache.get("a") is None
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    path = str(tmp_path / "cache.db")
+    ResultCache(disk_path=path).set("a", {"nota": 1})
+    reopened = ResultCache(disk_path=path)
+    assert reopened.get("a") == {"nota": 1}
+    assert reopened.stats()["hits_disco"] == 1
+    assert sqlite3.connect(path).execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_purges_expired_rows_on_open(tmp_path):
+    path = str(tmp_path / "cache.db")
+    ResultCache(ttl=-1, disk_path=path).set("a", {"nota": 1})
+    ResultCache(disk_path=path)
+    assert sqlite3.connect(path).execute("SELECT COUNT(*) FROM results").fetchone()[0] == 0
+
+
+def test_disk_failures_degrade_to_miss(tmp_path):
+    cache = ResultCache(disk_path=str(tmp_path / "cache.db"))
+    cache._db.close()
+    cache.set("a", {"nota": 1})
+    cache._entries.clear()
+    assert cache.get("a") is None
+    assert cache.stats()["falhas_disco"] == 2
+
+
+def test_unopenable_disk_keeps_memory_tier(tmp_path):
+    cache = ResultCache(disk_path=str(tmp_path))
+    assert cache.stats()["persistente"] is False
+    assert cache.stats()["falhas_disco"] == 1
+    cache.set("a", {"nota": 1})
+    assert cache.get("a") == {"nota": 1}
+
+
+def test_corrupt_row_is_a_miss(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = ResultCache(disk_path=path)
+    with cache._db:
+        cache._db.execute("INSERT INTO results VALUES (?, ?, ?)", ("a", "{nao e json", time.time() + 60))
+    assert cache.get("a") is None
+    assert cache.stats()["falhas_disco"] == 1
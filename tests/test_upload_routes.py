@@ -0,0 +1,121 @@
+import os
+import sqlite3
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    calls = []
+
+    async def analyze_single_content(source, content_type, criteria, **kwargs):
+        calls.append({"source": bytes(source), "content_type": content_type, "criteria": criteria, **kwargs})
+        return {"pontuacao": 8}
+
+    async def analyze_multiple_contents(contents, criteria, use_cache=True):
+        calls.append({"contents": [(c["name"], c["content_type"]) for c in contents], "criteria": criteria, "use_cache": use_cache})
+        return {"sintese_final": {"vencedor": contents[0]["name"]}}
+
+    monkeypatch.setattr(main.judge, "analyze_single_content", analyze_single_content)
+    monkeypatch.setattr(main.judge, "analyze_multiple_contents", analyze_multiple_contents)
+    return calls
+
+
+client = TestClient(main.app)
+
+
+def test_single_upload_reads_form_fields(calls):
+    response = client.post("/analyze/image", files={"file": ("foto.png", PNG, "image/png")},
+                           data={"criteria": "Composição", "use_cache": "false"})
+    assert response.json() == {"success": True, "data": {"pontuacao": 8}, "error": None}
+    assert calls == [{"source": PNG, "content_type": "image", "criteria": "Composição", "content_hash": calls[0]["content_hash"],
+                      "use_cache": False, "content_name": "foto.png"}]
+
+
+def test_single_upload_defaults(calls):
+    client.post("/analyze/image", files={"file": ("foto.png", PNG, "image/png")})
+    assert calls[0]["criteria"] == "Avaliação geral" and calls[0]["use_cache"] is True
+
+
+def test_declared_type_is_checked(calls):
+    response = client.post("/analyze/document", files={"file": ("a.pdf", b"%PDF-1.4", "image/png")})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Arquivo deve ser um PDF"
+    assert calls == []
+
+
+def test_signature_must_match_route(calls):
+    response = client.post("/analyze/image", files={"file": ("a.png", b"%PDF-1.4 documento", "image/png")})
+    assert response.status_code == 415
+
+
+def test_missing_file(calls):
+    response = client.post("/analyze/image", data={"criteria": "x"}, files={"outro": ("a.txt", b"texto", "text/plain")})
+    assert response.status_code == 400
+
+
+def test_multiple_detects_each_type(calls):
+    response = client.post("/analyze/multiple", files=[("files", ("a.png", PNG, "image/png")), ("files", ("b.txt", b"um texto", "text/plain"))],
+                           data={"criteria": "Criatividade"})
+    assert response.json()["success"] is True
+    assert calls == [{"contents": [("a.png", "image"), ("b.txt", "text")], "criteria": "Criatividade", "use_cache": True}]
+
+
+def test_multiple_rejects_before_reading_uploads(calls, monkeypatch):
+    opened = []
+    original = main.detected_file
+    monkeypatch.setattr(main, "detected_file", lambda filename, mime: opened.append(filename) or original(filename, mime))
+    busy = main.admission.enter(["video"] * main.admission.capacity("video"))
+    try:
+        response = client.post("/analyze/multiple", files=[("files", ("a.mp4", b"\x00\x00\x00\x18ftypisom" + b"\x00" * 64, "video/mp4"))])
+    finally:
+        main.admission.leave(busy)
+    assert response.status_code == 429
+    assert "Retry-After" in response.headers
+    assert opened == [] and calls == []
+    assert main.admission.admitted["video"] == 0
+
+
+def test_multiple_settles_on_detected_type(calls):
+    # Extensão desconhecida: a vaga é decidida pela assinatura depois do envio
+    response = client.post("/analyze/multiple", files=[("files", ("foto.bin", PNG, "application/octet-stream"))])
+    assert response.json()["success"] is True
+    assert calls[0]["contents"] == [("foto.bin", "image")]
+    assert all(count == 0 for count in main.admission.admitted.values())
+
+
+@pytest.fixture
+def jobs(tmp_path, monkeypatch):
+    from agents.job_queue import JobQueue
+
+    queue = JobQueue(db_path=str(tmp_path / "jobs.db"), jobs_dir=str(tmp_path / "jobs"))
+    monkeypatch.setattr(main, "job_queue", queue)
+    return queue
+
+
+def test_job_upload_persists_items(jobs):
+    response = client.post("/jobs", files=[("files", ("a.png", PNG, "image/png")), ("files", ("b.txt", b"texto", "text/plain"))],
+                           data={"criteria": "Estilo", "use_cache": "0"})
+    body = response.json()
+    assert body["itens"] == 2
+    job = jobs.get_job(body["job_id"])
+    assert job["status"] == "pending"
+    assert sorted(os.listdir(jobs.job_dir(body["job_id"]))) == ["0.png", "1.txt"]
+
+
+def test_failed_job_upload_leaves_no_directory(jobs, monkeypatch):
+    response = client.post("/jobs", files=[("files", ("a.png", PNG, "image/png")), ("files", ("vazio.txt", b"", "text/plain"))])
+    assert response.status_code == 400
+
+    def broken_create_job(*args, **kwargs):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(jobs, "create_job", broken_create_job)
+    with pytest.raises(sqlite3.OperationalError):
+        client.post("/jobs", files=[("files", ("a.png", PNG, "image/png"))])
+    assert os.listdir(jobs.jobs_dir) == []